@@ -1,10 +1,26 @@
 """Alerts models."""
 
-from django.db import models
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import models, transaction
+
+from bookworm.routers import use_primary
 
 
 class SingletonModel(models.Model):
-    """Singleton abstract class."""
+    """Singleton abstract class.
+
+    Loaded instances are cached in the shared cache under a version which
+    changes on every save. Each process also keeps the instance in memory
+    and only checks the version again after `local_cache_timeout` seconds.
+    """
+
+    local_cache_timeout = 60
+
+    # Instances cached by this process: model label to (version, expiry, values)
+    _local_cache = {}
 
     class Meta:
         abstract = True
@@ -13,6 +29,10 @@ class SingletonModel(models.Model):
         """Ensure that only one instance is ever saved."""
         self.pk = 1
         super(SingletonModel, self).save(*args, **kwargs)
+        # Invalidate now for this process, and again once committed so that
+        # other processes cannot cache the previous values in between.
+        self.invalidate_cache()
+        transaction.on_commit(self.invalidate_cache)
 
     def delete(self, *args, **kwargs):
         """Do not allow deleting this instance."""
@@ -21,8 +41,55 @@ class SingletonModel(models.Model):
     @classmethod
     def load(cls):
         """Custom method to retrieve the single object."""
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
+        now = time.monotonic()
+        cached = cls._local_cache.get(cls._meta.label)
+        if cached and cached[1] > now:
+            return cls._from_values(cached[2])
+
+        version = cache.get(cls._version_key())
+        if version is None:
+            cache.add(cls._version_key(), uuid.uuid4().hex, None)
+            version = cache.get(cls._version_key())
+
+        if cached and cached[0] == version:
+            values = cached[2]
+        else:
+            values = cache.get(cls._values_key(version))
+            if values is None:
+                # Replicas can lag behind the change of version that missed the cache
+                with use_primary():
+                    obj, created = cls.objects.get_or_create(pk=1)
+                if created:
+                    # Creating the instance saved it under a new version
+                    version = cache.get(cls._version_key())
+                values = {field.attname: getattr(obj, field.attname) for field in cls._meta.concrete_fields}
+                cache.set(cls._values_key(version), values)
+
+        cls._local_cache[cls._meta.label] = (version, now + cls.local_cache_timeout, values)
+        return cls._from_values(values)
+
+    @classmethod
+    def invalidate_cache(cls):
+        """Discard the cached instance in every process."""
+        cache.set(cls._version_key(), uuid.uuid4().hex, None)
+        cls._local_cache.pop(cls._meta.label, None)
+
+    @classmethod
+    def clear_local_cache(cls):
+        """Discard the instances cached by this process."""
+        cls._local_cache.clear()
+
+    @classmethod
+    def _from_values(cls, values):
+        return cls.from_db(None, list(values), list(values.values()))
+
+    @classmethod
+    def _version_key(cls):
+        return 'singleton:{}:version'.format(cls._meta.label_lower)
+
+    @classmethod
+    def _values_key(cls, version):
+        return 'singleton:{}:{}'.format(cls._meta.label_lower, version)
 
 
 class SMSAlert(SingletonModel):
@@ -1,6 +1,55 @@
 """Alerts services."""
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
 from django.conf import settings
 import requests
+from requests.adapters import HTTPAdapter
+
+# Gateway responses worth retrying, the message may go through later on.
+TRANSIENT_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class SMSServiceError(Exception):
+    """Transient error of the sms gateway."""
+
+
+class SMSResult(namedtuple('SMSResult', ['mobile', 'message', 'response', 'error', 'attempts'])):
+    """Result of sending a message."""
+
+    @property
+    def sent(self):
+        """Return whether the gateway accepted the message.
+
+        Only dictionary responses can report a failure, the gateway having
+        accepted the request otherwise.
+        """
+        if self.error is not None:
+            return False
+        if isinstance(self.response, dict):
+            return bool(self.response.get('success', True))
+        return True
+
+
+class RateLimiter:
+    """Space out calls shared between threads to a maximum rate per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_call = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Block until the next call is allowed."""
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            call_at = max(now, self.next_call)
+            self.next_call = call_at + self.interval
+        time.sleep(call_at - now)
 
 
 class SMSService:
@@ -9,16 +58,68 @@ class SMSService:
     service_url = ''
     api_token = ''
 
-    def __init__(self, service_url=settings.SMS_URL, api_token=settings.SMS_TOKEN):
+    def __init__(
+        self,
+        service_url=settings.SMS_URL,
+        api_token=settings.SMS_TOKEN,
+        max_workers=settings.SMS_MAX_WORKERS,
+        rate_limit=settings.SMS_RATE_LIMIT,
+        max_retries=settings.SMS_MAX_RETRIES,
+        retry_backoff=settings.SMS_RETRY_BACKOFF,
+        timeout=settings.SMS_TIMEOUT,
+    ):
         self.service_url = service_url
         self.api_token = api_token
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+
+        # Keep connections to the gateway open across messages, one per worker.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
     def send_alert(self, message, mobile):
         """Send alerts."""
-        response = requests.post(self.service_url, {
+        response = self.session.post(self.service_url, {
             'phone': mobile,
             'message': message,
             'key': self.api_token,
-        }).json()
+        }, timeout=self.timeout)
+
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            raise SMSServiceError(
+                "SMS service responded with status {}".format(response.status_code)
+            )
+
+        return response.json()
+
+    def send_many(self, messages):
+        """Send many alerts concurrently.
+
+        Take an iterable of (mobile, message) pairs and return the result of
+        each of them in the same order. Transient failures are retried with
+        an exponential backoff.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda item: self._send(*item), messages))
 
-        return response
+    def _send(self, mobile, message):
+        """Send an alert, retrying transient failures."""
+        attempts = 0
+        while True:
+            attempts += 1
+            self.rate_limiter.wait()
+            try:
+                response = self.send_alert(message=message, mobile=mobile)
+            except (SMSServiceError, requests.ConnectionError, requests.Timeout) as exc:
+                if attempts > self.max_retries:
+                    return SMSResult(mobile, message, None, str(exc), attempts)
+                time.sleep(self.retry_backoff * 2 ** (attempts - 1))
+            except (requests.RequestException, ValueError) as exc:
+                return SMSResult(mobile, message, None, str(exc), attempts)
+            else:
+                return SMSResult(mobile, message, response, None, attempts)
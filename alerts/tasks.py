@@ -1,37 +1,145 @@
 """Alerts tasks."""
 
+from itertools import islice
+
+from celery import chord
 from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db.models import Max, Min
 
 from alerts.models import SMSAlert
 from alerts.services import SMSService
 from books.models import ReadingList
 from bookworm.celery import app
+from bookworm.routers import use_replicas
 
 logger = get_task_logger(__name__)
 
+# Number of recipients fetched from the database at once.
+RECIPIENTS_CHUNK_SIZE = 2000
+
+
+def get_reading_in_progress():
+    """Return the reading list entries of books being read."""
+    return ReadingList.objects.filter(
+        started_reading=True,
+        finished_reading=False,
+    )
+
+
+def get_recipients(reading_list):
+    """Return the users reading a book who can receive an sms alert.
+
+    Yield tuples of username, mobile number and title of the book being
+    read for the given reading list entries, selected with a single query.
+    """
+    return reading_list.filter(
+        # Excludes both missing and empty mobile numbers with a single join
+        user__profile__mobile_number__gt='',
+    ).values_list(
+        'user__username',
+        'user__profile__mobile_number',
+        'book__title',
+    ).iterator(chunk_size=RECIPIENTS_CHUNK_SIZE)
+
+
+def split_range(first, last, shards):
+    """Split an inclusive range of ids into at most the given number of ranges."""
+    size = -(-(last - first + 1) // shards)
+    return [(start, min(start + size - 1, last)) for start in range(first, last + 1, size)]
+
 
 @app.task
 def send_sms_alert():
-    """Send sms alerts task."""
-    service = SMSService()
+    """Send sms alerts task.
+
+    Split the reading list entries in progress into ranges of ids, each one
+    sent by a separate task, and aggregate their counts once all are done.
+    """
     alert = SMSAlert.load()
 
-    if alert.send_alert:
-        reading_list = ReadingList.objects.all()
+    if not alert.send_alert:
+        return None
+
+    with use_replicas():
+        bounds = get_reading_in_progress().aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        logger.info("No books being read, no sms alerts to send.")
+        return None
+
+    shards = split_range(bounds['first'], bounds['last'], settings.SMS_ALERT_SHARDS)
+    logger.info("Sending sms alerts in {} shards.".format(len(shards)))
 
-        for book in reading_list:
-            if book.started_reading and not book.finished_reading:
-                mobile = book.user.profile.mobile_number
-                message = "{} {}".format(alert.message, book.book.title)
+    return chord(
+        send_sms_alert_shard.s(alert.message, first, last) for first, last in shards
+    )(aggregate_sms_alert_results.s())
 
+
+@app.task(acks_late=True)
+@use_replicas()
+def send_sms_alert_shard(alert_message, first_id, last_id):
+    """Send the sms alerts of the reading list entries within a range of ids.
+
+    The task is acknowledged once done, so that the shard of a worker lost
+    part way through is delivered to another worker. Recipients are read
+    from the read replicas.
+    """
+    service = SMSService()
+    reading_list = get_reading_in_progress().filter(id__range=(first_id, last_id))
+    counts = {'sent': 0, 'failed': 0, 'skipped': reading_list.count()}
+
+    recipients = get_recipients(reading_list)
+    while True:
+        chunk = list(islice(recipients, RECIPIENTS_CHUNK_SIZE))
+        if not chunk:
+            break
+        counts['skipped'] -= len(chunk)
+
+        results = service.send_many(
+            (mobile, "{} {}".format(alert_message, title))
+            for username, mobile, title in chunk
+        )
+
+        for (username, mobile, title), result in zip(chunk, results):
+            if result.sent:
+                counts['sent'] += 1
                 logger.info(
-                    "Sending message to user {user} mobile number {mobile} with message {message}".format(
-                        user=book.user.username,
+                    "Sent message to user {user} mobile number {mobile} with message {message}".format(
+                        user=username,
                         mobile=mobile,
-                        message=message,
+                        message=result.message,
+                    )
+                )
+                logger.info("SMS service response: {}".format(result.response))
+            else:
+                counts['failed'] += 1
+                logger.error(
+                    "Failed to send message to user {user} mobile number {mobile}: {reason}".format(
+                        user=username,
+                        mobile=mobile,
+                        reason=result.error or "SMS service response: {}".format(result.response),
                     )
                 )
 
-                response = service.send_alert(message=message, mobile=mobile)
+    logger.info(
+        "SMS alerts of entries {first_id} to {last_id} sent: {sent}, failed: {failed}, skipped: {skipped}".format(
+            first_id=first_id,
+            last_id=last_id,
+            **counts
+        )
+    )
+    return counts
+
+
+@app.task
+def aggregate_sms_alert_results(results):
+    """Add up the counts of the sms alert shards."""
+    totals = {'sent': 0, 'failed': 0, 'skipped': 0}
+    for counts in results:
+        for key in totals:
+            totals[key] += counts[key]
 
-                logger.info("SMS service response: {}".format(response))
+    logger.info(
+        "SMS alerts sent: {sent}, failed: {failed}, skipped: {skipped}".format(**totals)
+    )
+    return totals
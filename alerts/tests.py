@@ -1,15 +1,41 @@
 """Alerts app feature tests."""
-from unittest.mock import patch
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import skipUnless
+from unittest.mock import call, patch
+from urllib.parse import parse_qs
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
 
 from alerts import tasks
 from alerts.models import SMSAlert
-from books.models import Profile
-from books.tests import ReadingListFactory, UserFactory
+from alerts.services import SMSResult, SMSService
+from bookworm.celery import app
+from books.models import Profile, ReadingList
+from books.tests import ExplainTestMixin, ReadingListFactory, UserFactory
 
 
-class TestSMSAlertTaskTestCase(TestCase):
+class EagerTasksMixin:
+    """Run celery tasks and their callbacks synchronously."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.task_always_eager = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+
+    @classmethod
+    def tearDownClass(cls):
+        app.conf.task_always_eager = cls.task_always_eager
+        super().tearDownClass()
+
+
+class TestSMSAlertTaskTestCase(EagerTasksMixin, TestCase):
     """Test the sms alert task test case."""
 
     @classmethod
@@ -40,3 +66,248 @@ class TestSMSAlertTaskTestCase(TestCase):
             message=message,
             mobile=profile.mobile_number,
         )
+
+
+class TestSMSAlertRecipientsTestCase(EagerTasksMixin, TestCase):
+    """Test the selection of sms alert recipients."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sms_alert = SMSAlert.objects.create(send_alert=True)
+        cls.readers = []
+        for index in range(3):
+            user = UserFactory()
+            Profile.objects.filter(user=user).update(mobile_number="+4412345678{}".format(index))
+            cls.readers.append(
+                ReadingListFactory(started_reading=True, finished_reading=False, user=user)
+            )
+
+        # Neither finished books nor users without mobile numbers are alerted
+        ReadingListFactory(started_reading=True, finished_reading=True, user=cls.readers[0].user)
+        ReadingListFactory(started_reading=False, finished_reading=False, user=cls.readers[0].user)
+        ReadingListFactory(started_reading=True, finished_reading=False)
+        no_mobile = ReadingListFactory(started_reading=True, finished_reading=False)
+        Profile.objects.filter(user=no_mobile.user).update(mobile_number="")
+
+    def setUp(self):
+        SMSAlert.invalidate_cache()
+
+    @patch("alerts.services.SMSService.send_alert")
+    def test_send_sms_alert_only_to_readers_with_mobile_numbers(self, send_alert_mock):
+        """Test that only in progress readers with a mobile number are alerted."""
+        # Queries for the alert configuration and the range of ids, then a
+        # count and a query for the recipients of each shard
+        with self.settings(SMS_ALERT_SHARDS=2), self.assertNumQueries(6):
+            result = tasks.send_sms_alert()
+
+        self.assertEqual({'sent': 3, 'failed': 0, 'skipped': 2}, result.get())
+
+        self.assertCountEqual(
+            [
+                call(
+                    message="{} {}".format(self.sms_alert.message, reading_list.book.title),
+                    mobile=reading_list.user.profile.mobile_number,
+                )
+                for reading_list in ReadingList.objects.filter(id__in=[r.id for r in self.readers])
+            ],
+            send_alert_mock.call_args_list,
+        )
+
+    @patch("alerts.services.SMSService.send_alert")
+    def test_failed_messages_are_logged_as_failures(self, send_alert_mock):
+        """Test that messages the gateway refused are counted and logged as failed."""
+        send_alert_mock.side_effect = [{'success': False}, {'success': True}, ["unexpected"]]
+        with self.assertLogs(tasks.logger, 'INFO') as logs:
+            result = tasks.send_sms_alert()
+
+        self.assertEqual({'sent': 2, 'failed': 1, 'skipped': 2}, result.get())
+        self.assertEqual(2, sum("Sent message" in line for line in logs.output))
+        self.assertEqual(1, sum(line.startswith("ERROR") and "Failed to send" in line for line in logs.output))
+
+    def test_splitting_id_ranges_into_shards(self):
+        """Test that id ranges are split into contiguous shards."""
+        self.assertEqual([(1, 4), (5, 8), (9, 10)], tasks.split_range(1, 10, 3))
+        self.assertEqual([(7, 7)], tasks.split_range(7, 7, 8))
+        self.assertEqual([(1, 2), (3, 4)], tasks.split_range(1, 4, 2))
+
+
+class TestSingletonCacheTestCase(TestCase):
+    """Test the cached loading of singleton models."""
+
+    @classmethod
+    def setUpTestData(cls):
+        SMSAlert.objects.create()
+
+    def setUp(self):
+        SMSAlert.invalidate_cache()
+
+    def test_load_is_served_from_memory(self):
+        """Test that loading again runs no query."""
+        with self.assertNumQueries(1):
+            alert = SMSAlert.load()
+        with self.assertNumQueries(0):
+            self.assertEqual(alert.message, SMSAlert.load().message)
+
+    def test_load_is_shared_between_processes(self):
+        """Test that another process loads the cached instance without querying."""
+        SMSAlert.load()
+        SMSAlert.clear_local_cache()
+        with self.assertNumQueries(0):
+            self.assertEqual(1, SMSAlert.load().pk)
+
+    def test_save_invalidates_cache(self):
+        """Test that saving the singleton invalidates the cached instance."""
+        alert = SMSAlert.load()
+        alert.message = "Keep reading"
+        alert.send_alert = True
+        alert.save()
+
+        loaded = SMSAlert.load()
+        self.assertEqual("Keep reading", loaded.message)
+        self.assertTrue(loaded.send_alert)
+
+    def test_local_cache_expires(self):
+        """Test that a save from another process is seen once the local copy expires."""
+        SMSAlert.load()
+        # Another process saves the singleton, which cannot reach this one's memory
+        SMSAlert.objects.filter(pk=1).update(send_alert=True)
+        cache.set(SMSAlert._version_key(), 'saved-elsewhere', None)
+
+        with self.assertNumQueries(0):
+            self.assertFalse(SMSAlert.load().send_alert)
+
+        expired = time.monotonic() + SMSAlert.local_cache_timeout + 1
+        with patch('alerts.models.time.monotonic', return_value=expired), self.assertNumQueries(1):
+            self.assertTrue(SMSAlert.load().send_alert)
+
+
+class TestSMSAlertIndexesTestCase(ExplainTestMixin, TestCase):
+    """Index usage of the sms alert queries tests."""
+
+    # SQLite only uses partial indexes for literal values, not query parameters
+    @skipUnless(connection.vendor == 'postgresql', "Partial indexes are not used for query parameters.")
+    def test_reading_in_progress_uses_partial_index(self):
+        """Test that the books being read are selected by id with the partial index."""
+        self.assertUsesIndex(
+            tasks.get_reading_in_progress().order_by('id'),
+            'readinglist_in_progress_idx',
+        )
+
+
+class StubGateway(ThreadingMixIn, HTTPServer):
+    """Local sms gateway answering after a fixed latency.
+
+    Respond with the given status codes to the first requests, then accept
+    every message.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0, failures=()):
+        super().__init__(('127.0.0.1', 0), StubGatewayHandler)
+        self.latency = latency
+        self.failures = list(failures)
+        self.messages = []
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/text".format(self.server_address[1])
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class StubGatewayHandler(BaseHTTPRequestHandler):
+    """Request handler of the stub sms gateway."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+            status = self.server.failures.pop(0) if self.server.failures else 200
+            if status == 200:
+                self.server.messages.append(parse_qs(body.decode()))
+
+        content = json.dumps({'success': status == 200}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSMSServiceTestCase(SimpleTestCase):
+    """Test sending messages through the sms service."""
+
+    messages = [("+4412345678{}".format(index), "Message {}".format(index)) for index in range(20)]
+
+    def send_many(self, gateway, **options):
+        """Send the messages through the gateway and return the results and time taken."""
+        service = SMSService(service_url=gateway.url, api_token="token", **options)
+        started = time.monotonic()
+        results = service.send_many(self.messages)
+        return results, time.monotonic() - started
+
+    def test_send_many_returns_result_of_each_message(self):
+        """Test that every message is sent over a pool of reused connections."""
+        with StubGateway() as gateway:
+            results, _ = self.send_many(gateway, max_workers=4, rate_limit=0)
+
+        self.assertEqual(self.messages, [(result.mobile, result.message) for result in results])
+        self.assertTrue(all(result.sent for result in results))
+        self.assertCountEqual(
+            [message for mobile, message in self.messages],
+            [message['message'][0] for message in gateway.messages],
+        )
+        self.assertLessEqual(len(gateway.connections), 4)
+
+    def test_send_many_retries_transient_failures(self):
+        """Test that transient failures are retried until the retries run out."""
+        with StubGateway(failures=[503, 429]) as gateway:
+            results, _ = self.send_many(gateway, max_workers=1, rate_limit=0, retry_backoff=0.01)
+
+        self.assertEqual(3, results[0].attempts)
+        self.assertTrue(all(result.sent for result in results))
+
+        with StubGateway(failures=[503] * 3) as gateway:
+            results, _ = self.send_many(gateway, max_workers=1, rate_limit=0, max_retries=2, retry_backoff=0.01)
+
+        self.assertFalse(results[0].sent)
+        self.assertIn("503", results[0].error)
+        self.assertTrue(all(result.sent for result in results[1:]))
+
+    def test_results_of_responses_of_any_type(self):
+        """Test that only dictionaries can report the failure of a message."""
+        self.assertTrue(SMSResult("+441234567890", "Message", {}, None, 1).sent)
+        self.assertFalse(SMSResult("+441234567890", "Message", {'success': False}, None, 1).sent)
+        self.assertTrue(SMSResult("+441234567890", "Message", ["queued"], None, 1).sent)
+        self.assertFalse(SMSResult("+441234567890", "Message", None, "Timeout", 2).sent)
+
+    def test_send_many_is_faster_than_sending_one_at_a_time(self):
+        """Test the throughput of concurrent sending against a slow gateway."""
+        with StubGateway(latency=0.05) as gateway:
+            _, sequential = self.send_many(gateway, max_workers=1, rate_limit=0)
+            _, concurrent = self.send_many(gateway, max_workers=10, rate_limit=0)
+
+        self.assertLess(concurrent * 3, sequential)
+
+    def test_send_many_respects_rate_limit(self):
+        """Test that messages are not sent faster than the rate limit."""
+        with StubGateway() as gateway:
+            _, elapsed = self.send_many(gateway, max_workers=10, rate_limit=100)
+
+        self.assertGreaterEqual(elapsed, 0.19)
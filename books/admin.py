@@ -1,6 +1,8 @@
 """Books admin."""
 
 from django.contrib import admin
+from django_common.auth_backends import User
+
 from .models import (
     Author,
     Profile,
@@ -9,6 +11,40 @@ from .models import (
     Favourite,
     ReadingList,
 )
+from .pagination import EstimatedCountPaginator
+from .search import search_book_ids, tokenize
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Admin for tables too large to count or scan on every page load."""
+
+    paginator = EstimatedCountPaginator
+
+    # Filtered pages are counted once, not again for the whole table
+    show_full_result_count = False
+
+
+class BookSearchAdmin(LargeTableAdmin):
+    """Admin searching rows by their book through the full-text search index.
+
+    Searches match the title, author names, publisher name and description
+    of the books, along with the exact username of the user for rows that
+    belong to one, instead of matching every searched field with ILIKE
+    across joins.
+    """
+
+    # Field holding the id of the book of a row
+    search_book_field = 'book_id'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        if not tokenize(search_term):
+            return queryset.none(), False
+        matches = queryset.filter(**{self.search_book_field + '__in': search_book_ids(search_term, queryset.db)})
+        if any(field.name == 'user' for field in queryset.model._meta.fields):
+            matches |= queryset.filter(user_id__in=User.objects.filter(username=search_term.strip()).values('id'))
+        return matches, False
 
 
 @admin.register(Author)
@@ -30,6 +66,10 @@ class ProfileAdmin(admin.ModelAdmin):
         'birth_date',
     )
 
+    list_select_related = ('user',)
+
+    raw_id_fields = ('user',)
+
 
 @admin.register(Publisher)
 class PublisherAdmin(admin.ModelAdmin):
@@ -41,7 +81,7 @@ class PublisherAdmin(admin.ModelAdmin):
 
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(BookSearchAdmin):
     """Book admin."""
 
     list_display = (
@@ -52,58 +92,53 @@ class BookAdmin(admin.ModelAdmin):
         'published_date',
     )
 
-    search_fields = (
-        'title',
-        'genre',
-        'authors__name',
-        'publisher__name',
-        'published_date',
-    )
+    list_select_related = ('publisher',)
+
+    search_fields = ('title',)
+
+    search_book_field = 'id'
 
     list_filter = ('genre',)
 
+    autocomplete_fields = ('authors', 'publisher')
+
 
 @admin.register(Favourite)
-class Favourite(admin.ModelAdmin):
+class FavouriteAdmin(BookSearchAdmin):
     """Favourite admin."""
 
     list_display = ('book', 'user',)
 
-    search_fields = (
-        'book__title',
-        'book__genre',
-        'book__authors__name',
-        'book__publisher__name',
-        'book__published_date',
-        'user__username',
-    )
+    list_select_related = ('book', 'user')
+
+    search_fields = ('book__title',)
 
     list_filter = ('book__genre',)
 
+    raw_id_fields = ('book', 'user')
+
 
 @admin.register(ReadingList)
-class ReadingListAdmin(admin.ModelAdmin):
+class ReadingListAdmin(BookSearchAdmin):
     """ReadingList admin."""
 
     list_display = (
         'book',
+        'user',
         'started_reading',
         'started_date',
         'finished_reading',
         'finished_date',
     )
 
-    search_fields = (
-        'book__title',
-        'book__genre',
-        'book__authors__name',
-        'book__publisher__name',
-        'book__published_date',
-        'user__username',
-    )
+    list_select_related = ('book', 'user')
+
+    search_fields = ('book__title',)
 
     list_filter = (
         'started_reading',
         'finished_reading',
         'book__genre',
     )
+
+    raw_id_fields = ('book', 'user')
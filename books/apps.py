@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class BooksConfig(AppConfig):
     name = 'books'
+
+    def ready(self):
+        """Connect the signal handlers maintaining the search index, caches, stats and recommendations."""
+        from books import authentication, caching, recommendations, search, stats  # noqa: F401
@@ -0,0 +1,183 @@
+"""Books API authentication.
+
+Cache the users resolved from API tokens and Basic credentials, so that
+authenticated requests neither query the database nor hash the password
+every time. Tokens are cached in memory and in the shared cache, Basic
+credentials only in memory and for a short while.
+
+Entries cached in memory are stored with the version of their user in the
+shared cache, which changes whenever the user or their token changes, so
+that credentials invalidated by any process are rejected by every other.
+"""
+
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.crypto import salted_hmac
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+# Per request caches of the user model, which must not outlive the request
+USER_REQUEST_CACHES = ('_perm_cache', '_user_perm_cache', '_group_perm_cache')
+
+
+class LRUCache:
+    """Bounded in-process cache whose entries expire after a timeout."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value of a key, or None if missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        """Store the value of a key, evicting the least recently used entries."""
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        """Remove a key."""
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_matching(self, predicate):
+        """Remove the keys whose value matches the predicate."""
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if predicate(entry[1])]:
+                del self.entries[key]
+
+    def clear(self):
+        """Remove every key."""
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = LRUCache(settings.AUTH_CACHE_LOCAL_SIZE, settings.AUTH_CACHE_LOCAL_TIMEOUT)
+basic_cache = LRUCache(settings.AUTH_CACHE_LOCAL_SIZE, settings.AUTH_CACHE_LOCAL_TIMEOUT)
+
+
+def _token_key(key):
+    return 'auth:token:{}'.format(key)
+
+
+def _user_token_key(user_id):
+    return 'auth:user:{}:token'.format(user_id)
+
+
+def _user_version_key(user_id):
+    return 'auth:user:{}:version'.format(user_id)
+
+
+def user_version(user_id):
+    """Return the version of the cached credentials of a user."""
+    version = cache.get(_user_version_key(user_id))
+    if version is None:
+        cache.add(_user_version_key(user_id), uuid.uuid4().hex, None)
+        version = cache.get(_user_version_key(user_id))
+    return version
+
+
+def detach_user(user):
+    """Return a copy of the user without the data cached for a request."""
+    user = copy.copy(user)
+    for attr in USER_REQUEST_CACHES:
+        user.__dict__.pop(attr, None)
+    user._state = copy.copy(user._state)
+    user._state.fields_cache = {}
+    return user
+
+
+def invalidate_token(key):
+    """Discard the cached user of a token in this process and the shared cache."""
+    cache.delete(_token_key(key))
+    token_cache.delete(key)
+
+
+def invalidate_user(user_id):
+    """Discard the cached credentials of a user in every process."""
+    cache.set(_user_version_key(user_id), uuid.uuid4().hex, None)
+    key = cache.get(_user_token_key(user_id))
+    if key is not None:
+        invalidate_token(key)
+    token_cache.delete_matching(lambda entry: entry[1][0].pk == user_id)
+    basic_cache.delete_matching(lambda entry: entry[1].pk == user_id)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication resolving tokens through the cache."""
+
+    def authenticate_credentials(self, key):
+        """Return the user of a token, from the cache if possible."""
+        entry = token_cache.get(key)
+        if entry is not None and entry[0] == user_version(entry[1][0].pk):
+            cached = entry[1]
+        else:
+            cached = cache.get(_token_key(key))
+            if cached is None:
+                user, token = super().authenticate_credentials(key)
+                cached = (detach_user(user), token.created)
+                cache.set(_token_key(key), cached, settings.AUTH_CACHE_TIMEOUT)
+                cache.set(_user_token_key(user.pk), key, settings.AUTH_CACHE_TIMEOUT)
+            token_cache.set(key, (user_version(cached[0].pk), cached))
+
+        user = detach_user(cached[0])
+        return user, Token(key=key, user=user, created=cached[1])
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """Basic authentication remembering verified credentials for a short while."""
+
+    def authenticate_credentials(self, userid, password, request=None):
+        """Return the user of the credentials, verifying the password if not done recently."""
+        # Credentials are keyed by a keyed hash, never kept as they are
+        digest = salted_hmac('books.authentication.basic', '{}\0{}'.format(userid, password)).hexdigest()
+        entry = basic_cache.get(digest)
+        if entry is not None and entry[0] == user_version(entry[1].pk):
+            user = entry[1]
+        else:
+            user, _ = super().authenticate_credentials(userid, password, request)
+            user = detach_user(user)
+            basic_cache.set(digest, (user_version(user.pk), user))
+
+        return detach_user(user), None
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    """Discard the cached user of a regenerated or deleted token."""
+    invalidate_token(instance.key)
+    invalidate_user(instance.user_id)
+    # Again once committed, so that no process caches the previous token in between
+    transaction.on_commit(lambda: invalidate_user(instance.user_id))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    """Discard the cached credentials of a changed, deactivated or deleted user."""
+    invalidate_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_user(instance.pk))
@@ -0,0 +1,104 @@
+"""Books catalog response caching.
+
+Each catalog model has a version in the shared cache, the time of its last
+change, replaced whenever one of its rows is saved or deleted. Responses
+are cached under the request URL and the versions of the models they are
+built from, so that any change makes the cached responses unreachable, and
+the versions double as the `ETag` and `Last-Modified` of the responses.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils.http import parse_http_date_safe
+
+from books.models import Author, Book, Publisher
+
+CATALOG_MODELS = (Book, Author, Publisher)
+
+
+def _version_key(model):
+    return 'catalog:version:{}'.format(model._meta.label_lower)
+
+
+def get_catalog_versions(models=CATALOG_MODELS):
+    """Return the versions of the given models."""
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_catalog_versions(*models):
+    """Replace the versions of the given models.
+
+    Versions are replaced right away for this process, and again once the
+    current transaction is committed so that other processes cannot cache
+    responses of the previous data in between.
+    """
+    def bump():
+        now = time.time()
+        cache.set_many({_version_key(model): now for model in models}, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+class CachedResponse:
+    """Cache entry of a response, along with its validators."""
+
+    def __init__(self, request, models=CATALOG_MODELS):
+        versions = get_catalog_versions(models)
+        self.last_modified = int(max(versions))
+        self.key = 'catalog:response:{}'.format(hashlib.md5('{}|{}'.format(
+            request.build_absolute_uri(),
+            '|'.join(repr(version) for version in versions),
+        ).encode()).hexdigest())
+        # The same data is rendered differently for each media type
+        self.etag = '"{}"'.format(hashlib.md5('{}|{}'.format(
+            self.key,
+            request.accepted_media_type,
+        ).encode()).hexdigest())
+
+    def is_not_modified(self, request):
+        """Return whether the client already has the current response."""
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            etags = [etag.strip() for etag in if_none_match.split(',')]
+            return '*' in etags or self.etag in etags or 'W/' + self.etag in etags
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return if_modified_since is not None and self.last_modified <= if_modified_since
+
+    def get(self):
+        """Return the cached response data, or None."""
+        return cache.get(self.key)
+
+    def set(self, data, timeout):
+        """Cache the response data."""
+        cache.set(self.key, data, timeout)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Publisher)
+@receiver(post_delete, sender=Publisher)
+def catalog_changed(sender, **kwargs):
+    """Invalidate the cached responses of a changed model."""
+    bump_catalog_versions(sender)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def book_authors_changed(sender, action, **kwargs):
+    """Invalidate the cached responses of books whose authors changed."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_catalog_versions(Book)
@@ -0,0 +1,93 @@
+"""Books row counts.
+
+Counting the rows of a large table reads all of them, so paginators of the
+largest tables switch to an estimate once it passes a threshold. On
+PostgreSQL whole tables are estimated from the number of rows recorded by
+the last vacuum or analyze, and filtered querysets from the row estimate of
+the query plan. Other databases keep no such statistics, the counts of
+whole tables are cached instead and refreshed by a periodic task, which
+only reaches the web processes through a shared cache, see `CACHE_LOCATION`.
+"""
+
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+
+from books.models import Book, Favourite, ReadingList
+
+COUNTED_MODELS = (Book, Favourite, ReadingList)
+
+# Seconds the cached counts are kept, a few runs of the periodic task so
+# that counts are dropped rather than going stale once it stops
+COUNT_TIMEOUT = 30 * 60
+
+
+def _count_key(model):
+    return 'counts:{}'.format(model._meta.label_lower)
+
+
+def _is_whole_table(query):
+    return not (query.where or query.distinct or query.low_mark or query.high_mark is not None)
+
+
+def table_estimate(connection, model):
+    """Return the number of rows of the table of a model in the PostgreSQL statistics."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            (connection.ops.quote_name(model._meta.db_table),),
+        )
+        row = cursor.fetchone()
+    # Tables never analyzed have no statistics
+    return row[0] if row and row[0] > 0 else None
+
+
+def plan_estimate(connection, queryset):
+    """Return the number of rows of the queryset estimated by the PostgreSQL planner."""
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+def estimate_count(queryset):
+    """Return an estimate of the number of rows of the queryset, or None when there is none."""
+    connection = connections[queryset.db]
+    whole_table = _is_whole_table(queryset.query)
+    if connection.vendor == 'postgresql':
+        if whole_table:
+            return table_estimate(connection, queryset.model)
+        return plan_estimate(connection, queryset)
+    if whole_table:
+        return cache.get(_count_key(queryset.model))
+    return None
+
+
+def count_rows(queryset, threshold=None):
+    """Return the number of rows of the queryset and whether they were counted exactly.
+
+    The rows are estimated when the estimate reaches the threshold, and
+    counted otherwise.
+    """
+    if threshold is None:
+        threshold = settings.BOOKS_ESTIMATED_COUNT_THRESHOLD
+    estimate = estimate_count(queryset)
+    if estimate is not None and estimate >= threshold:
+        return estimate, False
+    return queryset.count(), True
+
+
+def refresh_counts(models=COUNTED_MODELS):
+    """Cache the number of rows of the tables of databases without statistics, and return them."""
+    counts = {}
+    for model in models:
+        if connections[router.db_for_read(model)].vendor == 'postgresql':
+            continue
+        counts[model._meta.label_lower] = model.objects.count()
+        cache.set(_count_key(model), counts[model._meta.label_lower], COUNT_TIMEOUT)
+    return counts
@@ -0,0 +1,108 @@
+"""Books exports.
+
+Stream the catalog and reading histories as records. Rows are read with a
+server-side cursor, along with the authors of a batch of rows at a time,
+so that exports of any size are rendered in constant memory.
+"""
+
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+
+from books.serializers import BookValuesSerializer
+from books.streams import AUTHORS_SEPARATOR, CSV_FIELDS
+
+BATCH_SIZE = 2000
+
+BOOK_CSV_FIELDS = ('id',) + CSV_FIELDS
+
+READING_LIST_CSV_FIELDS = (
+    'id',
+    'book',
+    'title',
+    'authors',
+    'publisher',
+    'started_reading',
+    'started_date',
+    'finished_reading',
+    'finished_date',
+)
+
+
+def batches(rows, size=BATCH_SIZE):
+    """Yield lists of consecutive rows of at most the given size."""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def export_books(queryset, batch_size=BATCH_SIZE):
+    """Yield the books of the queryset, as rendered by the books API, in id order."""
+    serializer = BookValuesSerializer(None)
+    rows = BookValuesSerializer.setup_values(queryset).order_by('id').iterator(chunk_size=batch_size)
+    for batch in batches(rows, batch_size):
+        yield from serializer.to_representation(batch)
+
+
+def export_reading_list(queryset, batch_size=BATCH_SIZE):
+    """Yield the reading list entries of the queryset, along with their book, in id order."""
+    format_date = BookValuesSerializer.get_date_formatter()
+    rows = queryset.order_by('id').values(
+        'id',
+        'book_id',
+        'book__title',
+        'book__publisher__name',
+        'started_reading',
+        'started_date',
+        'finished_reading',
+        'finished_date',
+    ).iterator(chunk_size=batch_size)
+    for batch in batches(rows, batch_size):
+        authors = BookValuesSerializer.get_authors({row['book_id'] for row in batch})
+        for row in batch:
+            yield {
+                'id': row['id'],
+                'book': {
+                    'id': row['book_id'],
+                    'title': row['book__title'],
+                    'authors': [author['name'] for author in authors.get(row['book_id'], [])],
+                    'publisher': row['book__publisher__name'],
+                },
+                'started_reading': row['started_reading'],
+                'started_date': format_date(row['started_date']),
+                'finished_reading': row['finished_reading'],
+                'finished_date': format_date(row['finished_date']),
+            }
+
+
+def reading_list_to_csv_record(entry):
+    """Return the CSV record of an exported reading list entry."""
+    return {
+        'id': entry['id'],
+        'book': entry['book']['id'],
+        'title': entry['book']['title'],
+        'authors': AUTHORS_SEPARATOR.join(entry['book']['authors']),
+        'publisher': entry['book']['publisher'],
+        'started_reading': entry['started_reading'],
+        'started_date': entry['started_date'],
+        'finished_reading': entry['finished_reading'],
+        'finished_date': entry['finished_date'],
+    }
+
+
+def streaming_export(request, records, csv_fields, to_csv_record, filename):
+    """Return a response streaming the records with the renderer negotiated for the request."""
+    renderer = request.accepted_renderer
+    if renderer.format == 'csv':
+        content = renderer.stream((to_csv_record(record) for record in records), csv_fields)
+    else:
+        content = renderer.stream(records)
+    response = StreamingHttpResponse(
+        content,
+        content_type='{}; charset={}'.format(renderer.media_type, renderer.charset),
+    )
+    response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(filename, renderer.format)
+    return response
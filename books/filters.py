@@ -0,0 +1,47 @@
+"""Books app filters."""
+
+import django_filters
+from rest_framework import filters
+
+from books.models import Book
+from books.search import search_books
+
+
+class BookSearchFilter(filters.SearchFilter):
+    """Full-text search on books ranked by relevance.
+
+    Matches the search terms against the title, authors, publisher and
+    description of books through the search index.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        """Return the books matching the search terms, best matches first."""
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+        return search_books(queryset, ' '.join(search_terms))
+
+
+class BookFilterSet(django_filters.FilterSet):
+    """Structured filters on books.
+
+    Each filter matches an indexed column, the genre and published date
+    through the composite indexes of books, the authors through the index
+    of the authors table and the publisher through its foreign key index.
+    """
+
+    genre = django_filters.MultipleChoiceFilter(
+        choices=Book.GENRES,
+        # A book has a single genre, the results need no deduplication
+        distinct=False,
+    )
+    published_date = django_filters.DateFromToRangeFilter()
+    pages = django_filters.RangeFilter()
+    author = django_filters.NumberFilter(
+        field_name='authors',
+    )
+    publisher = django_filters.NumberFilter()
+
+    class Meta:
+        model = Book
+        fields = ('genre', 'published_date', 'pages', 'author', 'publisher')
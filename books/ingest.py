@@ -0,0 +1,130 @@
+"""Books bulk ingest.
+
+Creates books in batches: publishers and authors are matched against the
+existing rows by normalized name with a single lookup per batch, missing
+ones are created, and books are inserted together with their author links
+using bulk inserts.
+"""
+
+import zlib
+
+from django.db import connections, router, transaction
+from django.db.transaction import TransactionManagementError
+
+from books.caching import bump_catalog_versions
+from books.models import Author, Book, Publisher, normalize_name
+from books.search import update_index
+
+
+def lock_names(model):
+    """Keep other transactions from creating rows of the model until the end of the transaction.
+
+    SQLite already runs a single writing transaction at a time.
+    """
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (zlib.crc32(model._meta.db_table.encode()),))
+
+
+def find_names(model, names, resolved):
+    """Add the rows of the model with the given normalized names to the resolved ones."""
+    for obj in model.objects.filter(normalized_name__in=names).order_by('id'):
+        resolved.setdefault(obj.normalized_name, obj)
+
+
+def resolve(model, records):
+    """Return the rows of the model for the given records, creating missing ones.
+
+    Records are dictionaries with a `name` and an optional `description`,
+    the returned dictionary maps their normalized names to model instances.
+    Missing rows are looked up again and created under a lock held until
+    the end of the transaction, so that concurrent ingests do not create
+    the same names twice.
+    """
+    by_name = {}
+    for record in records:
+        by_name.setdefault(normalize_name(record['name']), record)
+    if not by_name:
+        return {}
+
+    resolved = {}
+    find_names(model, list(by_name), resolved)
+    missing = [name for name in by_name if name not in resolved]
+    if missing:
+        lock_names(model)
+        find_names(model, missing, resolved)
+        missing = [name for name in missing if name not in resolved]
+    if missing:
+        model.objects.bulk_create(
+            model(
+                name=by_name[name]['name'],
+                normalized_name=name,
+                description=by_name[name].get('description', ''),
+            )
+            for name in missing
+        )
+        find_names(model, missing, resolved)
+
+    return resolved
+
+
+def bulk_create_with_ids(model, objs):
+    """Insert the objects in bulk and set their primary keys.
+
+    Backends that cannot return the ids of inserted rows, like SQLite, hold a
+    write lock on the database for the rest of the transaction once the
+    first row is inserted. The inserted rows therefore take the highest ids
+    in the table, in insertion order.
+    """
+    connection = connections[router.db_for_write(model)]
+    returns_ids = connection.features.can_return_ids_from_bulk_insert
+    if not returns_ids and not connection.in_atomic_block:
+        raise TransactionManagementError("Bulk inserts must run in a transaction.")
+    model.objects.bulk_create(objs)
+    if returns_ids or not objs:
+        return objs
+
+    ids = model.objects.order_by('-pk').values_list('pk', flat=True)[:len(objs)]
+    for obj, pk in zip(objs, reversed(list(ids))):
+        obj.pk = pk
+    return objs
+
+
+@transaction.atomic
+def create_books(rows):
+    """Create books from validated book data and return them.
+
+    Each row holds the book fields, a `publisher` dictionary and a list of
+    `authors` dictionaries as validated by the book serializer.
+    """
+    rows = list(rows)
+    publishers = resolve(Publisher, [row['publisher'] for row in rows])
+    authors = resolve(Author, [author for row in rows for author in row.get('authors', [])])
+
+    books = []
+    for row in rows:
+        fields = {name: value for name, value in row.items() if name not in ('publisher', 'authors')}
+        books.append(Book(
+            publisher=publishers[normalize_name(row['publisher']['name'])],
+            **fields
+        ))
+    bulk_create_with_ids(Book, books)
+
+    links = []
+    for book, row in zip(books, rows):
+        names = []
+        for author in row.get('authors', []):
+            name = normalize_name(author['name'])
+            if name not in names:
+                names.append(name)
+        links.extend(
+            Book.authors.through(book_id=book.pk, author_id=authors[name].pk)
+            for name in names
+        )
+    Book.authors.through.objects.bulk_create(links)
+
+    update_index(book.pk for book in books)
+    # Bulk inserts send no signals
+    bump_catalog_versions(Book, Author, Publisher)
+    return books
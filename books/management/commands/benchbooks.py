@@ -0,0 +1,236 @@
+"""Command to benchmark the throughput of the books API."""
+
+import json
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django_common.auth_backends import User
+from rest_framework.authtoken.models import Token
+
+from books.caching import bump_catalog_versions
+from books.ingest import bulk_create_with_ids
+from books.models import Author, Book, Favourite, Publisher, ReadingList
+from books.provisioning import provision_users
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(latencies, rank):
+    """Return the nearest-rank percentile of sorted latencies."""
+    return latencies[max(0, -(-len(latencies) * rank // 100) - 1)]
+
+
+class Command(BaseCommand):
+    """benchmark the books API endpoints against a seeded scratch database."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--books',
+            type=int,
+            default=1000,
+            help="Number of books seeded.",
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=50,
+            help="Number of users seeded, requests are made as random users.",
+        )
+        parser.add_argument(
+            '--entries',
+            type=int,
+            default=20,
+            help="Number of reading list entries and favourites seeded for each user.",
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help="Number of requests made to each endpoint.",
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help="Number of requests made at the same time.",
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=10,
+            help="Number of requests made to each endpoint before measuring.",
+        )
+        parser.add_argument(
+            '--no-response-cache',
+            action='store_true',
+            help="Render every book response instead of serving them from the response cache.",
+        )
+        parser.add_argument(
+            '--output',
+            help="File the results are written to as JSON.",
+        )
+        parser.add_argument(
+            '--compare',
+            help="JSON file of previous results to compare the results with.",
+        )
+
+    def handle(self, *args, **options):
+        """Seed a scratch database, benchmark each endpoint and report the results."""
+        if min(options['books'], options['users'], options['requests'], options['concurrency']) < 1:
+            raise CommandError("The books, users, requests and concurrency must be positive numbers.")
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+
+        # The data is seeded in a test database, dropped once done
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            tokens, book_ids = self.seed(options)
+            print("Seeded {} books and {} users with {} entries each.".format(
+                len(book_ids), len(tokens), options['entries'],
+            ))
+            # Replicas do not hold the seeded data
+            overrides = {'ALLOWED_HOSTS': settings.ALLOWED_HOSTS + ['testserver'], 'DATABASE_REPLICAS': []}
+            if options['no_response_cache']:
+                overrides['BOOKS_RESPONSE_CACHE_TIMEOUT'] = 0
+            with override_settings(**overrides):
+                results = self.run_benchmark(options, tokens, book_ids)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'options': {
+                key: options[key]
+                for key in ('books', 'users', 'entries', 'requests', 'concurrency', 'no_response_cache')
+            },
+            'endpoints': results,
+        }
+        for name, result in results.items():
+            print(self.format_result(name, result, (baseline or {}).get('endpoints', {}).get(name)))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                json.dump(report, output_file, indent=2, sort_keys=True)
+            print("Results written to {}.".format(options['output']))
+
+    @transaction.atomic
+    def seed(self, options):
+        """Create the books, users, reading lists and favourites, and return the tokens and book ids."""
+        # The test factories describe the data, imported here as the tests import this command
+        from books.tests import AuthorFactory, BookFactory, FavouriteFactory, PublisherFactory, ReadingListFactory
+
+        publishers = PublisherFactory.create_batch(max(1, options['books'] // 50))
+        authors = AuthorFactory.create_batch(max(1, options['books'] // 10))
+        books = bulk_create_with_ids(Book, [
+            BookFactory.build(publisher=random.choice(publishers))
+            for _ in range(options['books'])
+        ])
+        Book.authors.through.objects.bulk_create(
+            Book.authors.through(book_id=book.pk, author_id=author.pk)
+            for book in books
+            for author in random.sample(authors, min(len(authors), random.randint(1, 3)))
+        )
+        bump_catalog_versions(Book, Author, Publisher)
+
+        users = User.objects.filter(pk__in=[
+            result['id']
+            for result in provision_users({'username': 'bench{}'.format(index)} for index in range(options['users']))
+        ])
+        entries = min(options['entries'], len(books))
+        reading_list, favourites = [], []
+        for user in users:
+            for book in random.sample(books, entries):
+                reading_list.append(ReadingListFactory.build(user=user, book=book))
+            for book in random.sample(books, entries):
+                favourites.append(FavouriteFactory.build(user=user, book=book))
+        ReadingList.objects.bulk_create(reading_list)
+        Favourite.objects.bulk_create(favourites)
+
+        tokens = list(Token.objects.filter(user__in=users).values_list('key', flat=True))
+        return tokens, [book.pk for book in books]
+
+    def run_benchmark(self, options, tokens, book_ids):
+        """Return the throughput and latency percentiles of each endpoint."""
+        genres = [genre for genre, label in Book.GENRES]
+        endpoints = {
+            'book-list': lambda: "/books/book/",
+            'book-list-filtered': lambda: "/books/book/?genre={}&ordering=-published_date".format(
+                random.choice(genres),
+            ),
+            'book-detail': lambda: "/books/book/{}/".format(random.choice(book_ids)),
+            'reading-list': lambda: "/books/reading/",
+            'favourite-list': lambda: "/books/favourite/",
+        }
+        results = {}
+        for name, path in endpoints.items():
+            self.run_requests(path, tokens, options['warmup'], options['concurrency'])
+            started = time.perf_counter()
+            outcomes = self.run_requests(path, tokens, options['requests'], options['concurrency'])
+            elapsed = time.perf_counter() - started
+
+            latencies = sorted(latency for latency, status_code in outcomes)
+            results[name] = {
+                'requests': len(outcomes),
+                'errors': sum(1 for latency, status_code in outcomes if status_code >= 400),
+                'rps': round(len(outcomes) / elapsed, 1),
+            }
+            for rank in PERCENTILES:
+                results[name]['p{}_ms'.format(rank)] = round(percentile(latencies, rank) * 1000, 2)
+        return results
+
+    def run_requests(self, path, tokens, count, concurrency):
+        """Make requests from concurrent threads and return their latencies and status codes."""
+        remaining = iter(range(count))
+        lock = threading.Lock()
+        outcomes = []
+        failures = []
+
+        def worker():
+            client = Client()
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    started = time.perf_counter()
+                    response = client.get(path(), HTTP_AUTHORIZATION='Token {}'.format(random.choice(tokens)))
+                    latency = time.perf_counter() - started
+                    with lock:
+                        outcomes.append((latency, response.status_code))
+            except Exception as exc:
+                failures.append(exc)
+            finally:
+                # Threads have their own connections, closed before the database is dropped
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if failures:
+            raise failures[0]
+        return outcomes
+
+    def format_result(self, name, result, previous=None):
+        """Return a line describing the result of an endpoint, compared to a previous one."""
+        line = "{name}: {rps:.1f} req/s, p50 {p50_ms:.2f} ms, p95 {p95_ms:.2f} ms, p99 {p99_ms:.2f} ms".format(
+            name=name,
+            **result
+        )
+        if result['errors']:
+            line += ", {} errors".format(result['errors'])
+        if previous:
+            line += " (req/s {:+.1f}%, p95 {:+.1f}%)".format(
+                (result['rps'] / previous['rps'] - 1) * 100,
+                (result['p95_ms'] / previous['p95_ms'] - 1) * 100 if previous['p95_ms'] else 0,
+            )
+        return line
@@ -0,0 +1,65 @@
+"""Command to compare the rendering speed of the book serializers."""
+
+import time
+
+from django.core.management import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from books.models import Book
+from books.serializers import BookSerializer, BookValuesSerializer
+
+
+class Command(BaseCommand):
+    """compare the books rendered per second by the model and values serializers."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=500,
+            help="Number of books rendered at once.",
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help="Number of times each serializer renders the books, the fastest run is kept.",
+        )
+
+    def handle(self, *args, **options):
+        """Render the same books with both serializers and print their rates."""
+        rows = options['rows']
+        queryset = BookSerializer.setup_eager_loading(Book.objects.order_by('id'))
+
+        def render_models():
+            return BookSerializer(queryset[:rows], many=True).data
+
+        def render_values():
+            return BookValuesSerializer(BookValuesSerializer.setup_values(queryset)[:rows]).data
+
+        renderer = JSONRenderer()
+        rendered = renderer.render(render_models())
+        if renderer.render(render_values()) != rendered:
+            raise CommandError("The serializers render different data.")
+        count = len(render_values())
+        if not count:
+            raise CommandError("There are no books to render.")
+
+        rates = {}
+        for name, render in (('model', render_models), ('values', render_values)):
+            elapsed = min(self.time(render) for _ in range(options['repeat']))
+            rates[name] = count / elapsed
+            print("{name} serializer: {rate:.0f} rows/s".format(name=name, rate=rates[name]))
+
+        print("Rendered {count} books, values serializer {speedup:.1f}x faster.".format(
+            count=count,
+            speedup=rates['values'] / rates['model'],
+        ))
+
+    def time(self, render):
+        """Return the seconds taken to render the books."""
+        started = time.perf_counter()
+        render()
+        return time.perf_counter() - started
@@ -0,0 +1,138 @@
+"""Command to import a books catalog from an NDJSON or CSV file."""
+
+import json
+import os
+import sys
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from books.serializers import BookSerializer
+from books.streams import FORMATS, RecordReader
+
+
+class Command(BaseCommand):
+    """import books from an NDJSON or CSV file, or from the standard input."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help="File to import, use - to read from the standard input.",
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help="Format of the records, guessed from the file extension by default.",
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help="Number of records committed at once.",
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help="File recording the import progress, "
+                 "defaults to the imported file name followed by .checkpoint.",
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help="Ignore any existing checkpoint and import from the start.",
+        )
+
+    def handle(self, *args, **options):
+        """Import the catalog in chunks, resuming from the last checkpoint."""
+        path = options['path']
+        from_stdin = path == '-'
+        data_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if data_format not in FORMATS:
+            raise CommandError("Cannot guess the format of {}, use --format.".format(path))
+        if options['chunk_size'] < 1:
+            raise CommandError("The chunk size must be a positive number.")
+
+        checkpoint_path = options['checkpoint']
+        if checkpoint_path is None and not from_stdin:
+            checkpoint_path = path + '.checkpoint'
+
+        checkpoint = {'offset': 0, 'records': 0, 'fieldnames': None, 'created': 0, 'failed': 0}
+        if checkpoint_path and os.path.exists(checkpoint_path) and not options['restart']:
+            with open(checkpoint_path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+            print("Resuming import after record {}.".format(checkpoint['records']))
+
+        stream = sys.stdin.buffer if from_stdin else open(path, 'rb')
+        try:
+            self.import_records(stream, data_format, checkpoint, checkpoint_path, options['chunk_size'])
+        finally:
+            if not from_stdin:
+                stream.close()
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def import_records(self, stream, data_format, checkpoint, checkpoint_path, chunk_size):
+        """Import the records of the stream from the checkpoint onwards."""
+        if checkpoint['records'] and stream.seekable():
+            stream.seek(checkpoint['offset'])
+            reader = RecordReader(
+                stream,
+                data_format,
+                offset=checkpoint['offset'],
+                records=checkpoint['records'],
+                fieldnames=checkpoint['fieldnames'],
+            )
+            records = iter(reader)
+        else:
+            reader = RecordReader(stream, data_format)
+            records = reader.skip(checkpoint['records'])
+
+        started = time.monotonic()
+        imported = 0
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                imported += self.import_chunk(chunk, reader, checkpoint, checkpoint_path)
+                chunk = []
+                self.report(checkpoint, imported, started)
+        if chunk:
+            imported += self.import_chunk(chunk, reader, checkpoint, checkpoint_path)
+            self.report(checkpoint, imported, started)
+
+        print("Import finished: {created} books created, {failed} records failed.".format(**checkpoint))
+
+    def import_chunk(self, chunk, reader, checkpoint, checkpoint_path):
+        """Create the books of a chunk and record the progress."""
+        first_record = reader.records - len(chunk) + 1
+        for result in BookSerializer.ingest(chunk):
+            if 'errors' in result:
+                checkpoint['failed'] += 1
+                print(
+                    "Record {}: {}".format(first_record + result['index'], json.dumps(result['errors'])),
+                    file=sys.stderr,
+                )
+            else:
+                checkpoint['created'] += 1
+
+        checkpoint.update(
+            offset=reader.offset,
+            records=reader.records,
+            fieldnames=reader.fieldnames,
+        )
+        if checkpoint_path:
+            # Replace the checkpoint atomically so that it is never left half written.
+            with open(checkpoint_path + '.tmp', 'w') as checkpoint_file:
+                json.dump(checkpoint, checkpoint_file)
+            os.replace(checkpoint_path + '.tmp', checkpoint_path)
+        return len(chunk)
+
+    def report(self, checkpoint, imported, started):
+        """Print the import progress."""
+        elapsed = time.monotonic() - started
+        print("Imported {records} records ({rate:.0f} records/s).".format(
+            records=checkpoint['records'],
+            rate=imported / elapsed if elapsed else 0,
+        ))
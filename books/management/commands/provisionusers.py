@@ -0,0 +1,57 @@
+"""Command to create users in bulk from an NDJSON or CSV file."""
+
+import json
+import os
+import sys
+
+from django.core.management import BaseCommand, CommandError
+
+from books.provisioning import BATCH_SIZE, provision_users
+from books.streams import FORMATS, RecordReader
+
+
+class Command(BaseCommand):
+    """create users, with their profile and API token, from an NDJSON or CSV file."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help="File of users with the columns username, email, first_name, last_name, "
+                 "password, mobile_number and birth_date, use - to read from the standard input.",
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help="Format of the records, guessed from the file extension by default.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help="Number of users created at once.",
+        )
+
+    def handle(self, *args, **options):
+        """Create the users of the file in batches."""
+        path = options['path']
+        data_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if data_format not in FORMATS:
+            raise CommandError("Cannot guess the format of {}, use --format.".format(path))
+        if options['batch_size'] < 1:
+            raise CommandError("The batch size must be a positive number.")
+
+        stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            results = provision_users(RecordReader(stream, data_format, csv_record=dict), options['batch_size'])
+        finally:
+            if path != '-':
+                stream.close()
+
+        failed = 0
+        for result in results:
+            if 'errors' in result:
+                failed += 1
+                print("Record {}: {}".format(result['index'] + 1, json.dumps(result['errors'])), file=sys.stderr)
+        print("Provisioned {} users, {} records failed.".format(len(results) - failed, failed))
@@ -0,0 +1,17 @@
+"""Command to rebuild the reading statistics of every user."""
+
+from django.core.management import BaseCommand
+
+from books.models import ReadingStats
+from books.stats import rebuild_reading_stats
+
+
+class Command(BaseCommand):
+    """rebuild the reading statistics of every user from the reading lists."""
+
+    help = __doc__
+
+    def handle(self, *args, **options):
+        """Rebuild the reading stats."""
+        rebuild_reading_stats()
+        print("Rebuilt reading stats for {} users.".format(ReadingStats.objects.count()))
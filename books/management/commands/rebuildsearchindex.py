@@ -0,0 +1,19 @@
+"""Command to rebuild the books full-text search index."""
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from books.models import Book
+from books.search import update_index
+
+
+class Command(BaseCommand):
+    """rebuild the full-text search index of every book."""
+
+    help = __doc__
+
+    def handle(self, *args, **options):
+        """Rebuild the search index."""
+        with transaction.atomic():
+            update_index()
+        print("Rebuilt search index for {} books.".format(Book.objects.count()))
@@ -0,0 +1,82 @@
+"""Command to seed a synthetic catalog of books and readers."""
+
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django_common.auth_backends import User
+
+from books.seeding import BATCH_SIZE, SEED, seed_catalog
+
+
+class Command(BaseCommand):
+    """seed a reproducible synthetic catalog of books, with users, favourites and reading lists."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--books',
+            type=int,
+            default=100000,
+            help="Number of books seeded, along with an author for every 10 and a publisher for every 100.",
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=10000,
+            help="Number of users seeded.",
+        )
+        parser.add_argument(
+            '--favourites',
+            type=float,
+            default=20,
+            help="Average number of favourites of each user.",
+        )
+        parser.add_argument(
+            '--reading',
+            type=float,
+            default=30,
+            help="Average number of reading list entries of each user.",
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=SEED,
+            help="Random seed, the same seed generates the same data.",
+        )
+        parser.add_argument(
+            '--prefix',
+            default='reader',
+            help="Prefix of the usernames, followed by the number of each user.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help="Number of rows generated and inserted at once.",
+        )
+
+    def handle(self, *args, **options):
+        """Seed the catalog and print the number of rows created."""
+        if options['books'] < 1 or options['users'] < 0:
+            raise CommandError("The number of books must be positive and the number of users not negative.")
+        if options['batch_size'] < 1:
+            raise CommandError("The batch size must be a positive number.")
+        if options['users'] and User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError("Users named {}... already exist, use another --prefix.".format(options['prefix']))
+
+        started = time.monotonic()
+        counts = seed_catalog(
+            options['books'],
+            options['users'],
+            options['favourites'],
+            options['reading'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            batch_size=options['batch_size'],
+        )
+        print(
+            "Seeded {books} books, {authors} authors, {publishers} publishers, {users} users, "
+            "{favourites} favourites and {reading} reading list entries".format(**counts)
+            + " in {:.1f}s.".format(time.monotonic() - started)
+        )
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+from books.search import BACKENDS
+
+
+def create_search_index(apps, schema_editor):
+    """Create the full-text search structures for the database in use and index the existing books."""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE books_book ADD COLUMN search_vector tsvector")
+        schema_editor.execute(
+            "CREATE INDEX books_book_search_vector_idx ON books_book USING GIN (search_vector)"
+        )
+    elif schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE books_book_fts USING fts5("
+            "title, authors, publisher, description, tokenize='porter unicode61')"
+        )
+    else:
+        return
+    BACKENDS[schema_editor.connection.vendor](schema_editor.connection.alias).update()
+
+
+def drop_search_index(apps, schema_editor):
+    """Drop the full-text search structures."""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX books_book_search_vector_idx")
+        schema_editor.execute("ALTER TABLE books_book DROP COLUMN search_vector")
+    elif schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE books_book_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_auto_20180312_2326'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
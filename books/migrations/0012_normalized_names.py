@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+def normalize_names(apps, schema_editor):
+    """Fill in the normalized names of existing authors and publishers."""
+    for model_name in ('Author', 'Publisher'):
+        model = apps.get_model('books', model_name)
+        for obj in model.objects.only('id', 'name').iterator():
+            model.objects.filter(id=obj.id).update(
+                normalized_name=' '.join(obj.name.split()).casefold(),
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='normalized_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='normalized_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+            preserve_default=False,
+        ),
+        migrations.RunPython(normalize_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 2.2.18 on 2026-10-18 19:18
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+def compute_reading_stats(apps, schema_editor):
+    """Compute the reading stats of the existing reading lists."""
+    ReadingList = apps.get_model('books', 'ReadingList')
+    ReadingStats = apps.get_model('books', 'ReadingStats')
+    ReadingGenreStats = apps.get_model('books', 'ReadingGenreStats')
+    using = schema_editor.connection.alias
+    entries = ReadingList.objects.using(using).order_by()
+    counts = {
+        'started': Count('id', filter=Q(started_reading=True) | Q(finished_reading=True)),
+        'finished': Count('id', filter=Q(finished_reading=True)),
+    }
+
+    stats = {
+        row['user_id']: ReadingStats(user_id=row['user_id'], started=row['started'], finished=row['finished'])
+        for row in entries.values('user_id').annotate(**counts)
+    }
+    for user_id, started_date, finished_date in entries.filter(
+        finished_reading=True,
+        started_date__isnull=False,
+        finished_date__isnull=False,
+    ).values_list('user_id', 'started_date', 'finished_date').iterator():
+        stats[user_id].timed += 1
+        stats[user_id].total_days += (finished_date - started_date).days
+    ReadingStats.objects.using(using).bulk_create(stats.values(), batch_size=1000)
+
+    ReadingGenreStats.objects.using(using).bulk_create((
+        ReadingGenreStats(
+            reading_stats_id=row['user_id'],
+            genre=row['book__genre'],
+            started=row['started'],
+            finished=row['finished'],
+        )
+        for row in entries.values('user_id', 'book__genre').annotate(**counts)
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('books', '0012_normalized_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingStats',
+            fields=[
+                ('started', models.PositiveIntegerField(default=0)),
+                ('finished', models.PositiveIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reading_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('timed', models.PositiveIntegerField(default=0, help_text='Finished books with both a started and finished date.')),
+                ('total_days', models.IntegerField(default=0, help_text='Days taken to read the timed books.')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ReadingGenreStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started', models.PositiveIntegerField(default=0)),
+                ('finished', models.PositiveIntegerField(default=0)),
+                ('genre', models.CharField(choices=[('action', 'Action'), ('adventure', 'Adventure'), ('romance', 'Romance'), ('fiction', 'Fiction'), ('fantasy', 'Fantasy'), ('non-fiction', 'Non Fiction'), ('science-fiction', 'Science Fiction'), ('satire', 'Satire'), ('drama', 'Drama'), ('mystery', 'Mystery'), ('poetry', 'Poetry'), ('comics', 'Comics'), ('horror', 'Horror'), ('art', 'Art'), ('diaries', 'Diaries'), ('guide', 'Guide'), ('travel', 'Travel')], max_length=20)),
+                ('reading_stats', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='genres', to='books.ReadingStats')),
+            ],
+            options={
+                'unique_together': {('reading_stats', 'genre')},
+            },
+        ),
+        migrations.RunPython(compute_reading_stats, migrations.RunPython.noop),
+    ]
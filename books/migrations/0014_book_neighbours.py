@@ -0,0 +1,31 @@
+# Generated by Django 2.2.18 on 2026-10-18 19:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0013_reading_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookNeighbour',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField(help_text='Number of users who favourited both books.')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='books.Book')),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.Book')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bookneighbour',
+            index=models.Index(fields=['book', '-score', 'neighbour'], name='bookneighbour_book_score_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='bookneighbour',
+            unique_together={('book', 'neighbour')},
+        ),
+    ]
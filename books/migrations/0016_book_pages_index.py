@@ -0,0 +1,17 @@
+# Generated by Django 2.2.18 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0015_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['pages', 'id'], name='book_pages_id_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.18 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0016_book_pages_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='author',
+            name='normalized_name',
+            field=models.CharField(db_index=True, editable=False, max_length=600),
+        ),
+        migrations.AlterField(
+            model_name='publisher',
+            name='normalized_name',
+            field=models.CharField(db_index=True, editable=False, max_length=600),
+        ),
+    ]
@@ -1,7 +1,7 @@
 """Books models."""
 
 from django.conf import settings
-from django.db import models
+from django.db import models, router, transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils.timezone import now
@@ -12,16 +12,78 @@ from model_utils import Choices
 from rest_framework.authtoken.models import Token
 
 
+# Casefolding expands a character into up to three, so normalized names can outgrow the names
+NORMALIZED_NAME_LENGTH = 3 * 200
+
+
+def normalize_name(name):
+    """Return the form of a name used to find duplicate authors and publishers."""
+    return ' '.join(name.split()).casefold()
+
+
+class TransactionMarker:
+    """Commit callback doing nothing, which identifies the transaction and savepoint it was registered in.
+
+    Django discards the callbacks of a transaction once it is committed or
+    rolled back, and those of a savepoint once it is rolled back, so the
+    marker is only pending for as long as what was read in it holds. It
+    also counts the writes made since, which outdate what was read before.
+    """
+
+    def __init__(self):
+        self.writes = 0
+
+    def __call__(self):
+        pass
+
+
+def current_transaction(using):
+    """Return the marker of the current transaction and savepoint of a database, or None outside of one."""
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return None
+    savepoint_ids = set(connection.savepoint_ids)
+    for sids, func in connection.run_on_commit:
+        if isinstance(func, TransactionMarker) and sids == savepoint_ids:
+            return func
+    marker = TransactionMarker()
+    transaction.on_commit(marker, using=using)
+    return marker
+
+
+def is_pending(marker, using):
+    """Return whether the transaction and savepoint of a marker are still pending."""
+    connection = transaction.get_connection(using)
+    return marker is not None and any(func is marker for sids, func in connection.run_on_commit)
+
+
+def count_write(using):
+    """Count a write in the pending markers of the current transaction of a database."""
+    for sids, func in transaction.get_connection(using).run_on_commit:
+        if isinstance(func, TransactionMarker):
+            func.writes += 1
+
+
 class Author(models.Model):
     """Author model."""
 
     name = models.CharField(
         max_length=200,
     )
+    normalized_name = models.CharField(
+        max_length=NORMALIZED_NAME_LENGTH,
+        db_index=True,
+        editable=False,
+    )
     description = models.TextField(
         blank=True,
     )
 
+    def save(self, *args, **kwargs):
+        """Override to keep the normalized name in sync."""
+        self.normalized_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         """Return the string representation."""
         return self.name
@@ -33,10 +95,20 @@ class Publisher(models.Model):
     name = models.CharField(
         max_length=200,
     )
+    normalized_name = models.CharField(
+        max_length=NORMALIZED_NAME_LENGTH,
+        db_index=True,
+        editable=False,
+    )
     description = models.TextField(
         blank=True,
     )
 
+    def save(self, *args, **kwargs):
+        """Override to keep the normalized name in sync."""
+        self.normalized_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         """Return the string representation."""
         return self.name
@@ -98,6 +170,29 @@ class Book(models.Model):
         null=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['published_date', 'id'], name='book_published_date_id_idx'),
+            models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+            models.Index(fields=['genre', 'id'], name='book_genre_id_idx'),
+            models.Index(fields=['genre', 'published_date', 'id'], name='book_genre_published_date_idx'),
+            models.Index(fields=['pages', 'id'], name='book_pages_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Remember the genre being replaced, from which the reading stats are moved on save."""
+        update_fields = kwargs.get('update_fields')
+        if self.pk is None or (update_fields is not None and 'genre' not in update_fields):
+            self._previous_genre = None
+            super().save(*args, **kwargs)
+            return
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            self._previous_genre = type(self)._base_manager.using(using).select_for_update().filter(
+                pk=self.pk,
+            ).values_list('genre', flat=True).first()
+            super().save(*args, **kwargs)
+
     def publish(self):
         """Publish book."""
         self.save()
@@ -120,16 +215,51 @@ class Favourite(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.PROTECT,
+        # Covered by the composite indexes leading with the user
+        db_index=False,
     )
 
     class Meta:
         unique_together = ('book', 'user')
+        indexes = [
+            models.Index(fields=['user', 'id'], name='favourite_user_id_idx'),
+            # Favourites of a user by book, the unique constraint leads with the book
+            models.Index(fields=['user', 'book'], name='favourite_user_book_idx'),
+        ]
 
     def __str__(self):
         """Return the string representation."""
         return self.book.title
 
 
+class BookNeighbour(models.Model):
+    """Book favourited by users who also favourited another book."""
+
+    book = models.ForeignKey(
+        Book,
+        related_name='neighbours',
+        on_delete=models.CASCADE,
+    )
+    neighbour = models.ForeignKey(
+        Book,
+        related_name="+",
+        on_delete=models.CASCADE,
+    )
+    score = models.PositiveIntegerField(
+        help_text=_('Number of users who favourited both books.'),
+    )
+
+    class Meta:
+        unique_together = ('book', 'neighbour')
+        indexes = [
+            models.Index(fields=['book', '-score', 'neighbour'], name='bookneighbour_book_score_idx'),
+        ]
+
+    def __str__(self):
+        """Return the string representation."""
+        return '{} - {}'.format(self.book_id, self.neighbour_id)
+
+
 class ReadingList(models.Model):
     """Reading list model."""
 
@@ -157,8 +287,29 @@ class ReadingList(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.PROTECT,
+        # Covered by the composite indexes leading with the user
+        db_index=False,
     )
 
+    # Fields the reading stats are computed from
+    STATE_FIELDS = ('user_id', 'book_id', 'started_reading', 'finished_reading', 'started_date', 'finished_date')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='readinglist_user_id_idx'),
+            models.Index(fields=['user', 'book'], name='readinglist_user_book_idx'),
+            models.Index(
+                fields=['user', 'started_reading', 'finished_reading'],
+                name='readinglist_user_progress_idx',
+            ),
+            # Books being read, as selected by the sms alerts
+            models.Index(
+                fields=['id'],
+                name='readinglist_in_progress_idx',
+                condition=models.Q(started_reading=True, finished_reading=False),
+            ),
+        ]
+
     def mark_date_started(self):
         """Mark date when book was started."""
         self.started_date = now().date()
@@ -167,6 +318,24 @@ class ReadingList(models.Model):
         """Mark date when book was read."""
         self.finished_date = now().date()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded values, from which bulk transitions update the reading stats."""
+        instance = super().from_db(db, field_names, values)
+        instance.set_loaded_values(dict(zip(field_names, values)), db)
+        return instance
+
+    def set_loaded_values(self, values, using):
+        """Remember the values of the entry in the database, along with the transaction they were read in."""
+        self._loaded_values = values
+        self._loaded_in = current_transaction(using)
+        self._loaded_writes = self._loaded_in.writes if self._loaded_in else None
+
+    def has_current_loaded_values(self, using):
+        """Return whether the loaded values were read in this transaction, with no entry written since."""
+        loaded_in = getattr(self, '_loaded_in', None)
+        return is_pending(loaded_in, using) and loaded_in.writes == self._loaded_writes
+
     def save(self, *args, **kwargs):
         """Override to perform validations."""
         if self.started_reading:
@@ -177,7 +346,17 @@ class ReadingList(models.Model):
                 self.started_reading = True
             if not self.started_date:
                 self.mark_date_started()
-        super().save(*args, **kwargs)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        # The reading stats are updated by the post save signal, along with the entry
+        with transaction.atomic(using=using, savepoint=False):
+            # Locked so that concurrent saves of the entry change the stats one
+            # after the other, unless already read in this transaction
+            if self.pk is not None and not self.has_current_loaded_values(using):
+                self.set_loaded_values(type(self)._base_manager.using(using).select_for_update().filter(
+                    pk=self.pk,
+                ).values(*self.STATE_FIELDS).first(), using)
+            count_write(using)
+            super().save(*args, **kwargs)
 
     def publish(self):
         """Publish reading list."""
@@ -188,6 +367,74 @@ class ReadingList(models.Model):
         return self.book.title
 
 
+class ReadingCounts(models.Model):
+    """Counts of books started and finished."""
+
+    started = models.PositiveIntegerField(
+        default=0,
+    )
+    finished = models.PositiveIntegerField(
+        default=0,
+    )
+
+    class Meta:
+        abstract = True
+
+    @property
+    def finish_rate(self):
+        """Return the share of started books which were finished."""
+        return self.finished / self.started if self.started else None
+
+
+class ReadingStats(ReadingCounts):
+    """Reading statistics of a user, kept up to date from the reading list."""
+
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='reading_stats',
+        on_delete=models.CASCADE,
+    )
+    timed = models.PositiveIntegerField(
+        default=0,
+        help_text=_('Finished books with both a started and finished date.'),
+    )
+    total_days = models.IntegerField(
+        default=0,
+        help_text=_('Days taken to read the timed books.'),
+    )
+
+    @property
+    def average_days(self):
+        """Return the average number of days taken to read a book."""
+        return self.total_days / self.timed if self.timed else None
+
+    def __str__(self):
+        """Return the string representation."""
+        return self.user.username
+
+
+class ReadingGenreStats(ReadingCounts):
+    """Reading statistics of a user for a genre."""
+
+    reading_stats = models.ForeignKey(
+        ReadingStats,
+        related_name='genres',
+        on_delete=models.CASCADE,
+    )
+    genre = models.CharField(
+        max_length=20,
+        choices=Book.GENRES,
+    )
+
+    class Meta:
+        unique_together = ('reading_stats', 'genre')
+
+    def __str__(self):
+        """Return the string representation."""
+        return self.genre
+
+
 class Profile(models.Model):
     """Profile model."""
 
@@ -205,6 +452,29 @@ class Profile(models.Model):
         blank=True,
     )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded values, to tell whether the profile changed."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Save the profile and remember the saved values."""
+        super().save(*args, **kwargs)
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname not in deferred
+        }
+
+    @property
+    def has_changed(self):
+        """Return whether the profile differs from its loaded or saved values."""
+        loaded = getattr(self, '_loaded_values', None)
+        return loaded is None or any(getattr(self, name) != value for name, value in loaded.items())
+
     def __str__(self):
         """Return the string representation."""
         return self.user.username
@@ -219,8 +489,9 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    """Update profile when user is updated."""
-    instance.profile.save()
+    """Update profile when user is updated, if it was changed."""
+    if User.profile.is_cached(instance) and instance.profile.has_changed:
+        instance.profile.save()
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
@@ -0,0 +1,301 @@
+"""Books app pagination."""
+
+import datetime
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from functools import reduce
+from operator import and_, or_
+
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import F, Q, QuerySet
+from django.utils.encoding import force_text
+from django.utils.functional import cached_property
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.compat import coreapi, coreschema
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from books.counts import count_rows
+
+
+class KeysetPagination(CursorPagination):
+    """Keyset pagination over a fixed set of indexed orderings.
+
+    Every ordering ends with the primary key so that the position of a row
+    is unique. Pages are fetched by filtering on the position of the last
+    row seen, so deep pages cost the same as the first one and no count of
+    the table is needed. Null values sort after every other value.
+    """
+
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering_query_param = 'ordering'
+    ordering_query_description = _('Which field to use when ordering the results.')
+
+    # Orderings clients can choose from, each one backed by an index.
+    orderings = {
+        'id': ('id',),
+    }
+    default_ordering = 'id'
+
+    # Ordering applied to querysets ranked by the search filter.
+    search_ordering = ('-search_rank', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.nullable = {
+            field.lstrip('-'): self._is_nullable(queryset, field.lstrip('-'))
+            for field in self.ordering
+        }
+
+        position, reverse = self.decode_cursor(request)
+        ordering = self._reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*[self._order_by(field) for field in ordering])
+        if position is not None:
+            queryset = queryset.filter(self._position_filter(ordering, position))
+
+        # Fetch an extra row to know whether there are more rows to come.
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else None
+        return self.encode_cursor(position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering) if self.page else None
+        return self.encode_cursor(position, reverse=True)
+
+    def get_ordering(self, request, queryset, view):
+        """Return the ordering requested by the client."""
+        if 'search_rank' in queryset.query.annotations:
+            return self.search_ordering
+
+        name = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        descending = name.startswith('-')
+        fields = self.orderings.get(name.lstrip('-'))
+        if fields is None:
+            raise NotFound(_('Invalid ordering'))
+        if descending:
+            return self._reverse_ordering(fields)
+        return fields
+
+    def decode_cursor(self, request):
+        """Return the position and direction encoded in the request cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+
+        try:
+            tokens = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = tokens['p']
+            reverse = bool(tokens.get('r', False))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        """Return the url of the page following the position in a direction."""
+        tokens = {'p': position}
+        if reverse:
+            tokens['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(tokens).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for field in ordering:
+            field = field.lstrip('-')
+            value = instance[field] if isinstance(instance, dict) else getattr(instance, field)
+            if isinstance(value, (datetime.date, datetime.datetime)):
+                value = value.isoformat()
+            position.append(value)
+        return position
+
+    def get_schema_fields(self, view):
+        fields = super().get_schema_fields(view)
+        fields.append(
+            coreapi.Field(
+                name=self.ordering_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.Enum(
+                    list(self.orderings) + ['-' + name for name in self.orderings],
+                    title='Ordering',
+                    description=force_text(self.ordering_query_description),
+                ),
+            )
+        )
+        return fields
+
+    def _is_nullable(self, queryset, name):
+        """Return whether the ordering field can hold null values."""
+        if name in queryset.query.annotations:
+            return False
+        return queryset.model._meta.get_field(name).null
+
+    def _order_by(self, field):
+        """Return the expression ordering by the field, nulls sorting last."""
+        name = field.lstrip('-')
+        if not self.nullable[name]:
+            return field
+        if field.startswith('-'):
+            return F(name).desc(nulls_first=True)
+        return F(name).asc(nulls_last=True)
+
+    def _position_filter(self, ordering, position):
+        """Return the condition selecting the rows after the position."""
+        conditions = []
+        equal = []
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            after = self._after(name, field.startswith('-'), value)
+            if after is not None:
+                conditions.append(reduce(and_, equal + [after]))
+            equal.append(Q(**{name + '__isnull': True}) if value is None else Q(**{name: value}))
+        if not conditions:
+            return Q(pk__in=[])
+        return reduce(or_, conditions)
+
+    def _after(self, name, descending, value):
+        """Return the condition on a single field for values after the given one."""
+        nullable = self.nullable[name]
+        if descending:
+            if value is None:
+                return Q(**{name + '__isnull': False})
+            return Q(**{name + '__lt': value})
+        if value is None:
+            return None
+        if nullable:
+            return Q(**{name + '__gt': value}) | Q(**{name + '__isnull': True})
+        return Q(**{name + '__gt': value})
+
+    @staticmethod
+    def _reverse_ordering(ordering):
+        return tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+
+
+class BookPagination(KeysetPagination):
+    """Keyset pagination for books."""
+
+    orderings = {
+        'id': ('id',),
+        'published_date': ('published_date', 'id'),
+        'title': ('title', 'id'),
+    }
+
+
+class EstimatedPage(Page):
+    """Page of an estimated count, which knows whether more rows follow it."""
+
+    def __init__(self, object_list, number, paginator, more):
+        super().__init__(object_list, number, paginator)
+        self.more = more
+
+    def has_next(self):
+        return self.more
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator estimating the number of rows of large querysets.
+
+    The number of pages follows the estimate, but pages of an estimated
+    count are served as long as they hold rows, and each page fetches one
+    more row to know whether another page follows it. The count is
+    corrected once a page reveals the end of the rows or rows past the
+    estimate.
+    """
+
+    # Number of rows from which counts are estimated, defaults to the
+    # `BOOKS_ESTIMATED_COUNT_THRESHOLD` setting
+    threshold = None
+
+    @cached_property
+    def _counted(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count, True
+        return count_rows(self.object_list, self.threshold)
+
+    @property
+    def count(self):
+        return self._counted[0]
+
+    @property
+    def count_is_exact(self):
+        """Return whether the rows were counted rather than estimated."""
+        return self._counted[1]
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Estimates can fall short of the rows, pages past them are
+            # checked once fetched
+            if self.count_is_exact or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        if self.count_is_exact:
+            return super().page(number)
+
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+
+        if not more:
+            self._counted = (bottom + len(rows), True)
+        elif bottom + len(rows) >= self.count:
+            self._counted = (bottom + len(rows) + 1, False)
+        self.__dict__.pop('num_pages', None)
+        return EstimatedPage(rows, number, self, more)
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """Page number pagination estimating the number of rows of large querysets.
+
+    Responses hold the number of rows along with whether it is exact.
+    """
+
+    django_paginator_class = EstimatedCountPaginator
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_exact', self.page.paginator.count_is_exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,134 @@
+"""Books bulk user provisioning.
+
+Creates users in batches, along with the profiles and API tokens that
+saving a user creates one at a time through signals, using a few bulk
+inserts per batch instead of several queries per user.
+"""
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_date
+from django_common.auth_backends import User
+from rest_framework.authtoken.models import Token
+
+from books.ingest import bulk_create_with_ids
+from books.models import Profile
+
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+BATCH_SIZE = 1000
+
+USERNAME_TAKEN = "A user with that username already exists."
+
+
+def validate_record(record):
+    """Return the errors of a user record."""
+    errors = {}
+    if not isinstance(record, dict):
+        return {'non_field_errors': ["Expected a dictionary."]}
+    username = record.get('username')
+    if not isinstance(username, str) or not username.strip():
+        errors['username'] = ["This field is required."]
+    else:
+        try:
+            User._meta.get_field('username').run_validators(username)
+        except ValidationError as error:
+            errors['username'] = error.messages
+    if record.get('birth_date'):
+        try:
+            valid_date = parse_date(record['birth_date'])
+        except (TypeError, ValueError):
+            valid_date = None
+        if valid_date is None:
+            errors['birth_date'] = ["Date has wrong format. Use YYYY-MM-DD."]
+    return errors
+
+
+@transaction.atomic
+def create_users(records):
+    """Create users, with their profile and token, from valid records and return them."""
+    users = []
+    for record in records:
+        user = User(**{field: record.get(field) or '' for field in USER_FIELDS})
+        if record.get('password'):
+            user.set_password(record['password'])
+        else:
+            user.set_unusable_password()
+        users.append(user)
+    bulk_create_with_ids(User, users)
+
+    Profile.objects.bulk_create(
+        Profile(
+            user=user,
+            mobile_number=record.get('mobile_number') or None,
+            birth_date=parse_date(record['birth_date']) if record.get('birth_date') else None,
+        )
+        for user, record in zip(users, records)
+    )
+    tokens = [Token(user=user) for user in users]
+    for token in tokens:
+        token.key = token.generate_key()
+    Token.objects.bulk_create(tokens)
+    return users
+
+
+def provision_users(records, batch_size=BATCH_SIZE):
+    """Create users in batches and return a result per record.
+
+    Records are dictionaries with a `username` and optionally an `email`,
+    `first_name`, `last_name`, `password`, `mobile_number` and `birth_date`.
+    Users without a password cannot log in with one. Results hold the id of
+    the created user, or the errors of the record, which include existing
+    or repeated usernames.
+    """
+    results = []
+    batch = []
+    for index, record in enumerate(records):
+        batch.append((index, record))
+        if len(batch) == batch_size:
+            results.extend(provision_batch(batch))
+            batch = []
+    if batch:
+        results.extend(provision_batch(batch))
+    return results
+
+
+def provision_batch(batch):
+    """Create the users of a batch of indexed records."""
+    results = []
+    valid = []
+    for index, record in batch:
+        errors = validate_record(record)
+        results.append({'index': index, 'errors': errors} if errors else {'index': index})
+        if not errors:
+            valid.append((results[-1], record))
+
+    existing = existing_usernames([record['username'] for result, record in valid])
+    created = []
+    for result, record in valid:
+        if record['username'] in existing:
+            result['errors'] = {'username': [USERNAME_TAKEN]}
+        else:
+            existing.add(record['username'])
+            created.append((result, record))
+
+    try:
+        users = create_users([record for result, record in created])
+    except IntegrityError:
+        # Usernames taken concurrently since the lookup, found creating one user at a time
+        users = []
+        for result, record in created:
+            try:
+                users.extend(create_users([record]))
+            except IntegrityError:
+                result['errors'] = {'username': [USERNAME_TAKEN]}
+        created = [(result, record) for result, record in created if 'errors' not in result]
+
+    for (result, record), user in zip(created, users):
+        result['id'] = user.pk
+    return results
+
+
+def existing_usernames(usernames):
+    """Return the usernames of the given ones that are taken."""
+    return set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
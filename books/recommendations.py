@@ -0,0 +1,204 @@
+"""Books recommendations.
+
+Related books are the books most often favourited by the users who
+favourited a book. The number of users who favourited both books of each
+pair is computed from the favourites with NumPy, and the top k pairs of
+each book are stored as its neighbours. Adding or removing a favourite
+updates the scores of the pairs involving its book, and the index is
+rebuilt from scratch periodically.
+
+Users with more than `MAX_USER_FAVOURITES` favourites are left out, their
+favourites say little about how books relate and their pairs grow with
+the square of their favourites.
+"""
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from books.models import BookNeighbour, Favourite
+
+MAX_USER_FAVOURITES = 500
+
+# Number of favourite pairs counted at once by a full rebuild
+PAIRS_CHUNK_SIZE = 5000000
+
+BATCH_SIZE = 5000
+
+
+def group_bounds(values):
+    """Return the starts and sizes of the runs of equal values of a sorted array."""
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]]) if len(values) else np.zeros(0, dtype=np.int64)
+    return starts, np.diff(np.r_[starts, len(values)]).astype(np.int64)
+
+
+def count_pairs(users, books):
+    """Return the pairs of books favourited by the same users and their counts.
+
+    Take arrays of the user and book of each favourite, sorted by user, and
+    return arrays of the pair keys, `book * base + other book`, of the
+    number of users who favourited each pair, and the base.
+    """
+    base = int(books.max()) + 1 if len(books) else 1
+    starts, sizes = group_bounds(users)
+    if not len(sizes):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), base
+
+    # Split the users into chunks with a bounded number of pairs
+    pairs = np.cumsum(sizes ** 2)
+    firsts = np.unique(np.searchsorted(pairs, np.arange(0, pairs[-1], PAIRS_CHUNK_SIZE), side='right'))
+    keys, counts = [], []
+    for first, last in zip(firsts, np.r_[firsts[1:], len(sizes)]):
+        # Pair every favourite of the chunk with every favourite of the same user
+        group_sizes = np.repeat(sizes[first:last], sizes[first:last])
+        group_starts = np.repeat(starts[first:last], sizes[first:last])
+        left = np.repeat(np.arange(starts[first], starts[first] + len(group_sizes)), group_sizes)
+        offsets = np.arange(len(left)) - np.repeat(np.cumsum(group_sizes) - group_sizes, group_sizes)
+        right = np.repeat(group_starts, group_sizes) + offsets
+
+        distinct = left != right
+        chunk_keys, chunk_counts = np.unique(
+            books[left[distinct]] * base + books[right[distinct]],
+            return_counts=True,
+        )
+        keys.append(chunk_keys)
+        counts.append(chunk_counts)
+
+    keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate(counts)).astype(np.int64)
+    return keys, counts, base
+
+
+def top_neighbours(keys, counts, base, k):
+    """Return the books, neighbours and scores of the top k pairs of each book."""
+    books, neighbours = keys // base, keys % base
+    order = np.lexsort((neighbours, -counts, books))
+    books, neighbours, counts = books[order], neighbours[order], counts[order]
+
+    starts, sizes = group_bounds(books)
+    ranks = np.arange(len(books)) - np.repeat(starts, sizes)
+    top = ranks < k
+    return books[top], neighbours[top], counts[top]
+
+
+def rebuild_neighbours():
+    """Rebuild the neighbours of every book from the favourites and return their number."""
+    favourites = Favourite.objects.order_by('user_id', 'book_id').values_list('user_id', 'book_id')
+    pairs = np.fromiter(
+        (value for pair in favourites.iterator() for value in pair),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    users, books = pairs[:, 0], pairs[:, 1]
+
+    # Leave out the users with too many favourites
+    starts, sizes = group_bounds(users)
+    kept = np.repeat(sizes <= MAX_USER_FAVOURITES, sizes)
+    keys, counts, base = count_pairs(users[kept], books[kept])
+    books, neighbours, scores = top_neighbours(keys, counts, base, settings.BOOKS_RELATED_TOP_K)
+
+    with transaction.atomic():
+        BookNeighbour.objects.all().delete()
+        for start in range(0, len(books), BATCH_SIZE):
+            BookNeighbour.objects.bulk_create(
+                BookNeighbour(book_id=int(book), neighbour_id=int(neighbour), score=int(score))
+                for book, neighbour, score in zip(
+                    books[start:start + BATCH_SIZE],
+                    neighbours[start:start + BATCH_SIZE],
+                    scores[start:start + BATCH_SIZE],
+                )
+            )
+    return len(books)
+
+
+def get_pair_scores(book_id, other_ids):
+    """Return the number of users who favourited a book and each of the others."""
+    if not other_ids:
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT other.book_id, COUNT(*) "
+            "FROM books_favourite AS favourite "
+            "INNER JOIN books_favourite AS other ON other.user_id = favourite.user_id "
+            "WHERE favourite.book_id = %s AND other.book_id IN ({}) "
+            "AND (SELECT COUNT(*) FROM books_favourite AS counted "
+            "WHERE counted.user_id = favourite.user_id) <= %s "
+            "GROUP BY other.book_id".format(', '.join(['%s'] * len(other_ids))),
+            [book_id] + list(other_ids) + [MAX_USER_FAVOURITES],
+        )
+        return dict(cursor.fetchall())
+
+
+def update_neighbours(user_id, book_id):
+    """Update the neighbours of the pairs of a book favourited or unfavourited by a user."""
+    other_ids = list(
+        Favourite.objects.filter(user_id=user_id).exclude(book_id=book_id).values_list('book_id', flat=True)
+    )
+    # Pairs of users with too many favourites are not counted either way
+    if not other_ids or len(other_ids) >= MAX_USER_FAVOURITES:
+        return
+    scores = get_pair_scores(book_id, other_ids)
+
+    lists = {book: {} for book in [book_id] + other_ids}
+    for book, neighbour, score in BookNeighbour.objects.filter(
+        book_id__in=lists,
+    ).values_list('book_id', 'neighbour_id', 'score'):
+        lists[book][neighbour] = score
+    current = {book: dict(neighbours) for book, neighbours in lists.items()}
+
+    for other_id in other_ids:
+        score = scores.get(other_id, 0)
+        for book, neighbour in ((book_id, other_id), (other_id, book_id)):
+            if score:
+                lists[book][neighbour] = score
+            else:
+                lists[book].pop(neighbour, None)
+
+    changed = {}
+    for book, neighbours in lists.items():
+        top = sorted(neighbours.items(), key=lambda item: (-item[1], item[0]))[:settings.BOOKS_RELATED_TOP_K]
+        if dict(top) != current[book]:
+            changed[book] = top
+
+    if changed:
+        BookNeighbour.objects.filter(book_id__in=changed).delete()
+        BookNeighbour.objects.bulk_create(
+            BookNeighbour(book_id=book, neighbour_id=neighbour, score=score)
+            for book, top in changed.items()
+            for neighbour, score in top
+        )
+
+
+def get_related_book_ids(book_id):
+    """Return the ids of the books related to a book, most related first."""
+    return list(
+        BookNeighbour.objects.filter(book_id=book_id).order_by(
+            '-score', 'neighbour_id',
+        ).values_list('neighbour_id', flat=True)[:settings.BOOKS_RELATED_TOP_K]
+    )
+
+
+@receiver(pre_save, sender=Favourite)
+def favourite_changing(sender, instance, raw, **kwargs):
+    """Remember the book of a favourite being changed."""
+    if raw or instance.pk is None:
+        return
+    instance._previous_favourite = Favourite.objects.filter(pk=instance.pk).values_list('user_id', 'book_id').first()
+
+
+@receiver(post_save, sender=Favourite)
+def favourite_saved(sender, instance, raw, **kwargs):
+    """Update the neighbours of a favourited book."""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_favourite', None)
+    if previous and previous != (instance.user_id, instance.book_id):
+        update_neighbours(*previous)
+    update_neighbours(instance.user_id, instance.book_id)
+
+
+@receiver(post_delete, sender=Favourite)
+def favourite_deleted(sender, instance, **kwargs):
+    """Update the neighbours of an unfavourited book."""
+    update_neighbours(instance.user_id, instance.book_id)
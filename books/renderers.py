@@ -0,0 +1,59 @@
+"""Books app renderers.
+
+Render records as NDJSON or CSV, either all at once for regular responses
+or one record at a time for streamed exports.
+"""
+
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Render records as lines of JSON."""
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return ''.join(self.stream(data if isinstance(data, list) else [data])).encode(self.charset)
+
+    def stream(self, records, fieldnames=None):
+        """Yield the line of each record."""
+        for record in records:
+            yield json.dumps(record, cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+
+class CSVRenderer(BaseRenderer):
+    """Render records as CSV rows, after a header row."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        records = data if isinstance(data, list) else [data]
+        fieldnames = list(records[0]) if records else []
+        return ''.join(self.stream(records, fieldnames)).encode(self.charset)
+
+    def stream(self, records, fieldnames):
+        """Yield the header row and the row of each record."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        # Header of an empty export
+        if buffer.tell():
+            yield buffer.getvalue()
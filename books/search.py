@@ -0,0 +1,303 @@
+"""Books full-text search index.
+
+Books are indexed on their title, author names, publisher name and
+description. On PostgreSQL the index is a ``tsvector`` column on the books
+table backed by a GIN index, on SQLite it is an FTS5 shadow table keyed by
+the book id. The index is kept up to date through model signals and can be
+rebuilt in bulk with the ``rebuildsearchindex`` management command.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from books.models import Author, Book, Publisher
+
+SEARCH_TABLE = 'books_book_fts'
+
+# Number of book ids sent in a single statement, kept below the SQLite
+# limit on query parameters.
+BATCH_SIZE = 500
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(terms):
+    """Split the search terms into words safe to embed in a search query."""
+    return TOKEN_RE.findall(terms.lower())
+
+
+def _chunks(ids):
+    """Split the ids into lists small enough for a single statement."""
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+class SearchBackend:
+    """Base search backend."""
+
+    def __init__(self, using):
+        self.connection = connections[using]
+
+    def update(self, book_ids=None):
+        """Index the given books, or every book when no ids are given."""
+        raise NotImplementedError
+
+    def remove(self, book_ids):
+        """Remove the given books from the index."""
+        raise NotImplementedError
+
+    def search(self, queryset, terms):
+        """Filter the queryset to matching books annotated by `search_rank`."""
+        raise NotImplementedError
+
+    def matching_ids(self, terms):
+        """Return an expression selecting the ids of the books matching the terms."""
+        raise NotImplementedError
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Search backend using a maintained tsvector column and GIN index."""
+
+    vector_sql = """
+        setweight(to_tsvector(%(config)s, coalesce(book.title, '')), 'A') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(author.name, ' ')
+            FROM books_author author
+            INNER JOIN books_book_authors book_author ON book_author.author_id = author.id
+            WHERE book_author.book_id = book.id
+        ), '')), 'B') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT publisher.name
+            FROM books_publisher publisher
+            WHERE publisher.id = book.publisher_id
+        ), '')), 'B') ||
+        setweight(to_tsvector(%(config)s, coalesce(book.description, '')), 'C')
+    """
+
+    @property
+    def params(self):
+        return {'config': settings.BOOKS_SEARCH_CONFIG}
+
+    def update(self, book_ids=None):
+        sql = "UPDATE books_book book SET search_vector = {}".format(self.vector_sql)
+        with self.connection.cursor() as cursor:
+            if book_ids is None:
+                cursor.execute(sql, self.params)
+                return
+            for chunk in _chunks(book_ids):
+                cursor.execute(
+                    sql + " WHERE book.id = ANY(%(ids)s)",
+                    dict(self.params, ids=chunk),
+                )
+
+    def remove(self, book_ids):
+        # The vector is stored on the book row and removed together with it.
+        pass
+
+    def search(self, queryset, terms):
+        query = ' & '.join('{}:*'.format(token) for token in tokenize(terms))
+        tsquery = "to_tsquery(%s::regconfig, %s)"
+        params = (settings.BOOKS_SEARCH_CONFIG, query)
+        return queryset.extra(
+            where=["books_book.search_vector @@ {}".format(tsquery)],
+            params=params,
+        ).annotate(
+            search_rank=RawSQL(
+                "ts_rank(books_book.search_vector, {})".format(tsquery),
+                params,
+                output_field=FloatField(),
+            ),
+        )
+
+    def matching_ids(self, terms):
+        query = ' & '.join('{}:*'.format(token) for token in tokenize(terms))
+        return RawSQL(
+            "SELECT id FROM books_book WHERE search_vector @@ to_tsquery(%s::regconfig, %s)",
+            (settings.BOOKS_SEARCH_CONFIG, query),
+        )
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """Search backend using an FTS5 shadow table."""
+
+    insert_sql = """
+        INSERT INTO {table} (rowid, title, authors, publisher, description)
+        SELECT
+            book.id,
+            book.title,
+            (
+                SELECT group_concat(author.name, ' ')
+                FROM books_author author
+                INNER JOIN books_book_authors book_author ON book_author.author_id = author.id
+                WHERE book_author.book_id = book.id
+            ),
+            publisher.name,
+            book.description
+        FROM books_book book
+        LEFT OUTER JOIN books_publisher publisher ON publisher.id = book.publisher_id
+    """.format(table=SEARCH_TABLE)
+
+    # Column weights for bm25, in the order the columns are declared.
+    weights = '10.0, 5.0, 5.0, 1.0'
+
+    def update(self, book_ids=None):
+        with self.connection.cursor() as cursor:
+            if book_ids is None:
+                cursor.execute("DELETE FROM {}".format(SEARCH_TABLE))
+                cursor.execute(self.insert_sql)
+                return
+            for chunk in _chunks(book_ids):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(
+                    "DELETE FROM {} WHERE rowid IN ({})".format(SEARCH_TABLE, placeholders),
+                    chunk,
+                )
+                cursor.execute(
+                    self.insert_sql + " WHERE book.id IN ({})".format(placeholders),
+                    chunk,
+                )
+
+    def remove(self, book_ids):
+        with self.connection.cursor() as cursor:
+            for chunk in _chunks(book_ids):
+                cursor.execute(
+                    "DELETE FROM {} WHERE rowid IN ({})".format(
+                        SEARCH_TABLE,
+                        ', '.join(['%s'] * len(chunk)),
+                    ),
+                    chunk,
+                )
+
+    def search(self, queryset, terms):
+        query = ' '.join('"{}"*'.format(token) for token in tokenize(terms))
+        return queryset.extra(
+            where=[
+                "books_book.id IN (SELECT rowid FROM {table} WHERE {table} MATCH %s)".format(
+                    table=SEARCH_TABLE,
+                ),
+            ],
+            params=(query,),
+        ).annotate(
+            # bm25 scores better matches lower, negate it so that higher ranks
+            # are more relevant on every backend.
+            search_rank=RawSQL(
+                "SELECT -bm25({table}, {weights}) FROM {table} "
+                "WHERE {table} MATCH %s AND rowid = books_book.id".format(
+                    table=SEARCH_TABLE,
+                    weights=self.weights,
+                ),
+                (query,),
+                output_field=FloatField(),
+            ),
+        )
+
+    def matching_ids(self, terms):
+        query = ' '.join('"{}"*'.format(token) for token in tokenize(terms))
+        return RawSQL("SELECT rowid FROM {table} WHERE {table} MATCH %s".format(table=SEARCH_TABLE), (query,))
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_backend(using=None):
+    """Return the search backend for the given database alias."""
+    using = using or router.db_for_write(Book)
+    return BACKENDS[connections[using].vendor](using)
+
+
+def update_index(book_ids=None):
+    """Index the given books, or rebuild the whole index when no ids are given."""
+    if book_ids is not None:
+        book_ids = list(book_ids)
+        if not book_ids:
+            return
+    get_backend().update(book_ids)
+
+
+def remove_from_index(book_ids):
+    """Remove the given books from the index."""
+    get_backend().remove(list(book_ids))
+
+
+def search_book_ids(terms, using=None):
+    """Return an expression selecting the ids of the books matching the terms.
+
+    Unlike `search_books`, it can filter the books related to other rows,
+    as a subquery of their queryset.
+    """
+    return get_backend(using).matching_ids(terms)
+
+
+def search_books(queryset, terms):
+    """Return the books of the queryset matching the terms, ranked by relevance."""
+    if not tokenize(terms):
+        return queryset.none()
+    return get_backend(queryset.db).search(queryset, terms).order_by('-search_rank', 'id')
+
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, raw=False, **kwargs):
+    """Index a book when it is saved."""
+    if not raw:
+        update_index([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def remove_deleted_book(sender, instance, **kwargs):
+    """Remove a book from the index when it is deleted."""
+    remove_from_index([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def index_book_authors(sender, instance, action, reverse, pk_set, **kwargs):
+    """Index books when their authors change."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        update_index((pk_set or []) if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def index_author_books(sender, instance, raw=False, **kwargs):
+    """Index the books of an author when the author is saved."""
+    if not raw:
+        update_index(
+            Book.authors.through.objects.filter(
+                author_id=instance.pk,
+            ).values_list('book_id', flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Author)
+def collect_deleted_author_books(sender, instance, **kwargs):
+    """Remember the books of an author about to be deleted."""
+    instance._indexed_book_ids = list(
+        Book.authors.through.objects.filter(
+            author_id=instance.pk,
+        ).values_list('book_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Author)
+def index_deleted_author_books(sender, instance, **kwargs):
+    """Index the books of a deleted author."""
+    update_index(getattr(instance, '_indexed_book_ids', []))
+
+
+@receiver(post_save, sender=Publisher)
+def index_publisher_books(sender, instance, raw=False, **kwargs):
+    """Index the books of a publisher when the publisher is saved."""
+    if not raw:
+        update_index(
+            Book.objects.filter(
+                publisher_id=instance.pk,
+            ).values_list('id', flat=True)
+        )
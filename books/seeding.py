@@ -0,0 +1,272 @@
+"""Books synthetic catalog seeding.
+
+Generate a catalog of books, authors and publishers, and users with their
+favourites and reading lists, reproducibly from a random seed. Values are
+drawn with NumPy a batch at a time, popularity is skewed so that a few
+genres, publishers, authors and books account for most rows, as in real
+catalogs, and rows are inserted with COPY on PostgreSQL and batched prepared
+inserts on other databases.
+
+Books, authors and publishers are inserted with explicit ids following the
+highest existing ones, seeding is meant for development and benchmark
+databases nobody else writes to at the same time.
+"""
+
+import csv
+import datetime
+import io
+
+import numpy as np
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.db.models import Max
+
+from books.caching import bump_catalog_versions
+from books.models import Author, Book, Favourite, Publisher, ReadingList, normalize_name
+from books.provisioning import create_users
+from books.recommendations import rebuild_neighbours
+from books.search import update_index
+from books.stats import rebuild_reading_stats
+
+SEED = 42
+
+BATCH_SIZE = 10000
+
+WORDS = (
+    'shadow', 'river', 'garden', 'winter', 'silent', 'crown', 'house', 'stone', 'night', 'summer',
+    'glass', 'iron', 'secret', 'lost', 'golden', 'broken', 'wild', 'last', 'hidden', 'northern',
+    'song', 'city', 'island', 'storm', 'letter', 'mirror', 'empire', 'forest', 'harbour', 'tide',
+)
+FIRST_NAMES = (
+    'Ada', 'Boris', 'Clara', 'Dmitri', 'Elena', 'Felix', 'Greta', 'Hugo', 'Irene', 'Jonas',
+    'Kate', 'Leo', 'Mara', 'Nils', 'Olga', 'Pablo', 'Rosa', 'Simon', 'Tess', 'Viktor',
+)
+LAST_NAMES = (
+    'Abbott', 'Brandt', 'Castillo', 'Dumont', 'Ellis', 'Fischer', 'Gray', 'Horvat', 'Ivanova', 'Jensen',
+    'Keller', 'Lindqvist', 'Moreau', 'Novak', 'Okafor', 'Petrov', 'Quinn', 'Rossi', 'Sato', 'Tanaka',
+)
+
+# Probabilities of a book having one, two or three authors
+AUTHORS_PER_BOOK = (0.75, 0.2, 0.05)
+
+# Probabilities of a reading list entry being unstarted, in progress or finished
+READING_STATES = (0.25, 0.15, 0.6)
+
+
+def zipf_weights(size, exponent=1.1):
+    """Return the probabilities of ranks following a Zipf-like law."""
+    weights = 1 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def next_id(model):
+    """Return the id following the highest id of a model."""
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+def insert_rows(model, fields, rows):
+    """Insert rows of values of the given fields, with COPY on PostgreSQL.
+
+    Other databases get a single prepared insert executed for every row,
+    which skips building and preparing a model instance per row.
+    """
+    connection = connections[router.db_for_write(model)]
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(model._meta.get_field(field).column) for field in fields)
+    with connection.cursor() as cursor:
+        if connection.vendor != 'postgresql':
+            cursor.executemany(
+                "INSERT INTO {} ({}) VALUES ({})".format(table, columns, ', '.join(['%s'] * len(fields))),
+                rows,
+            )
+            return
+
+        # Empty values are copied as nulls, which the seeded text fields never are
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert("COPY {} ({}) FROM STDIN WITH (FORMAT csv)".format(table, columns), buffer)
+
+
+def reset_sequences(*models):
+    """Move the id sequences of the models past the inserted ids."""
+    connection = connections[router.db_for_write(models[0])]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def seed_names(model, names, description):
+    """Insert authors or publishers with the given names and return their ids."""
+    first_id = next_id(model)
+    # The id keeps each name unique
+    names = ['{} {}'.format(name, first_id + index) for index, name in enumerate(names)]
+    insert_rows(model, ('id', 'name', 'normalized_name', 'description'), [
+        (first_id + index, name, normalize_name(name), description)
+        for index, name in enumerate(names)
+    ])
+    return np.arange(first_id, first_id + len(names))
+
+
+def seed_authors(rng, count):
+    """Insert authors and return their ids."""
+    first = rng.integers(len(FIRST_NAMES), size=count)
+    last = rng.integers(len(LAST_NAMES), size=count)
+    return seed_names(Author, [
+        '{} {}'.format(FIRST_NAMES[i], LAST_NAMES[j]) for i, j in zip(first, last)
+    ], "A synthetic author.")
+
+
+def seed_publishers(rng, count):
+    """Insert publishers and return their ids."""
+    return seed_names(Publisher, [
+        '{} Press'.format(LAST_NAMES[i]) for i in rng.integers(len(LAST_NAMES), size=count)
+    ], "A synthetic publisher.")
+
+
+def seed_books(rng, count, publisher_ids, author_ids, batch_size=BATCH_SIZE):
+    """Insert books, with skewed genres, publishers and authors, and return their ids."""
+    genres = [genre for genre, label in Book.GENRES]
+    genre_weights = zipf_weights(len(genres))[rng.permutation(len(genres))]
+    publisher_weights = zipf_weights(len(publisher_ids))
+    author_weights = zipf_weights(len(author_ids))
+    today = datetime.date.today()
+
+    first_id = next_id(Book)
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        ids = np.arange(first_id + start, first_id + start + size)
+        genre_indexes = rng.choice(len(genres), size=size, p=genre_weights)
+        publishers = publisher_ids[rng.choice(len(publisher_ids), size=size, p=publisher_weights)]
+        pages = np.clip(rng.lognormal(5.6, 0.5, size=size), 20, 2000).astype(np.int64)
+        # Recent books are more common
+        ages = np.minimum(rng.exponential(3650, size=size), 60 * 365).astype(np.int64)
+        words = rng.integers(len(WORDS), size=(size, 3))
+
+        insert_rows(Book, ('id', 'title', 'genre', 'description', 'pages', 'publisher_id', 'published_date'), [
+            (
+                int(book_id),
+                'The {} {} of the {}'.format(WORDS[first].title(), WORDS[second].title(), WORDS[third].title()),
+                genres[genre],
+                "A {} book about the {} {}.".format(genres[genre], WORDS[first], WORDS[second]),
+                int(page_count),
+                int(publisher_id),
+                today - datetime.timedelta(days=int(age)),
+            )
+            for book_id, genre, page_count, publisher_id, age, (first, second, third) in zip(
+                ids, genre_indexes, pages, publishers, ages, words,
+            )
+        ])
+
+        author_counts = rng.choice(len(AUTHORS_PER_BOOK), size=size, p=AUTHORS_PER_BOOK) + 1
+        authors = author_ids[rng.choice(len(author_ids), size=int(author_counts.sum()), p=author_weights)]
+        links = np.unique(np.repeat(ids, author_counts) * (int(author_ids.max()) + 1) + authors)
+        insert_rows(Book.authors.through, ('book_id', 'author_id'), [
+            (int(book_id), int(author_id))
+            for book_id, author_id in zip(*np.divmod(links, int(author_ids.max()) + 1))
+        ])
+    return np.arange(first_id, first_id + count)
+
+
+def seed_users(count, prefix, batch_size=BATCH_SIZE):
+    """Create users, with their profile and token, and return their ids."""
+    user_ids = []
+    for start in range(0, count, batch_size):
+        users = create_users([
+            {'username': '{}{}'.format(prefix, index)}
+            for index in range(start, min(start + batch_size, count))
+        ])
+        user_ids.extend(user.pk for user in users)
+    return np.array(user_ids, dtype=np.int64)
+
+
+def draw_pairs(rng, user_ids, book_ids, book_weights, mean):
+    """Return users and books drawn with skewed counts per user and book popularity.
+
+    Each user gets a log-normal number of books averaging `mean`, drawn
+    according to the book weights, repeated books being dropped.
+    """
+    if mean <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    counts = np.minimum(np.round(rng.lognormal(np.log(mean) - 0.5, 1.0, size=len(user_ids))), len(book_ids))
+    users = np.repeat(user_ids, counts.astype(np.int64))
+    books = book_ids[rng.choice(len(book_ids), size=len(users), p=book_weights)]
+    keys = np.unique(users * (int(book_ids.max()) + 1) + books)
+    return np.divmod(keys, int(book_ids.max()) + 1)
+
+
+def seed_favourites(rng, user_ids, book_ids, book_weights, mean, batch_size=BATCH_SIZE):
+    """Insert the favourites of the users and return their number."""
+    users, books = draw_pairs(rng, user_ids, book_ids, book_weights, mean)
+    for start in range(0, len(users), batch_size):
+        insert_rows(Favourite, ('user_id', 'book_id'), [
+            (int(user_id), int(book_id))
+            for user_id, book_id in zip(users[start:start + batch_size], books[start:start + batch_size])
+        ])
+    return len(users)
+
+
+def seed_reading_lists(rng, user_ids, book_ids, book_weights, mean, batch_size=BATCH_SIZE):
+    """Insert the reading list entries of the users and return their number."""
+    users, books = draw_pairs(rng, user_ids, book_ids, book_weights, mean)
+    states = rng.choice(len(READING_STATES), size=len(users), p=READING_STATES)
+    started_ages = np.minimum(rng.exponential(365, size=len(users)), 10 * 365).astype(np.int64)
+    # Books take a couple of weeks to read, some much longer
+    reading_days = np.minimum(rng.lognormal(np.log(14), 0.8, size=len(users)), started_ages).astype(np.int64)
+    today = datetime.date.today()
+
+    for start in range(0, len(users), batch_size):
+        rows = []
+        for user_id, book_id, state, started_age, days in zip(
+            users[start:start + batch_size],
+            books[start:start + batch_size],
+            states[start:start + batch_size],
+            started_ages[start:start + batch_size],
+            reading_days[start:start + batch_size],
+        ):
+            started_date = today - datetime.timedelta(days=int(started_age)) if state else None
+            finished_date = started_date + datetime.timedelta(days=int(days)) if state == 2 else None
+            rows.append((int(user_id), int(book_id), bool(state), started_date, state == 2, finished_date))
+        insert_rows(ReadingList, (
+            'user_id', 'book_id', 'started_reading', 'started_date', 'finished_reading', 'finished_date',
+        ), rows)
+    return len(users)
+
+
+def seed_catalog(books, users, favourites, reading, seed=SEED, prefix='reader', batch_size=BATCH_SIZE):
+    """Seed a synthetic catalog and users, and return the number of rows of each kind.
+
+    Favourites and reading are the average numbers of favourites and
+    reading list entries of each user. The search index, reading stats and
+    related books are rebuilt from the seeded rows.
+    """
+    rng = np.random.default_rng(seed)
+    with transaction.atomic():
+        publisher_ids = seed_publishers(rng, max(1, books // 100))
+        author_ids = seed_authors(rng, max(1, books // 10))
+        book_ids = seed_books(rng, books, publisher_ids, author_ids, batch_size)
+        reset_sequences(Publisher, Author, Book)
+
+        user_ids = seed_users(users, prefix, batch_size)
+        counts = {
+            'publishers': len(publisher_ids),
+            'authors': len(author_ids),
+            'books': len(book_ids),
+            'users': len(user_ids),
+            'favourites': 0,
+            'reading': 0,
+        }
+        if len(user_ids):
+            # Popular books are spread over the ids rather than being the first ones
+            book_weights = zipf_weights(len(book_ids))[rng.permutation(len(book_ids))]
+            counts['favourites'] = seed_favourites(rng, user_ids, book_ids, book_weights, favourites, batch_size)
+            counts['reading'] = seed_reading_lists(rng, user_ids, book_ids, book_weights, reading, batch_size)
+
+        update_index()
+        rebuild_reading_stats()
+        # Bulk inserts send no signals
+        bump_catalog_versions(Book, Author, Publisher)
+    rebuild_neighbours()
+    return counts
@@ -1,14 +1,57 @@
 """Books app serializers."""
 
-from rest_framework import serializers
+from collections import OrderedDict
 
+from django.conf import settings
+from django.db.models import Prefetch
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from books.ingest import create_books
 from books.models import (
     Author,
     Book,
     Publisher,
+    ReadingGenreStats,
     ReadingList,
+    ReadingStats,
     Favourite,
 )
+from bookworm.metrics import timed
+
+
+class EagerLoadingMixin:
+    """Provide a mixin declaring the related data a serializer renders.
+
+    Viewsets apply these lookups to their queryset so that nested
+    representations are loaded with a constant number of queries.
+    """
+
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Apply the declared related lookups to the queryset."""
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        return queryset
+
+
+class TimedSerializerMixin:
+    """Provide a mixin adding the time spent serializing to the request timings."""
+
+    @property
+    def data(self):
+        """Return the serialized data, timing its serialization."""
+        with timed('serialize'):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
 
 
 class UserValidateModelSerializerMixin(serializers.ModelSerializer):
@@ -45,10 +88,15 @@ class PublisherSerializer(serializers.ModelSerializer):
         exclude = []
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(TimedSerializerMixin, EagerLoadingMixin, serializers.ModelSerializer):
     authors = AuthorSerializer(many=True)
     publisher = PublisherSerializer()
 
+    select_related_fields = ('publisher',)
+    prefetch_related_fields = (
+        Prefetch('authors', queryset=Author.objects.order_by('id')),
+    )
+
     class Meta:
         model = Book
         fields = (
@@ -62,20 +110,118 @@ class BookSerializer(serializers.ModelSerializer):
             'published_date',
         )
         exclude = []
+        list_serializer_class = TimedListSerializer
 
     def create(self, validated_data):
-        """Create author and publisher."""
-        publisher_data = validated_data.pop('publisher')
-        publisher = Publisher.objects.create(**publisher_data)
-        validated_data['publisher'] = publisher
-        authors_data = validated_data.pop('authors')
-        book = Book.objects.create(**validated_data)
-        for author in authors_data:
-            Author.objects.create(**author)
-        return book
+        """Create book, reusing existing authors and publisher."""
+        return create_books([validated_data])[0]
+
+    @classmethod
+    def ingest(cls, items):
+        """Validate and create many books at once.
+
+        Return a result per item, holding the id of the created book or the
+        validation errors of the item.
+        """
+        # Validate every item with a single serializer, as list serializers
+        # do, so that its fields are only built once.
+        serializer = cls()
+        results = []
+        rows = []
+        for index, item in enumerate(items):
+            try:
+                rows.append(serializer.run_validation(item))
+            except serializers.ValidationError as exc:
+                results.append({'index': index, 'errors': exc.detail})
+            else:
+                results.append({'index': index})
+
+        books = iter(create_books(rows))
+        for result in results:
+            if 'errors' not in result:
+                result['id'] = next(books).pk
+        return results
+
+
+class BookValuesSerializer:
+    """Read-only serializer of books listed as rows of values.
+
+    Render the same data as `BookSerializer` from `values()` rows and a
+    single query for the authors of all the books, without going through
+    the serializer fields for every row.
+    """
+
+    book_fields = ('id', 'title', 'genre', 'description', 'pages')
+    publisher_fields = ('publisher__id', 'publisher__name', 'publisher__description')
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+
+    @classmethod
+    def setup_values(cls, queryset):
+        """Return the rows of values to render for the queryset."""
+        return queryset.select_related(None).prefetch_related(None).values(
+            *cls.book_fields,
+            'published_date',
+            *cls.publisher_fields,
+            *queryset.query.annotations
+        )
+
+    @staticmethod
+    def get_authors(book_ids):
+        """Return the authors of each book, as rendered by `AuthorSerializer`."""
+        authors = {}
+        for book_id, author_id, name, description in Book.authors.through.objects.filter(
+            book_id__in=book_ids,
+        ).order_by('author_id').values_list('book_id', 'author__id', 'author__name', 'author__description'):
+            authors.setdefault(book_id, []).append(OrderedDict((
+                ('id', author_id),
+                ('name', name),
+                ('description', description),
+            )))
+        return authors
 
+    @staticmethod
+    def get_date_formatter():
+        """Return the function rendering dates as `DateField` does."""
+        date_format = api_settings.DATE_FORMAT
+        if date_format is None:
+            return lambda value: value
+        if date_format.lower() == ISO_8601:
+            return lambda value: value.isoformat() if value else None
+        return lambda value: value.strftime(date_format) if value else None
 
-class ReadingListSerializer(UserValidateModelSerializerMixin):
+    @property
+    def data(self):
+        """Return the representation of the books."""
+        with timed('serialize'):
+            return self.to_representation(list(self.rows))
+
+    def to_representation(self, rows):
+        """Return the representation of rows of values."""
+        authors = self.get_authors([row['id'] for row in rows])
+        format_date = self.get_date_formatter()
+        return [
+            OrderedDict((
+                ('id', row['id']),
+                ('title', row['title']),
+                ('genre', row['genre']),
+                ('description', row['description']),
+                ('pages', row['pages']),
+                ('authors', authors.get(row['id'], [])),
+                ('publisher', OrderedDict((
+                    ('id', row['publisher__id']),
+                    ('name', row['publisher__name']),
+                    ('description', row['publisher__description']),
+                ))),
+                ('published_date', format_date(row['published_date'])),
+            ))
+            for row in rows
+        ]
+
+
+class ReadingListSerializer(TimedSerializerMixin, UserValidateModelSerializerMixin):
 
     class Meta:
         model = ReadingList
@@ -91,9 +237,67 @@ class ReadingListSerializer(UserValidateModelSerializerMixin):
             'finished_reading',
             'user',
         )
+        list_serializer_class = TimedListSerializer
+
+
+class ReadingListTransitionListSerializer(serializers.ListSerializer):
+
+    def to_internal_value(self, data):
+        """Check the number of transitions and that their books exist with one query."""
+        # Oversized payloads are rejected before validating any transition
+        if isinstance(data, list) and len(data) > settings.BOOKS_BULK_MAX_ITEMS:
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                "Cannot apply more than {} transitions at once.".format(settings.BOOKS_BULK_MAX_ITEMS)
+            ]})
+        attrs = super().to_internal_value(data)
+        self.genres = dict(Book.objects.filter(
+            pk__in={transition['book'] for transition in attrs},
+        ).values_list('id', 'genre'))
+        errors = [
+            {} if transition['book'] in self.genres else {'book': ["Invalid pk \"{}\" - object does not exist.".format(transition['book'])]}
+            for transition in attrs
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return attrs
+
+
+class ReadingListTransitionSerializer(serializers.Serializer):
+    book = serializers.IntegerField()
+    started_reading = serializers.BooleanField(required=False)
+    finished_reading = serializers.BooleanField(required=False)
+
+    class Meta:
+        list_serializer_class = ReadingListTransitionListSerializer
+
+
+class ReadingGenreStatsSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ReadingGenreStats
+        fields = (
+            'genre',
+            'started',
+            'finished',
+            'finish_rate',
+        )
+
+
+class ReadingStatsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    genres = ReadingGenreStatsSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ReadingStats
+        fields = (
+            'started',
+            'finished',
+            'finish_rate',
+            'average_days',
+            'genres',
+        )
 
 
-class FavouriteSerializer(UserValidateModelSerializerMixin):
+class FavouriteSerializer(TimedSerializerMixin, UserValidateModelSerializerMixin):
 
     class Meta:
         model = Favourite
@@ -103,3 +307,4 @@ class FavouriteSerializer(UserValidateModelSerializerMixin):
             'user',
         )
         exclude = []
+        list_serializer_class = TimedListSerializer
@@ -0,0 +1,161 @@
+"""Books reading statistics.
+
+The reading statistics of each user, overall and by genre, are kept in
+summary tables. Saving or deleting a reading list entry applies the
+difference between its previous and current state to them, so that they
+are read without scanning the reading list, and changing the genre of a
+book moves the counts of its entries to the new genre. Changes which send
+no signals, such as queryset updates, are only repaired by
+`rebuild_reading_stats`, which recomputes all the stats from the reading
+list with a few set-based queries.
+"""
+
+from collections import Counter, defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from books.models import Book, ReadingGenreStats, ReadingList, ReadingStats
+
+# Number of days between the started and finished dates of a reading list entry
+DAYS_SQL = {
+    'postgresql': "finished_date - started_date",
+    'sqlite': "CAST(julianday(finished_date) - julianday(started_date) AS INTEGER)",
+    'mysql': "DATEDIFF(finished_date, started_date)",
+}
+
+TIMED_SQL = "finished_reading AND started_date IS NOT NULL AND finished_date IS NOT NULL"
+
+
+def get_state(entry):
+    """Return the values of a reading list entry the stats are computed from."""
+    return {field: getattr(entry, field) for field in ReadingList.STATE_FIELDS}
+
+
+def get_counts(state):
+    """Return the counts a reading list entry state adds to the stats."""
+    counts = Counter()
+    counts['started'] = int(bool(state['started_reading'] or state['finished_reading']))
+    counts['finished'] = int(bool(state['finished_reading']))
+    if state['finished_reading'] and state['started_date'] and state['finished_date']:
+        counts['timed'] = 1
+        counts['total_days'] = (state['finished_date'] - state['started_date']).days
+    return counts
+
+
+def apply_changes(changes, genres=None):
+    """Apply changes of reading list entries to the stats.
+
+    Changes are pairs of a reading list entry state and 1 if it is added
+    to the stats or -1 if it is removed from them. Genres maps book ids to
+    their genre, missing ones are looked up.
+    """
+    genres = dict(genres or {})
+    missing = {state['book_id'] for state, sign in changes} - set(genres)
+    if missing:
+        genres.update(Book.objects.filter(pk__in=missing).values_list('id', 'genre'))
+
+    by_user = defaultdict(Counter)
+    by_genre = defaultdict(Counter)
+    for state, sign in changes:
+        for key, value in get_counts(state).items():
+            by_user[state['user_id']][key] += sign * value
+            if key in ('started', 'finished'):
+                by_genre[state['user_id'], genres[state['book_id']]][key] += sign * value
+
+    for user_id, deltas in by_user.items():
+        add_counts(ReadingStats, {'user_id': user_id}, deltas)
+    for (user_id, genre), deltas in by_genre.items():
+        add_counts(ReadingGenreStats, {'reading_stats_id': user_id, 'genre': genre}, deltas)
+
+
+def add_counts(model, lookup, deltas):
+    """Add to the counts of a stats row, creating it if missing."""
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not deltas:
+        return
+    increments = {key: F(key) + value for key, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Created concurrently in between
+        model.objects.filter(**lookup).update(**increments)
+
+
+def rebuild_reading_stats(using=DEFAULT_DB_ALIAS):
+    """Recompute the reading stats of all users from the reading list."""
+    connection = connections[using]
+    days = DAYS_SQL[connection.vendor]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute("DELETE FROM books_readinggenrestats")
+        cursor.execute("DELETE FROM books_readingstats")
+        cursor.execute(
+            "INSERT INTO books_readingstats (user_id, started, finished, timed, total_days) "
+            "SELECT user_id, "
+            "SUM(CASE WHEN started_reading OR finished_reading THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN finished_reading THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN {timed} THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN {timed} THEN {days} ELSE 0 END) "
+            "FROM books_readinglist "
+            "GROUP BY user_id".format(timed=TIMED_SQL, days=days)
+        )
+        cursor.execute(
+            "INSERT INTO books_readinggenrestats (reading_stats_id, genre, started, finished) "
+            "SELECT books_readinglist.user_id, books_book.genre, "
+            "SUM(CASE WHEN started_reading OR finished_reading THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN finished_reading THEN 1 ELSE 0 END) "
+            "FROM books_readinglist "
+            "INNER JOIN books_book ON books_book.id = books_readinglist.book_id "
+            "GROUP BY books_readinglist.user_id, books_book.genre"
+        )
+
+
+@receiver(post_save, sender=ReadingList)
+def reading_list_saved(sender, instance, created, raw, using, **kwargs):
+    """Apply the change of state of a reading list entry to the stats."""
+    if raw:
+        return
+    state = get_state(instance)
+    changes = [(state, 1)]
+    if not created:
+        previous = instance._loaded_values
+        changes.append(({field: previous[field] for field in ReadingList.STATE_FIELDS}, -1))
+
+    genres = {}
+    if ReadingList.book.is_cached(instance) and instance.book.pk == instance.book_id:
+        genres[instance.book_id] = instance.book.genre
+    apply_changes(changes, genres)
+    instance.set_loaded_values(state, using)
+
+
+@receiver(post_save, sender=Book)
+def book_genre_changed(sender, instance, created, raw, **kwargs):
+    """Move the stats of the entries of a book to its new genre."""
+    previous = getattr(instance, '_previous_genre', None)
+    if raw or created or previous is None or previous == instance.genre:
+        return
+    for row in ReadingList.objects.filter(book_id=instance.pk).values('user_id').annotate(
+        started=Count('id', filter=Q(started_reading=True) | Q(finished_reading=True)),
+        finished=Count('id', filter=Q(finished_reading=True)),
+    ).order_by():
+        lookup = {'reading_stats_id': row['user_id']}
+        add_counts(ReadingGenreStats, dict(lookup, genre=previous), {
+            'started': -row['started'],
+            'finished': -row['finished'],
+        })
+        add_counts(ReadingGenreStats, dict(lookup, genre=instance.genre), {
+            'started': row['started'],
+            'finished': row['finished'],
+        })
+    instance._previous_genre = instance.genre
+
+
+@receiver(post_delete, sender=ReadingList)
+def reading_list_deleted(sender, instance, **kwargs):
+    """Remove a deleted reading list entry from the stats."""
+    apply_changes([(get_state(instance), -1)])
@@ -0,0 +1,125 @@
+"""Books catalog record streams.
+
+Read books from NDJSON or CSV streams one record at a time, so that
+catalogs of any size can be processed in constant memory, and turn books
+back into records for exports.
+
+NDJSON records hold the book fields as accepted by the books API. CSV
+records have the columns `title`, `genre`, `description`, `pages`,
+`published_date`, `publisher`, `publisher_description` and `authors`, with
+author names separated by `|`.
+"""
+
+import csv
+import json
+
+FORMATS = ('ndjson', 'csv')
+
+CSV_FIELDS = (
+    'title',
+    'genre',
+    'description',
+    'pages',
+    'published_date',
+    'publisher',
+    'publisher_description',
+    'authors',
+)
+
+AUTHORS_SEPARATOR = '|'
+
+
+def ndjson_record_to_book(line):
+    """Return the book data of an NDJSON record.
+
+    Malformed lines are returned as they are, to be reported as invalid by
+    the book validation.
+    """
+    try:
+        return json.loads(line)
+    except ValueError:
+        return line.strip()
+
+
+def csv_record_to_book(record):
+    """Return the book data of a CSV record."""
+    authors = record.get('authors') or ''
+    return {
+        'title': record.get('title', ''),
+        'genre': record.get('genre') or 'action',
+        'description': record.get('description', ''),
+        'pages': record.get('pages') or None,
+        'published_date': record.get('published_date') or None,
+        'publisher': {
+            'name': record.get('publisher', ''),
+            'description': record.get('publisher_description', ''),
+        },
+        'authors': [
+            {'name': name.strip()}
+            for name in authors.split(AUTHORS_SEPARATOR)
+            if name.strip()
+        ],
+    }
+
+
+def book_to_csv_record(book):
+    """Return the CSV record of a book, as rendered by the books API."""
+    return {
+        'id': book['id'],
+        'title': book['title'],
+        'genre': book['genre'],
+        'description': book['description'],
+        'pages': book['pages'],
+        'published_date': book['published_date'],
+        'publisher': book['publisher']['name'],
+        'publisher_description': book['publisher']['description'],
+        'authors': AUTHORS_SEPARATOR.join(author['name'] for author in book['authors']),
+    }
+
+
+class RecordReader:
+    """Read book records from a binary stream.
+
+    Keep track of the number of records read and of the byte offset just
+    after the last one, so that reading can be resumed later on from a
+    checkpoint. CSV rows are turned into records by `csv_record`, which
+    reads books by default.
+    """
+
+    def __init__(self, stream, format, offset=0, records=0, fieldnames=None, encoding='utf-8',
+                 csv_record=csv_record_to_book):
+        if format not in FORMATS:
+            raise ValueError("Unknown format {}".format(format))
+        self.stream = stream
+        self.format = format
+        self.offset = offset
+        self.records = records
+        self.fieldnames = fieldnames
+        self.encoding = encoding
+        self.csv_record = csv_record
+
+    def _lines(self):
+        """Yield the decoded lines of the stream, counting the bytes read."""
+        for line in self.stream:
+            self.offset += len(line)
+            yield line.decode(self.encoding)
+
+    def __iter__(self):
+        if self.format == 'ndjson':
+            records = (ndjson_record_to_book(line) for line in self._lines() if line.strip())
+        else:
+            reader = csv.DictReader(self._lines(), fieldnames=self.fieldnames)
+            records = (self.csv_record(record) for record in reader)
+
+        for record in records:
+            if self.format == 'csv':
+                self.fieldnames = reader.fieldnames
+            self.records += 1
+            yield record
+
+    def skip(self, count):
+        """Skip records of a stream that cannot seek."""
+        records = iter(self)
+        for _ in range(count):
+            next(records, None)
+        return records
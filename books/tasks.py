@@ -0,0 +1,25 @@
+"""Books tasks."""
+
+from celery.utils.log import get_task_logger
+
+from books.counts import refresh_counts
+from books.recommendations import rebuild_neighbours
+from bookworm.celery import app
+
+logger = get_task_logger(__name__)
+
+
+@app.task
+def rebuild_book_neighbours():
+    """Rebuild the related books index from the favourites."""
+    count = rebuild_neighbours()
+    logger.info("Rebuilt related books index with {} neighbours.".format(count))
+    return count
+
+
+@app.task
+def refresh_row_counts():
+    """Refresh the cached row counts of the large tables."""
+    counts = refresh_counts()
+    logger.info("Refreshed row counts {}.".format(counts))
+    return counts
@@ -1,19 +1,68 @@
 """Books app feature tests."""
+import base64
+import csv
+import datetime
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextlib import redirect_stderr, redirect_stdout
+from importlib import import_module
+from unittest import skipIf
+from unittest.mock import Mock, patch
 
 import factory
+from django.apps import apps as global_apps
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+from django.db import router as db_router
+from django.db.transaction import TransactionManagementError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
 from django_common.auth_backends import User
 
 from factory.django import DjangoModelFactory
 from factory.fuzzy import FuzzyChoice
 from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
 from rest_framework.test import APITestCase
 
+from bookworm import metrics, routers
+from bookworm.middleware import ReplicaRoutingMiddleware
+
+from . import authentication, exports, ingest
+from .management.commands import benchbooks
+from .counts import COUNT_TIMEOUT, estimate_count, refresh_counts
+from .pagination import BookPagination, EstimatedCountPagination
+from .recommendations import rebuild_neighbours
+from .provisioning import provision_users
+from .serializers import BookSerializer, BookValuesSerializer
+from .search import search_books
+from .streams import RecordReader
+from .stats import rebuild_reading_stats
+from .tasks import refresh_row_counts
+from .views import CachedResponseViewSetMixin
 from .models import (
     Author,
     Publisher,
     Book,
+    BookNeighbour,
     Favourite,
+    Profile,
+    ReadingGenreStats,
     ReadingList,
+    ReadingStats,
 )
 
 
@@ -91,7 +140,28 @@ class ReadingListFactory(DjangoModelFactory):
         model = ReadingList
 
 
-class TestBookFunctionalTestCase(APITestCase):
+class ClearCacheMixin:
+    """Start each test with an empty cache, which rolled back changes would leave stale."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+class ExplainTestMixin:
+    """Assert that queries are planned with given indexes."""
+
+    def assertUsesIndex(self, queryset, index_name):
+        """Assert that the query plan of the queryset uses the index."""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Tiny test tables are cheaper to scan, only index paths are compared
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = queryset.explain()
+        self.assertIn(index_name, plan, "Query plan does not use {}:\n{}".format(index_name, plan))
+
+
+class TestBookFunctionalTestCase(ClearCacheMixin, APITestCase):
     """Book model api functional tests."""
 
     @classmethod
@@ -112,14 +182,14 @@ class TestBookFunctionalTestCase(APITestCase):
             status.HTTP_200_OK,
         )
 
-        self.assertEqual(self.book.id, response.data[0]['id'])
-        self.assertEqual(self.book.title, response.data[0]['title'])
-        self.assertEqual(self.book.genre, response.data[0]['genre'])
-        self.assertEqual(self.book.description, response.data[0]['description'])
-        self.assertEqual(self.book.pages, response.data[0]['pages'])
-        self.assertEqual(self.author.id, response.data[0]['authors'][0]['id'])
-        self.assertEqual(self.book.publisher.id, response.data[0]['publisher']['id'])
-        self.assertEqual(self.book.published_date.strftime('%Y-%m-%d'), response.data[0]['published_date'])
+        self.assertEqual(self.book.id, response.data['results'][0]['id'])
+        self.assertEqual(self.book.title, response.data['results'][0]['title'])
+        self.assertEqual(self.book.genre, response.data['results'][0]['genre'])
+        self.assertEqual(self.book.description, response.data['results'][0]['description'])
+        self.assertEqual(self.book.pages, response.data['results'][0]['pages'])
+        self.assertEqual(self.author.id, response.data['results'][0]['authors'][0]['id'])
+        self.assertEqual(self.book.publisher.id, response.data['results'][0]['publisher']['id'])
+        self.assertEqual(self.book.published_date.strftime('%Y-%m-%d'), response.data['results'][0]['published_date'])
 
     def test_creating_book_item(self):
         """Test that a user can create a book item."""
@@ -162,6 +232,10 @@ class TestBookFunctionalTestCase(APITestCase):
         self.assertEqual(new_book.pages, response.data['pages'])
         self.assertEqual(new_book.published_date.strftime('%Y-%m-%d'), response.data['published_date'])
 
+        # existing author and publisher are linked instead of duplicated
+        self.assertEqual([self.author.id], [author['id'] for author in response.data['authors']])
+        self.assertEqual(self.publisher.id, response.data['publisher']['id'])
+
         # check that there are now two items in the books list
         response = self.client.get("/books/book/")
 
@@ -170,7 +244,7 @@ class TestBookFunctionalTestCase(APITestCase):
             status.HTTP_200_OK,
         )
 
-        self.assertEquals(2, len(response.data))
+        self.assertEquals(2, len(response.data['results']))
 
     def test_updating_book_item(self):
         """Test that a user can update a book item."""
@@ -219,7 +293,908 @@ class TestBookFunctionalTestCase(APITestCase):
             status.HTTP_200_OK,
         )
 
-        self.assertEquals(0, len(response.data))
+        self.assertEquals(0, len(response.data['results']))
+
+
+class TestBookBulkCreateTestCase(ClearCacheMixin, APITestCase):
+    """Book bulk create api tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(is_superuser=True)
+        cls.author = AuthorFactory(name="Jane Austen")
+        cls.publisher = PublisherFactory(name="Penguin Classics")
+
+    def book_data(self, title, authors, publisher):
+        """Return the payload of a book."""
+        return {
+            "title": title,
+            "genre": "fiction",
+            "pages": 300,
+            "authors": [{"name": name} for name in authors],
+            "publisher": {"name": publisher},
+            "published_date": "1813-01-28",
+        }
+
+    def test_bulk_creating_books_reuses_authors_and_publishers(self):
+        """Test that books are created with deduplicated authors and publishers."""
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post(
+            "/books/book/bulk/",
+            data=[
+                self.book_data("Emma", ["jane  austen"], "PENGUIN classics"),
+                self.book_data("Persuasion", ["Jane Austen", "Anne Elliot"], "Vintage"),
+                self.book_data("Sanditon", ["anne elliot", "Anne Elliot"], "vintage"),
+            ],
+            format='json',
+        )
+
+        self.assertEquals(
+            response.status_code,
+            status.HTTP_201_CREATED,
+        )
+        self.assertEqual(3, response.data['created'])
+        self.assertEqual(0, response.data['failed'])
+        self.assertEqual([0, 1, 2], [result['index'] for result in response.data['results']])
+
+        self.assertEqual(2, Author.objects.count())
+        self.assertEqual(2, Publisher.objects.count())
+
+        emma, persuasion, sanditon = [
+            Book.objects.get(id=result['id']) for result in response.data['results']
+        ]
+        self.assertEqual(self.publisher, emma.publisher)
+        self.assertEqual([self.author], list(emma.authors.all()))
+        self.assertEqual(2, persuasion.authors.count())
+        self.assertEqual(1, sanditon.authors.count())
+        self.assertEqual(persuasion.publisher, sanditon.publisher)
+
+        response = self.client.get("/books/book/", {'search': "elliot"})
+        self.assertCountEqual(
+            [persuasion.id, sanditon.id],
+            [book['id'] for book in response.data['results']],
+        )
+
+    def test_bulk_create_reports_invalid_items(self):
+        """Test that invalid items are reported while valid ones are created."""
+        self.client.force_authenticate(user=self.user)
+        invalid = self.book_data("", ["Jane Austen"], "Penguin Classics")
+        invalid['genre'] = "unknown"
+
+        response = self.client.post(
+            "/books/book/bulk/",
+            data=[invalid, self.book_data("Emma", ["Jane Austen"], "Penguin Classics")],
+            format='json',
+        )
+
+        self.assertEquals(
+            response.status_code,
+            status.HTTP_201_CREATED,
+        )
+        self.assertEqual(1, response.data['failed'])
+        self.assertIn('title', response.data['results'][0]['errors'])
+        self.assertIn('genre', response.data['results'][0]['errors'])
+        self.assertEqual(
+            "Emma",
+            Book.objects.get(id=response.data['results'][1]['id']).title,
+        )
+
+    def test_bulk_create_runs_constant_number_of_queries(self):
+        """Test that the number of queries does not grow with the number of books."""
+        self.client.force_authenticate(user=self.user)
+
+        def bulk_create(count):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(
+                    "/books/book/bulk/",
+                    data=[
+                        self.book_data("Book {}".format(index), ["Author {}".format(index)], "Publisher {}".format(index))
+                        for index in range(count)
+                    ],
+                    format='json',
+                )
+            return len(queries)
+
+        self.assertEqual(bulk_create(2), bulk_create(50))
+        self.assertEqual(52, Book.objects.count())
+
+    def test_bulk_create_rejects_too_many_items(self):
+        """Test that the number of books per request is limited."""
+        self.client.force_authenticate(user=self.user)
+
+        with self.settings(BOOKS_BULK_MAX_ITEMS=1):
+            response = self.client.post(
+                "/books/book/bulk/",
+                data=[self.book_data("Emma", [], "Penguin"), self.book_data("Emma", [], "Penguin")],
+                format='json',
+            )
+
+        self.assertEquals(
+            response.status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.assertEqual(0, Book.objects.count())
+
+    def test_names_created_concurrently_are_reused(self):
+        """Test that authors created by another ingest before the lock are not created again."""
+        def create_concurrently(model):
+            AuthorFactory(name="Anne Elliot")
+
+        with patch.object(ingest, 'lock_names', side_effect=create_concurrently):
+            resolved = ingest.resolve(Author, [{'name': "anne elliot"}, {'name': "Jane Austen"}])
+
+        self.assertEqual(self.author, resolved['jane austen'])
+        self.assertEqual(1, Author.objects.filter(normalized_name='anne elliot').count())
+        self.assertEqual(Author.objects.get(normalized_name='anne elliot'), resolved['anne elliot'])
+
+    def test_names_expanded_by_casefolding_fit(self):
+        """Test that the longest names are normalized without overflowing, even when casefolding expands them."""
+        name = "\u00df" * 200
+        author = Author.objects.create(name=name)
+        author.full_clean()
+        self.assertEqual("ss" * 200, Author.objects.get(pk=author.pk).normalized_name)
+
+        resolved = ingest.resolve(Publisher, [{'name': name}])
+        resolved["ss" * 200].full_clean()
+        self.assertEqual(name, Publisher.objects.get(normalized_name="ss" * 200).name)
+
+    def test_bulk_inserts_require_a_transaction(self):
+        """Test that inserts which cannot return their ids refuse to run outside of a transaction."""
+        if connection.features.can_return_ids_from_bulk_insert:
+            return
+        with patch.object(connection, 'in_atomic_block', False), self.assertRaises(TransactionManagementError):
+            ingest.bulk_create_with_ids(Author, [Author(name="Anne Elliot")])
+        self.assertFalse(Author.objects.filter(name="Anne Elliot").exists())
+
+
+class TestImportCatalogCommandTestCase(TestCase):
+    """Import catalog command tests."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        """Write a file to import and return its path."""
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as catalog:
+            catalog.write(content)
+        return path
+
+    def import_catalog(self, *args, **options):
+        """Run the import command and return its output."""
+        with redirect_stdout(io.StringIO()) as stdout, redirect_stderr(io.StringIO()):
+            call_command('importcatalog', *args, **options)
+        return stdout.getvalue()
+
+    def test_importing_ndjson_catalog(self):
+        """Test that books are imported from NDJSON records."""
+        path = self.write("catalog.ndjson", "\n".join(
+            json.dumps({
+                "title": "Book {}".format(index),
+                "genre": "fiction",
+                "authors": [{"name": "Author {}".format(index % 2)}],
+                "publisher": {"name": "Publisher"},
+            })
+            for index in range(5)
+        ) + "\nnot json\n")
+
+        output = self.import_catalog(path, chunk_size=2)
+
+        self.assertIn("5 books created, 1 records failed", output)
+        self.assertEqual(5, Book.objects.count())
+        self.assertEqual(2, Author.objects.count())
+        self.assertEqual(1, Publisher.objects.count())
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_importing_csv_catalog(self):
+        """Test that books are imported from CSV records."""
+        path = self.write(
+            "catalog.csv",
+            "title,genre,pages,published_date,publisher,authors\n"
+            "Good Omens,fantasy,288,1990-05-01,Gollancz,Terry Pratchett|Neil Gaiman\n"
+            "\"Mort, a novel\",fantasy,,,Gollancz,Terry Pratchett\n",
+        )
+
+        self.import_catalog(path)
+
+        good_omens = Book.objects.get(title="Good Omens")
+        self.assertEqual(288, good_omens.pages)
+        self.assertEqual(2, good_omens.authors.count())
+        mort = Book.objects.get(title="Mort, a novel")
+        self.assertIsNone(mort.published_date)
+        self.assertEqual(good_omens.publisher, mort.publisher)
+
+    def test_interrupted_import_resumes_from_checkpoint(self):
+        """Test that an interrupted import carries on after the last committed chunk."""
+        path = self.write(
+            "catalog.csv",
+            "title,publisher,authors\n" + "".join(
+                "Book {0},Publisher,Author {0}\n".format(index) for index in range(7)
+            ),
+        )
+        ingest = BookSerializer.ingest
+        chunks = []
+
+        def interrupted_ingest(chunk):
+            """Fail while importing the second chunk."""
+            chunks.append(chunk)
+            if len(chunks) == 2:
+                raise KeyboardInterrupt
+            return ingest(chunk)
+
+        with patch.object(BookSerializer, 'ingest', side_effect=interrupted_ingest):
+            with self.assertRaises(KeyboardInterrupt):
+                self.import_catalog(path, chunk_size=3)
+
+        self.assertEqual(3, Book.objects.count())
+        self.assertTrue(os.path.exists(path + '.checkpoint'))
+
+        output = self.import_catalog(path, chunk_size=3)
+
+        self.assertIn("Resuming import after record 3", output)
+        self.assertEqual(
+            ["Book {}".format(index) for index in range(7)],
+            list(Book.objects.order_by('id').values_list('title', flat=True)),
+        )
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+
+class TestBookQueryCountTestCase(ClearCacheMixin, APITestCase):
+    """Book api query count tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(is_superuser=True)
+        cls.authors = AuthorFactory.create_batch(3)
+        cls.book = BookFactory(authors=cls.authors)
+
+    def test_listing_books_runs_constant_number_of_queries(self):
+        """Test that listing books does not run a query per book."""
+        self.client.force_authenticate(user=self.user)
+
+        # one query for books joined with publishers and one for authors
+        with self.assertNumQueries(2):
+            response = self.client.get("/books/book/")
+        self.assertEquals(1, len(response.data['results']))
+
+        BookFactory.create_batch(5, authors=self.authors)
+
+        with self.assertNumQueries(2):
+            response = self.client.get("/books/book/")
+        self.assertEquals(6, len(response.data['results']))
+        self.assertEquals(3, len(response.data['results'][0]['authors']))
+
+    def test_retrieving_book_runs_constant_number_of_queries(self):
+        """Test that retrieving a book loads its relations eagerly."""
+        self.client.force_authenticate(user=self.user)
+
+        with self.assertNumQueries(2):
+            response = self.client.get("/books/book/{}/".format(self.book.id))
+
+        self.assertEquals(
+            response.status_code,
+            status.HTTP_200_OK,
+        )
+        self.assertEqual(self.book.publisher.id, response.data['publisher']['id'])
+        self.assertEquals(3, len(response.data['authors']))
+
+
+class TestBookValuesSerializerTestCase(ClearCacheMixin, APITestCase):
+    """Book values serializer tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(is_superuser=True)
+        authors = AuthorFactory.create_batch(3)
+        BookFactory(authors=authors)
+        BookFactory(authors=[authors[2], authors[0]], pages=None, published_date=None)
+        BookFactory(authors=[], description="")
+
+    def test_values_match_model_serializer(self):
+        """Test that the values serializer renders the same bytes as the model serializer."""
+        queryset = BookSerializer.setup_eager_loading(Book.objects.order_by('id'))
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(BookSerializer(queryset, many=True).data),
+            renderer.render(BookValuesSerializer(BookValuesSerializer.setup_values(queryset)).data),
+        )
+
+    def test_listing_matches_retrieving(self):
+        """Test that listed books are rendered as retrieved books."""
+        self.client.force_authenticate(user=self.user)
+
+        # one query for the books joined with publishers and one for authors
+        with self.assertNumQueries(2):
+            listed = self.client.get("/books/book/").data['results']
+        for book in listed:
+            self.assertEqual(
+                JSONRenderer().render(self.client.get("/books/book/{}/".format(book['id'])).data),
+                JSONRenderer().render(book),
+            )
+
+    def test_benchmark_command(self):
+        """Test that the benchmark reports the rate of both serializers."""
+        output = io.StringIO()
+        with redirect_stdout(output):
+            call_command('benchbookserializers', rows=10, repeat=1)
+        self.assertIn("model serializer:", output.getvalue())
+        self.assertIn("values serializer:", output.getvalue())
+        self.assertIn("Rendered 3 books", output.getvalue())
+
+
+class TestBookResponseCacheTestCase(ClearCacheMixin, APITestCase):
+    """Book api response cache tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(is_superuser=True)
+        cls.book = BookFactory(authors=AuthorFactory.create_batch(2))
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user)
+
+    def test_responses_are_cached(self):
+        """Test that repeated requests do not query the database."""
+        for url in ("/books/book/", "/books/book/{}/".format(self.book.id)):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first.data, second.data)
+
+        # Query parameters are part of the cache key
+        with self.assertNumQueries(2):
+            response = self.client.get("/books/book/", {'page_size': 1})
+        self.assertEqual(1, len(response.data['results']))
+
+    def test_conditional_requests_are_not_modified(self):
+        """Test that clients holding the current response get a not modified response."""
+        response = self.client.get("/books/book/")
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get("/books/book/", HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(b'', response.content)
+
+        response = self.client.get("/books/book/", HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changes_invalidate_responses(self):
+        """Test that changing books, authors and publishers invalidates cached responses."""
+        url = "/books/book/{}/".format(self.book.id)
+        etag = self.client.get(url)['ETag']
+
+        book = Book.objects.get(pk=self.book.pk)
+        book.title = "Changed title"
+        book.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEqual("Changed title", response.data['title'])
+
+        author = book.authors.first()
+        author.name = "Changed author"
+        author.save()
+        self.assertIn("Changed author", [a['name'] for a in self.client.get(url).data['authors']])
+
+        publisher = Publisher.objects.get(pk=book.publisher_id)
+        publisher.name = "Changed publisher"
+        publisher.save()
+        self.assertEqual("Changed publisher", self.client.get(url).data['publisher']['name'])
+
+        book.delete()
+        self.assertEquals(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_author_links_and_bulk_create_invalidate_responses(self):
+        """Test that author links and bulk created books invalidate cached responses."""
+        url = "/books/book/{}/".format(self.book.id)
+        self.client.get(url)
+        Book.objects.get(pk=self.book.pk).authors.add(AuthorFactory())
+        self.assertEqual(3, len(self.client.get(url).data['authors']))
+
+        self.assertEqual(1, len(self.client.get("/books/book/").data['results']))
+        BookSerializer.ingest([{
+            'title': "Bulk book",
+            'genre': 'action',
+            'description': "",
+            'publisher': {'name': "Bulk publisher", 'description': ""},
+            'authors': [{'name': "Bulk author"}],
+        }])
+        self.assertEqual(2, len(self.client.get("/books/book/").data['results']))
+
+
+class TestAccessPathIndexesTestCase(ExplainTestMixin, TestCase):
+    """Index usage of the critical queries tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.book = BookFactory(genre='drama')
+
+    def test_reading_list_queries_use_indexes(self):
+        """Test that reading lists are looked up by user, progress and book with indexes."""
+        self.assertUsesIndex(
+            ReadingList.objects.filter(user=self.user, started_reading=True, finished_reading=False),
+            'readinglist_user_progress_idx',
+        )
+        self.assertUsesIndex(
+            ReadingList.objects.filter(user=self.user, book_id__in=[self.book.id]),
+            'readinglist_user_book_idx',
+        )
+        self.assertUsesIndex(
+            ReadingList.objects.filter(user=self.user).order_by('id'),
+            'readinglist_user_id_idx',
+        )
+
+    def test_favourite_queries_use_indexes(self):
+        """Test that favourites are looked up by user and book with indexes."""
+        self.assertUsesIndex(
+            Favourite.objects.filter(user=self.user).order_by('id'),
+            'favourite_user_id_idx',
+        )
+        self.assertUsesIndex(
+            Favourite.objects.filter(user=self.user).values_list('book_id', flat=True),
+            'favourite_user_book_idx',
+        )
+
+    def test_book_queries_use_indexes(self):
+        """Test that books filtered by genre are ordered with indexes."""
+        self.assertUsesIndex(
+            Book.objects.filter(genre='drama').order_by('published_date', 'id'),
+            'book_genre_published_date_idx',
+        )
+        self.assertUsesIndex(
+            Book.objects.filter(genre='drama').order_by('id'),
+            'book_genre_id_idx',
+        )
+
+
+class TestBookSearchTestCase(ClearCacheMixin, APITestCase):
+    """Book full-text search tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(is_superuser=True)
+        cls.austen = AuthorFactory(name="Jane Austen")
+        cls.tolstoy = AuthorFactory(name="Leo Tolstoy")
+        cls.penguin = PublisherFactory(name="Penguin Classics")
+        cls.pride = BookFactory(
+            title="Pride and Prejudice",
+            description="A novel of manners.",
+            authors=[cls.austen],
+        )
+        cls.war = BookFactory(
+            title="War and Peace",
+            description="Pride goes before a fall.",
+            authors=[cls.tolstoy],
+            publisher=cls.penguin,
+        )
+
+    def search(self, terms):
+        """Return the ids of the books matching the search terms."""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get("/books/book/", {'search': terms})
+        self.assertEquals(
+            response.status_code,
+            status.HTTP_200_OK,
+        )
+        return [book['id'] for book in response.data['results']]
+
+    def test_searching_books_by_title_author_and_publisher(self):
+        """Test that books are matched on title, authors and publisher."""
+        self.assertEqual([self.war.id], self.search("peace"))
+        self.assertEqual([self.pride.id], self.search("austen"))
+        self.assertEqual([self.war.id], self.search("penguin"))
+        self.assertEqual([], self.search("dickens"))
+
+    def test_searching_books_matches_word_prefixes(self):
+        """Test that partially typed words match books."""
+        self.assertEqual([self.war.id], self.search("tols"))
+
+    def test_search_results_are_ranked_by_relevance(self):
+        """Test that title matches rank above description matches."""
+        self.assertEqual([self.pride.id, self.war.id], self.search("pride"))
+
+    def test_paginating_search_results_keeps_ranking(self):
+        """Test that ranked search results can be paginated."""
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get("/books/book/", {'search': "pride", 'page_size': 1})
+        self.assertEqual(self.pride.id, response.data['results'][0]['id'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self.war.id, response.data['results'][0]['id'])
+        self.assertIsNone(response.data['next'])
+
+    def test_search_index_follows_related_changes(self):
+        """Test that the index is updated when related rows change."""
+        author = Author.objects.get(id=self.tolstoy.id)
+        author.name = "Lev Tolstoy"
+        author.save()
+        self.assertEqual([self.war.id], self.search("lev"))
+
+        Book.objects.get(id=self.pride.id).authors.add(author)
+        self.assertCountEqual([self.pride.id, self.war.id], self.search("lev"))
+
+        publisher = Publisher.objects.get(id=self.penguin.id)
+        publisher.name = "Vintage"
+        publisher.save()
+        self.assertEqual([self.war.id], self.search("vintage"))
+
+        Book.objects.get(id=self.war.id).delete()
+        self.assertEqual([self.pride.id], self.search("lev"))
+
+    def test_migration_indexes_existing_books(self):
+        """Test that the migration creating the index fills it with the existing books."""
+        migration = import_module('books.migrations.0010_book_search_index')
+        schema_editor = Mock(connection=connection)
+        schema_editor.execute.side_effect = lambda sql: connection.cursor().execute(sql)
+        migration.drop_search_index(global_apps, schema_editor)
+        migration.create_search_index(global_apps, schema_editor)
+
+        self.assertEqual([self.pride.id], self.search("austen"))
+        self.assertEqual([self.pride.id, self.war.id], self.search("pride"))
+
+
+class TestBookFilterTestCase(ExplainTestMixin, ClearCacheMixin, APITestCase):
+    """Book structured filters tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(is_superuser=True)
+        cls.author = AuthorFactory()
+        cls.publisher = PublisherFactory()
+        cls.drama = BookFactory(
+            genre='drama',
+            pages=120,
+            published_date=datetime.date(2017, 3, 1),
+            authors=[cls.author],
+        )
+        cls.poetry = BookFactory(
+            genre='poetry',
+            pages=80,
+            published_date=datetime.date(2018, 6, 1),
+            publisher=cls.publisher,
+        )
+        cls.travel = BookFactory(
+            genre='travel',
+            pages=400,
+            published_date=datetime.date(2019, 9, 1),
+        )
+
+    def filter(self, params):
+        """Return the ids of the books matching the filters."""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get("/books/book/", params)
+        self.assertEquals(
+            response.status_code,
+            status.HTTP_200_OK,
+        )
+        return [book['id'] for book in response.data['results']]
+
+    def test_filtering_books(self):
+        """Test that books are filtered by genre, dates, pages, author and publisher."""
+        self.assertEqual([self.drama.id, self.poetry.id], self.filter({'genre': ['drama', 'poetry']}))
+        self.assertEqual(
+            [self.poetry.id, self.travel.id],
+            self.filter({'published_date_after': '2018-01-01', 'published_date_before': '2019-12-31'}),
+        )
+        self.assertEqual([self.drama.id, self.poetry.id], self.filter({'pages_max': 200}))
+        self.assertEqual([self.drama.id], self.filter({'pages_min': 100, 'pages_max': 200}))
+        self.assertEqual([self.drama.id], self.filter({'author': self.author.id}))
+        self.assertEqual([self.poetry.id], self.filter({'publisher': self.publisher.id}))
+        self.assertEqual([], self.filter({'genre': 'poetry', 'author': self.author.id}))
+
+    def test_invalid_filters_are_rejected(self):
+        """Test that unknown genres and malformed values are reported."""
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get("/books/book/", {'genre': 'cooking'})
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('genre', response.data)
+
+        response = self.client.get("/books/book/", {'pages_min': 'many'})
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filtered_pages_follow_ordering(self):
+        """Test that filtered results are paginated in the requested order."""
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(
+            "/books/book/",
+            {'genre': ['drama', 'travel'], 'ordering': '-published_date', 'page_size': 1},
+        )
+        self.assertEqual([self.travel.id], [book['id'] for book in response.data['results']])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([self.drama.id], [book['id'] for book in response.data['results']])
+        self.assertIsNone(response.data['next'])
+
+    def test_page_count_filter_uses_index(self):
+        """Test that books within a page count range are selected with an index."""
+        self.assertUsesIndex(
+            Book.objects.filter(pages__range=(100, 200)).order_by('pages', 'id'),
+            'book_pages_id_idx',
+        )
+
+
+class TestBookPaginationTestCase(ClearCacheMixin, APITestCase):
+    """Book api keyset pagination tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(is_superuser=True)
+        cls.publisher = PublisherFactory()
+        cls.books = [
+            BookFactory(title="Book {}".format(index % 3), publisher=cls.publisher)
+            for index in range(7)
+        ]
+        Book.objects.filter(id=cls.books[0].id).update(published_date=None)
+
+    def collect(self, ordering, page_size=3):
+        """Follow the next links and return the ids of the books listed."""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            "/books/book/",
+            {'ordering': ordering, 'page_size': page_size},
+        )
+        pages = [response.data]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(response.data)
+        return pages, [book['id'] for page in pages for book in page['results']]
+
+    def test_paginating_books_follows_requested_ordering(self):
+        """Test that every book is listed once in the requested order."""
+        books = Book.objects.all()
+        expected = {
+            'id': list(books.order_by('id').values_list('id', flat=True)),
+            'title': list(books.order_by('title', 'id').values_list('id', flat=True)),
+            '-title': list(books.order_by('-title', '-id').values_list('id', flat=True)),
+        }
+        # Books without a published date are listed last
+        by_date = list(books.exclude(published_date=None).order_by('published_date', 'id').values_list('id', flat=True))
+        expected['published_date'] = by_date + [self.books[0].id]
+        expected['-published_date'] = [self.books[0].id] + by_date[::-1]
+
+        for ordering, ids in expected.items():
+            pages, listed = self.collect(ordering)
+            self.assertEqual(ids, listed, ordering)
+            self.assertEqual(3, len(pages))
+
+    def test_previous_link_returns_previous_page(self):
+        """Test that the previous link lists the previous page again."""
+        pages, _ = self.collect('published_date')
+
+        response = self.client.get(pages[2]['previous'])
+
+        self.assertEqual(pages[1]['results'], response.data['results'])
+        self.assertEqual(pages[1]['next'], response.data['next'])
+
+    def test_page_size_is_capped(self):
+        """Test that clients cannot request pages above the maximum size."""
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get("/books/book/", {'page_size': 2})
+        self.assertEquals(2, len(response.data['results']))
+
+        with patch.object(BookPagination, 'max_page_size', 5):
+            response = self.client.get("/books/book/", {'page_size': 1000})
+        self.assertEquals(5, len(response.data['results']))
+
+    def test_deep_pages_do_not_count_rows(self):
+        """Test that a page costs the same queries wherever it starts."""
+        pages, _ = self.collect('title')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(pages[2]['previous'])
+
+        self.assertEqual(2, len(queries))
+        self.assertFalse(any('COUNT' in query['sql'] for query in queries))
+
+    def test_invalid_ordering_and_cursor_are_rejected(self):
+        """Test that unknown orderings and malformed cursors are not found."""
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get("/books/book/", {'ordering': 'pages'})
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get("/books/book/", {'cursor': 'invalid'})
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestCachedAuthenticationTestCase(APITestCase):
+    """Cached api authentication tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(is_superuser=True)
+        cls.user.set_password('secret')
+        cls.user.save()
+        BookFactory()
+
+    def setUp(self):
+        cache.clear()
+        authentication.token_cache.clear()
+        authentication.basic_cache.clear()
+
+    def authenticate_with_token(self):
+        token = Token.objects.get(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(token.key))
+        return token
+
+    def test_token_is_resolved_from_cache(self):
+        """Test that a token is looked up in the database only once."""
+        self.authenticate_with_token()
+
+        with self.assertNumQueries(2):
+            response = self.client.get("/books/reading/")
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/books/reading/")
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+        # Other processes share the cached token
+        authentication.token_cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get("/books/reading/")
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+    def test_deleted_token_is_rejected(self):
+        """Test that a deleted token no longer authenticates."""
+        token = self.authenticate_with_token()
+        self.client.get("/books/book/")
+
+        token.delete()
+        Token.objects.create(user=self.user)
+
+        response = self.client.get("/books/book/")
+        self.assertEquals(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        """Test that the token of a deactivated user no longer authenticates."""
+        self.authenticate_with_token()
+        self.client.get("/books/book/")
+
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+
+        response = self.client.get("/books/book/")
+        self.assertEquals(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_credentials_revoked_by_another_process_are_rejected(self):
+        """Test that tokens and passwords revoked by another process no longer authenticate."""
+        token = self.authenticate_with_token()
+        self.client.get("/books/book/")
+
+        # Another process deletes the token, which cannot reach this one's memory
+        Token.objects.filter(key=token.key).delete()
+        cache.set(authentication._user_version_key(self.user.pk), 'revoked-elsewhere', None)
+        cache.delete(authentication._token_key(token.key))
+
+        response = self.client.get("/books/book/")
+        self.assertEquals(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Basic {}'.format(
+            base64.b64encode('{}:secret'.format(self.user.username).encode()).decode(),
+        ))
+        self.assertEquals(self.client.get("/books/book/").status_code, status.HTTP_200_OK)
+
+        # Another process changes the password
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('changed')
+        User.objects.filter(pk=self.user.pk).update(password=user.password)
+        cache.set(authentication._user_version_key(self.user.pk), 'changed-elsewhere', None)
+
+        response = self.client.get("/books/book/")
+        self.assertEquals(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_basic_credentials_are_verified_once(self):
+        """Test that the password of basic credentials is not hashed on every request."""
+        self.client.credentials(HTTP_AUTHORIZATION='Basic {}'.format(
+            base64.b64encode('{}:secret'.format(self.user.username).encode()).decode(),
+        ))
+
+        with patch.object(User, 'check_password', autospec=True, return_value=True) as check_password:
+            self.assertEquals(self.client.get("/books/book/").status_code, status.HTTP_200_OK)
+            self.assertEquals(self.client.get("/books/book/").status_code, status.HTTP_200_OK)
+        self.assertEqual(1, check_password.call_count)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Basic {}'.format(
+            base64.b64encode('{}:wrong'.format(self.user.username).encode()).decode(),
+        ))
+        response = self.client.get("/books/book/")
+        self.assertEquals(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestUserProvisioningTestCase(TestCase):
+    """Bulk user provisioning tests."""
+
+    def test_users_are_created_in_batches(self):
+        """Test that users, profiles and tokens are created with a few queries per batch."""
+        records = [
+            {'username': 'reader{}'.format(i), 'email': 'reader{}@example.com'.format(i), 'mobile_number': '+4412345678{}'.format(i)}
+            for i in range(5)
+        ]
+        records[0]['password'] = 'secret'
+        records[1]['birth_date'] = '1990-05-17'
+
+        # per batch: a lookup of existing usernames, a savepoint and its release,
+        # the inserts of users, profiles and tokens and the lookup of the user ids
+        with self.assertNumQueries(7):
+            results = provision_users(records, batch_size=10)
+
+        users = User.objects.in_bulk([result['id'] for result in results])
+        self.assertEqual(['reader{}'.format(i) for i in range(5)], [users[result['id']].username for result in results])
+        self.assertEqual(5, Profile.objects.filter(user__in=users).exclude(mobile_number=None).count())
+        self.assertEqual(5, Token.objects.filter(user__in=users).count())
+        self.assertTrue(users[results[0]['id']].check_password('secret'))
+        self.assertFalse(users[results[2]['id']].has_usable_password())
+        self.assertEqual(datetime.date(1990, 5, 17), Profile.objects.get(user=results[1]['id']).birth_date)
+
+    def test_invalid_and_existing_usernames_are_reported(self):
+        """Test that invalid records and taken usernames are reported without creating users."""
+        UserFactory(username='taken')
+        results = provision_users([
+            {'username': 'taken'},
+            {'username': 'new'},
+            {'username': 'new'},
+            {'username': ''},
+            {'username': 'dated', 'birth_date': 'yesterday'},
+            'not a record',
+            {'username': 'not a username!'},
+        ], batch_size=4)
+
+        self.assertEqual(['errors', 'id', 'errors', 'errors', 'errors', 'errors', 'errors'], [
+            'errors' if 'errors' in result else 'id' for result in results
+        ])
+        self.assertEqual(list(range(7)), [result['index'] for result in results])
+        self.assertEqual(1, User.objects.filter(username='new').count())
+        self.assertIn('username', results[6]['errors'])
+
+    def test_usernames_taken_concurrently_are_reported(self):
+        """Test that usernames taken after their lookup are reported as errors of their records."""
+        UserFactory(username='taken')
+        with patch('books.provisioning.existing_usernames', return_value=set()):
+            results = provision_users([{'username': 'first'}, {'username': 'taken'}, {'username': 'last'}])
+
+        self.assertEqual({'username': ["A user with that username already exists."]}, results[1]['errors'])
+        users = User.objects.in_bulk([results[0]['id'], results[2]['id']])
+        self.assertEqual(['first', 'last'], [users[results[0]['id']].username, users[results[2]['id']].username])
+        self.assertEqual(2, Token.objects.filter(user__username__in=['first', 'last']).count())
+
+    def test_provision_users_command(self):
+        """Test that the command creates the users of a CSV file."""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as users_file:
+            users_file.write("username,email,mobile_number\nreader1,reader1@example.com,+441234567890\n,missing,\n")
+        self.addCleanup(os.remove, users_file.name)
+
+        output, errors = io.StringIO(), io.StringIO()
+        with redirect_stdout(output), redirect_stderr(errors):
+            call_command('provisionusers', users_file.name)
+
+        self.assertIn("Provisioned 1 users, 1 records failed.", output.getvalue())
+        self.assertIn("Record 2:", errors.getvalue())
+        self.assertEqual("+441234567890", Profile.objects.get(user__username='reader1').mobile_number)
+
+    def test_saving_user_skips_unchanged_profile(self):
+        """Test that saving a user only saves its profile when it changed."""
+        user = User.objects.get(pk=UserFactory().pk)
+        with self.assertNumQueries(1):
+            user.save()
+
+        user.profile.mobile_number = user.profile.mobile_number
+        with self.assertNumQueries(1):
+            user.save()
+
+        user.profile.mobile_number = "+441234567890"
+        with self.assertNumQueries(2):
+            user.save()
+        self.assertEqual("+441234567890", Profile.objects.get(user=user).mobile_number)
 
 
 class TestReadingListFunctionalTestCase(APITestCase):
@@ -244,13 +1219,13 @@ class TestReadingListFunctionalTestCase(APITestCase):
             status.HTTP_200_OK,
         )
 
-        self.assertEqual(self.reading_list.id, response.data[0]['id'])
-        self.assertEqual(self.reading_list.book.id, response.data[0]['book'])
-        self.assertEqual(self.reading_list.started_reading, response.data[0]['started_reading'])
-        self.assertEqual(self.reading_list.started_date.strftime('%Y-%m-%d'), response.data[0]['started_date'])
-        self.assertEqual(self.reading_list.finished_reading, response.data[0]['finished_reading'])
-        self.assertEqual(self.reading_list.finished_date.strftime('%Y-%m-%d'), response.data[0]['finished_date'])
-        self.assertEqual(self.reading_list.user.id, response.data[0]['user'])
+        self.assertEqual(self.reading_list.id, response.data['results'][0]['id'])
+        self.assertEqual(self.reading_list.book.id, response.data['results'][0]['book'])
+        self.assertEqual(self.reading_list.started_reading, response.data['results'][0]['started_reading'])
+        self.assertEqual(self.reading_list.started_date.strftime('%Y-%m-%d'), response.data['results'][0]['started_date'])
+        self.assertEqual(self.reading_list.finished_reading, response.data['results'][0]['finished_reading'])
+        self.assertEqual(self.reading_list.finished_date.strftime('%Y-%m-%d'), response.data['results'][0]['finished_date'])
+        self.assertEqual(self.reading_list.user.id, response.data['results'][0]['user'])
 
     def test_creating_reading_list_item(self):
         """Test that a user can create a new reading list item."""
@@ -289,7 +1264,7 @@ class TestReadingListFunctionalTestCase(APITestCase):
             status.HTTP_200_OK,
         )
 
-        self.assertEquals(2, len(response.data))
+        self.assertEquals(2, len(response.data['results']))
 
     def test_deleting_reading_list_item(self):
         """Test that a user can delete a reading list item."""
@@ -313,7 +1288,7 @@ class TestReadingListFunctionalTestCase(APITestCase):
             status.HTTP_200_OK,
         )
 
-        self.assertEquals(0, len(response.data))
+        self.assertEquals(0, len(response.data['results']))
 
     def test_another_user_cannot_view_or_edit_reading_list_items(self):
         """Test that another user cannot read the reading list items."""
@@ -330,7 +1305,7 @@ class TestReadingListFunctionalTestCase(APITestCase):
         )
 
         # List should be empty since the reading list previously created does not belong to this user
-        self.assertEquals(0, len(response.data))
+        self.assertEquals(0, len(response.data['results']))
 
         response = self.client.post(
             "/books/reading/",
@@ -375,6 +1350,339 @@ class TestReadingListFunctionalTestCase(APITestCase):
         )
 
 
+class TestReadingListBulkTestCase(APITestCase):
+    """Reading list bulk transitions api tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(is_superuser=True)
+        # The stats of each genre are updated with a query of their own
+        cls.books = BookFactory.create_batch(12, genre='drama')
+        cls.started = ReadingListFactory(
+            book=cls.books[0],
+            user=cls.user,
+            started_reading=True,
+            finished_reading=False,
+            finished_date=None,
+        )
+        # Saving marks the started date of the day
+        ReadingList.objects.filter(pk=cls.started.pk).update(started_date=datetime.date(2018, 3, 1))
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def test_transitions_are_applied(self):
+        """Test that transitions update and create entries, marking missing dates only."""
+        today = now().date()
+        response = self.client.post("/books/reading/bulk/", [
+            {'book': self.books[0].id, 'finished_reading': True},
+            {'book': self.books[1].id, 'started_reading': True},
+            {'book': self.books[2].id, 'started_reading': True},
+            {'book': self.books[2].id, 'finished_reading': True},
+        ], format='json')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book.id for book in self.books[:3]], [entry['book'] for entry in response.data])
+
+        finished = ReadingList.objects.get(pk=self.started.pk)
+        self.assertEqual(datetime.date(2018, 3, 1), finished.started_date)
+        self.assertEqual((True, today), (finished.finished_reading, finished.finished_date))
+
+        started = ReadingList.objects.get(user=self.user, book=self.books[1])
+        self.assertEqual((True, today, False, None), (
+            started.started_reading, started.started_date, started.finished_reading, started.finished_date,
+        ))
+        self.assertTrue(ReadingList.objects.get(user=self.user, book=self.books[2]).finished_reading)
+
+        # The stats follow the transitions
+        incremental = self.client.get("/books/reading/stats/").data
+        self.assertEqual((3, 2), (incremental['started'], incremental['finished']))
+        rebuild_reading_stats()
+        self.assertEqual(incremental, self.client.get("/books/reading/stats/").data)
+
+    def test_transitions_run_constant_number_of_queries(self):
+        """Test that the number of queries does not grow with the number of transitions."""
+        def post(books):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post("/books/reading/bulk/", [
+                    {'book': book.id, 'started_reading': True} for book in books
+                ], format='json')
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        self.assertEqual(post(self.books[1:3]), post(self.books[3:12]))
+
+    def test_invalid_transitions_are_rejected(self):
+        """Test that no transition is applied when a book does not exist."""
+        response = self.client.post("/books/reading/bulk/", [
+            {'book': self.books[1].id, 'started_reading': True},
+            {'book': 0, 'started_reading': True},
+        ], format='json')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual({}, response.data[0])
+        self.assertIn('book', response.data[1])
+        self.assertFalse(ReadingList.objects.filter(user=self.user, book=self.books[1]).exists())
+
+        response = self.client.post("/books/reading/bulk/", {'book': self.books[1].id}, format='json')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_oversized_transitions_are_rejected_before_validation(self):
+        """Test that too many transitions are rejected without validating or looking up any."""
+        with self.settings(BOOKS_BULK_MAX_ITEMS=1), self.assertNumQueries(0):
+            response = self.client.post("/books/reading/bulk/", [{'book': 'a'}, {'book': 'b'}], format='json')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', response.data)
+
+    def test_saving_marks_dates_again(self):
+        """Test that saving an entry keeps marking its dates, unlike transitions."""
+        entry = ReadingList.objects.get(pk=self.started.pk)
+        entry.save()
+        self.assertEqual(now().date(), ReadingList.objects.get(pk=entry.pk).started_date)
+
+
+class TestReadingStatsTestCase(APITestCase):
+    """Reading stats api tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(is_superuser=True)
+        cls.drama = BookFactory(genre='drama')
+        cls.poetry = BookFactory(genre='poetry')
+
+    def get_stats(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get("/books/reading/stats/")
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def dump_stats(self):
+        """Return the stats of every user and genre."""
+        return (
+            sorted(ReadingStats.objects.values_list('user_id', 'started', 'finished', 'timed', 'total_days')),
+            sorted(ReadingGenreStats.objects.values_list('reading_stats_id', 'genre', 'started', 'finished')),
+        )
+
+    def test_stats_without_reading_list(self):
+        """Test that a user with an empty reading list gets empty stats."""
+        self.assertEqual(
+            {'started': 0, 'finished': 0, 'finish_rate': None, 'average_days': None, 'genres': []},
+            self.get_stats(),
+        )
+
+    def test_stats_follow_reading_list_changes(self):
+        """Test that the stats are updated as reading list entries change."""
+        self.client.force_authenticate(user=self.user)
+        for book in (self.drama, self.poetry):
+            self.client.post("/books/reading/", {
+                'book': book.id,
+                'started_reading': True,
+                'finished_reading': False,
+                'user': self.user.id,
+            })
+        ReadingListFactory(book=self.poetry, user=self.user, started_reading=False, finished_reading=False)
+
+        entry = ReadingList.objects.get(book=self.drama, user=self.user)
+        self.client.patch("/books/reading/{}/".format(entry.id), {'finished_reading': True})
+
+        stats = self.get_stats()
+        self.assertEqual(2, stats['started'])
+        self.assertEqual(1, stats['finished'])
+        self.assertEqual(0.5, stats['finish_rate'])
+        self.assertEqual(0, stats['average_days'])
+        self.assertEqual([
+            {'genre': 'drama', 'started': 1, 'finished': 1, 'finish_rate': 1.0},
+            {'genre': 'poetry', 'started': 1, 'finished': 0, 'finish_rate': 0.0},
+        ], stats['genres'])
+
+        self.client.delete("/books/reading/{}/".format(entry.id))
+        stats = self.get_stats()
+        self.assertEqual((1, 0), (stats['started'], stats['finished']))
+        self.assertEqual(['poetry'], [genre['genre'] for genre in stats['genres']])
+
+    def test_stats_are_read_in_constant_queries(self):
+        """Test that the stats do not scan the reading list."""
+        ReadingListFactory.create_batch(5, book=self.drama, user=self.user, finished_reading=True)
+        self.client.force_authenticate(user=self.user)
+
+        # one query for the stats and one for their genres
+        with self.assertNumQueries(2):
+            response = self.client.get("/books/reading/stats/")
+        self.assertEqual(5, response.data['finished'])
+
+    def test_rebuild_matches_incremental_stats(self):
+        """Test that rebuilding the stats gives the incrementally maintained ones."""
+        for _ in range(10):
+            ReadingListFactory(book=self.drama, user=self.user)
+            ReadingListFactory(book=self.poetry, user=self.user)
+        entry = ReadingList.objects.filter(user=self.user).first()
+        entry.finished_reading = not entry.finished_reading
+        entry.save()
+
+        incremental = self.get_stats()
+        with redirect_stdout(io.StringIO()):
+            call_command('rebuildreadingstats')
+        self.assertEqual(incremental, self.get_stats())
+
+    def test_concurrent_saves_apply_their_changes_once(self):
+        """Test that saving entries loaded before another save does not count their old state."""
+        ReadingListFactory(book=self.drama, user=self.user, started_reading=False, finished_reading=False)
+        first, second = ReadingList.objects.get(user=self.user), ReadingList.objects.get(user=self.user)
+        first.started_reading = True
+        first.save()
+        second.started_reading = True
+        second.save()
+
+        incremental = self.get_stats()
+        self.assertEqual(1, incremental['started'])
+        rebuild_reading_stats()
+        self.assertEqual(incremental, self.get_stats())
+
+    def test_entries_read_in_the_transaction_are_saved_without_reading_again(self):
+        """Test that saving an entry loaded in the same transaction does not read it again."""
+        ReadingListFactory(book=self.drama, user=self.user, started_reading=False, finished_reading=False)
+        entry = ReadingList.objects.get(user=self.user)
+        entry.started_reading = True
+        with CaptureQueriesContext(connection) as queries:
+            entry.save()
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT "books_readinglist"')])
+        self.assertEqual(1, self.get_stats()['started'])
+
+    def test_entries_saved_in_a_rolled_back_savepoint_are_read_again(self):
+        """Test that the values of an entry written in a rolled back savepoint are read again."""
+        ReadingListFactory(book=self.drama, user=self.user, started_reading=False, finished_reading=False)
+        entry = ReadingList.objects.get(user=self.user)
+        entry.started_reading = True
+        try:
+            with transaction.atomic():
+                entry.save()
+                raise OperationalError
+        except OperationalError:
+            pass
+        entry.save()
+
+        incremental = self.dump_stats()
+        rebuild_reading_stats()
+        self.assertEqual(incremental, self.dump_stats())
+        self.assertEqual(1, self.get_stats()['started'])
+
+    def test_saving_other_book_fields_does_not_lock(self):
+        """Test that saving a book without its genre neither locks nor moves the stats."""
+        ReadingListFactory(book=self.drama, user=self.user, finished_reading=True)
+        book = Book.objects.get(pk=self.drama.pk)
+        book.genre = 'poetry'
+        book.title = "Hamlet"
+        with CaptureQueriesContext(connection) as queries:
+            book.save(update_fields=['title'])
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT "books_book"')])
+
+        self.assertEqual(['drama'], [genre['genre'] for genre in self.get_stats()['genres']])
+
+    def test_genre_changes_move_stats(self):
+        """Test that changing the genre of a book moves the stats of its entries."""
+        ReadingListFactory.create_batch(2, book=self.drama, user=self.user, finished_reading=True)
+        book = Book.objects.get(pk=self.drama.pk)
+        book.genre = 'poetry'
+        book.save()
+
+        self.assertEqual([
+            {'genre': 'poetry', 'started': 2, 'finished': 2, 'finish_rate': 1.0},
+        ], self.get_stats()['genres'])
+
+    def test_migration_matches_rebuild(self):
+        """Test that the stats computed by their migration are the rebuilt ones."""
+        for _ in range(5):
+            ReadingListFactory(book=self.drama, user=self.user)
+            ReadingListFactory(book=self.poetry)
+        rebuild_reading_stats()
+        rebuilt = self.dump_stats()
+
+        ReadingStats.objects.all().delete()
+        migration = import_module('books.migrations.0013_reading_stats')
+        migration.compute_reading_stats(global_apps, Mock(connection=connection))
+        self.assertEqual(rebuilt, self.dump_stats())
+
+    def test_rebuild_computes_average_days(self):
+        """Test that the average days are computed from the started and finished dates."""
+        ReadingListFactory.create_batch(2, book=self.drama, user=self.user, finished_reading=True)
+        ReadingList.objects.filter(user=self.user).update(
+            started_date=datetime.date(2018, 3, 1),
+            finished_date=datetime.date(2018, 3, 11),
+        )
+        rebuild_reading_stats()
+        self.assertEqual(10, self.get_stats()['average_days'])
+
+
+class TestRelatedBooksTestCase(APITestCase):
+    """Related books api tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(is_superuser=True)
+        cls.books = BookFactory.create_batch(4)
+        a, b, c, d = cls.books
+        for favourites in ((a, b, c), (a, b), (a, d)):
+            user = UserFactory()
+            for book in favourites:
+                FavouriteFactory(book=book, user=user)
+
+    def get_neighbours(self):
+        return set(BookNeighbour.objects.values_list('book_id', 'neighbour_id', 'score'))
+
+    def test_related_books_are_ordered_by_score(self):
+        """Test that related books are the ones most often favourited together."""
+        a, b, c, d = self.books
+        self.client.force_authenticate(user=self.user)
+
+        # one query for the book, one for its neighbours and two for the related books
+        with self.assertNumQueries(4):
+            response = self.client.get("/books/book/{}/related/".format(a.id))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([b.id, c.id, d.id], [book['id'] for book in response.data])
+
+        with self.settings(BOOKS_RELATED_TOP_K=1):
+            response = self.client.get("/books/book/{}/related/".format(a.id))
+        self.assertEqual([b.id], [book['id'] for book in response.data])
+
+        response = self.client.get("/books/book/0/related/")
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_incremental_updates_match_rebuild(self):
+        """Test that adding and removing favourites gives the neighbours of a rebuild."""
+        a, b, c, d = self.books
+        user = UserFactory(is_superuser=True)
+        self.client.force_authenticate(user=user)
+        for book in (b, c, d):
+            response = self.client.post("/books/favourite/", {'book': book.id, 'user': user.id})
+            self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        Favourite.objects.get(book=a, user__favourite__book=c).delete()
+
+        incremental = self.get_neighbours()
+        self.assertIn((c.id, d.id, 1), incremental)
+        rebuild_neighbours()
+        self.assertEqual(self.get_neighbours(), incremental)
+
+    def test_rebuild_counts_pairs_in_chunks(self):
+        """Test that the pairs counted in chunks are the pairs of every user."""
+        books = self.books + BookFactory.create_batch(6)
+        for _ in range(20):
+            user = UserFactory()
+            for book in random.sample(books, random.randint(1, len(books))):
+                FavouriteFactory(book=book, user=user)
+
+        expected = Counter()
+        favourites = defaultdict(set)
+        for user_id, book_id in Favourite.objects.values_list('user_id', 'book_id'):
+            favourites[user_id].add(book_id)
+        for user_books in favourites.values():
+            expected.update((book, other) for book in user_books for other in user_books if book != other)
+
+        with patch('books.recommendations.PAIRS_CHUNK_SIZE', 30), self.settings(BOOKS_RELATED_TOP_K=len(books)):
+            rebuild_neighbours()
+        self.assertEqual(
+            {(book, other, count) for (book, other), count in expected.items()},
+            self.get_neighbours(),
+        )
+
+
 class TestFavouritesFunctionalTestCase(APITestCase):
     """Favourites api functional tests."""
 
@@ -395,9 +1703,9 @@ class TestFavouritesFunctionalTestCase(APITestCase):
             status.HTTP_200_OK,
         )
 
-        self.assertEqual(self.favourite.id, response.data[0]['id'])
-        self.assertEqual(self.favourite.book.id, response.data[0]['book'])
-        self.assertEqual(self.favourite.user.id, response.data[0]['user'])
+        self.assertEqual(self.favourite.id, response.data['results'][0]['id'])
+        self.assertEqual(self.favourite.book.id, response.data['results'][0]['book'])
+        self.assertEqual(self.favourite.user.id, response.data['results'][0]['user'])
 
     def test_creating_favourite_item(self):
         """Test that a user can create a new favourite item."""
@@ -433,7 +1741,7 @@ class TestFavouritesFunctionalTestCase(APITestCase):
             status.HTTP_200_OK,
         )
 
-        self.assertEquals(2, len(response.data))
+        self.assertEquals(2, len(response.data['results']))
 
     def test_cannot_create_non_unique_favourite_item(self):
         """Test that a user can create a new favourite item."""
@@ -477,7 +1785,7 @@ class TestFavouritesFunctionalTestCase(APITestCase):
             status.HTTP_200_OK,
         )
 
-        self.assertEquals(0, len(response.data))
+        self.assertEquals(0, len(response.data['results']))
 
     def test_another_user_cannot_view_or_delete_favorite_item(self):
         """Test that another user cannot read or delete favourite item."""
@@ -495,7 +1803,7 @@ class TestFavouritesFunctionalTestCase(APITestCase):
         )
 
         # List should be empty since the reading list previously created does not belong to this user
-        self.assertEquals(0, len(response.data))
+        self.assertEquals(0, len(response.data['results']))
 
         response = self.client.post(
             "/books/favourite/",
@@ -522,3 +1830,439 @@ class TestFavouritesFunctionalTestCase(APITestCase):
             response.status_code,
             status.HTTP_403_FORBIDDEN,
         )
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class TestReplicaRoutingTestCase(SimpleTestCase):
+    """Read replica database routing tests."""
+
+    def setUp(self):
+        routers._health.clear()
+        self.factory = RequestFactory()
+
+    def route(self, method):
+        """Return the databases of a read, a write and a read within a request."""
+        def view(request):
+            databases = [db_router.db_for_read(Book), db_router.db_for_write(Book), db_router.db_for_read(Book)]
+            return HttpResponse(' '.join(databases))
+
+        request = getattr(self.factory, method)("/books/book/")
+        return ReplicaRoutingMiddleware(view)(request).content.decode().split()
+
+    def test_safe_requests_read_from_replicas_until_a_write(self):
+        """Test that safe requests read from a replica and from the primary after a write."""
+        with patch.object(routers, 'is_healthy', return_value=True):
+            self.assertEqual(['replica', 'default', 'default'], self.route('get'))
+            self.assertEqual(['default', 'default', 'default'], self.route('post'))
+            # Writes only pin the reads of their own request
+            self.assertEqual(['replica', 'default', 'default'], self.route('get'))
+            self.assertEqual('default', db_router.db_for_read(Book))
+
+    def test_reads_fall_back_to_the_primary(self):
+        """Test that reads go to the primary when no replica is healthy or configured."""
+        with patch.object(routers, 'is_healthy', return_value=False):
+            self.assertEqual(['default', 'default', 'default'], self.route('get'))
+
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(['default', 'default', 'default'], self.route('get'))
+
+    def test_cache_fills_and_authentication_read_from_the_primary(self):
+        """Test that cache misses and user reads go to the primary within safe requests."""
+        cache.clear()
+        request = Request(self.factory.get("/books/book/"))
+        request.accepted_media_type = 'application/json'
+
+        def view(request):
+            return Response({'databases': [db_router.db_for_read(Book), db_router.db_for_read(Book)]})
+
+        with patch.object(routers, 'is_healthy', return_value=True), routers.use_replicas():
+            self.assertEqual('default', db_router.db_for_read(User))
+            self.assertEqual('default', db_router.db_for_read(Token))
+            response = CachedResponseViewSetMixin().cached_response(view, request)
+            self.assertEqual(['default', 'default'], response.data['databases'])
+            # The cached response is served without reading
+            response = CachedResponseViewSetMixin().cached_response(Mock(), request)
+            self.assertEqual(['default', 'default'], response.data['databases'])
+            self.assertEqual('replica', db_router.db_for_read(Book))
+
+    def test_failing_replicas_are_retried_on_the_primary(self):
+        """Test that safe requests failing on a replica are made again on the primary."""
+        databases = []
+
+        def view(request):
+            databases.append(db_router.db_for_read(Book))
+            if len(databases) == 1:
+                middleware.process_exception(request, OperationalError())
+                return HttpResponse(status=500)
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        connection = Mock(connection=None)
+        routers._health['replica'] = (routers.time.monotonic(), True)
+        with patch.object(routers, 'connections', {'default': Mock(in_atomic_block=False), 'replica': connection}):
+            response = middleware(self.factory.get("/books/book/"))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(['replica', 'default'], databases)
+        connection.close.assert_called_once_with()
+        # The replica is checked again before the next read
+        self.assertNotIn('replica', routers._health)
+
+    def test_replica_health_is_checked_once_in_a_while(self):
+        """Test that a failing replica is left out until it is checked again."""
+        connection = Mock(**{'ensure_connection.side_effect': OperationalError})
+        with patch.object(routers, 'connections', {'replica': connection}):
+            self.assertFalse(routers.is_healthy('replica'))
+            self.assertFalse(routers.is_healthy('replica'))
+            self.assertEqual(1, connection.ensure_connection.call_count)
+            connection.close.assert_called_once_with()
+
+            with override_settings(DATABASE_REPLICA_CHECK_INTERVAL=0):
+                connection.ensure_connection.side_effect = None
+                connection.is_usable.return_value = True
+                self.assertTrue(routers.is_healthy('replica'))
+
+
+class TestServerTimingTestCase(ClearCacheMixin, APITestCase):
+    """Request timings and metrics endpoint tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.staff = UserFactory(is_staff=True)
+        BookFactory()
+
+    def setUp(self):
+        super().setUp()
+        metrics.route_metrics.reset()
+
+    def test_responses_report_their_timings(self):
+        """Test that responses carry the database, serialization, view and render timings."""
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get("/books/book/")
+
+        timings = {metric.split(';')[0]: metric for metric in response['Server-Timing'].split(', ')}
+        self.assertCountEqual(['db', 'serialize', 'view', 'render', 'total'], timings)
+        self.assertRegex(timings['db'], r'^db;dur=\d+\.\d;desc="\d+ queries"$')
+        self.assertRegex(timings['total'], r'^total;dur=\d+\.\d$')
+
+    def test_metrics_are_aggregated_by_route(self):
+        """Test that staff users can read and reset the timing histograms of each route."""
+        self.client.force_authenticate(user=self.user)
+        self.client.get("/books/book/")
+        self.client.get("/books/book/")
+        response = self.client.get("/metrics/")
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get("/metrics/")
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        histograms = response.data['routes']['GET book-list']
+        self.assertEqual(2, histograms['total']['count'])
+        self.assertEqual(2, sum(histograms['queries']['buckets'].values()))
+        self.assertEqual(
+            [str(bound) for bound in metrics.BUCKETS] + ['+Inf'],
+            list(histograms['db']['buckets']),
+        )
+
+        response = self.client.delete("/metrics/")
+        self.assertEquals(response.status_code, status.HTTP_204_NO_CONTENT)
+        # Only the reset request itself is left
+        self.assertEqual(['DELETE metrics'], list(metrics.route_metrics.snapshot()))
+
+
+class TestBenchBooksCommandTestCase(SimpleTestCase):
+    """Books API benchmark command tests."""
+
+    def test_percentiles_are_nearest_rank(self):
+        """Test that percentiles are taken from the sorted latencies by nearest rank."""
+        latencies = list(range(1, 101))
+        self.assertEqual(50, benchbooks.percentile(latencies, 50))
+        self.assertEqual(95, benchbooks.percentile(latencies, 95))
+        self.assertEqual(7, benchbooks.percentile([7], 99))
+
+    def test_results_are_compared_with_a_baseline(self):
+        """Test that results are reported along with their change from a baseline."""
+        result = {'requests': 10, 'errors': 1, 'rps': 110.0, 'p50_ms': 4.0, 'p95_ms': 9.0, 'p99_ms': 12.0}
+        previous = dict(result, rps=100.0, p95_ms=10.0)
+        self.assertEqual(
+            "book-list: 110.0 req/s, p50 4.00 ms, p95 9.00 ms, p99 12.00 ms, 1 errors (req/s +10.0%, p95 -10.0%)",
+            benchbooks.Command().format_result('book-list', result, previous),
+        )
+
+
+class TestSeedCatalogCommandTestCase(TestCase):
+    """Synthetic catalog seeding tests."""
+
+    def seed(self, **options):
+        """Run the seeding command and return its output."""
+        output = io.StringIO()
+        with redirect_stdout(output):
+            call_command('seedcatalog', **dict({'books': 300, 'users': 30, 'batch_size': 100}, **options))
+        return output.getvalue()
+
+    def test_seeding_a_catalog(self):
+        """Test that books and readers are seeded with skewed genres and consistent derived data."""
+        output = self.seed()
+
+        self.assertIn("Seeded 300 books, 30 authors, 3 publishers, 30 users", output)
+        self.assertEqual(300, Book.objects.count())
+        self.assertEqual(30, Token.objects.filter(user__username__startswith='reader').count())
+        genres = Counter(Book.objects.values_list('genre', flat=True))
+        self.assertGreater(genres.most_common(1)[0][1], 2 * 300 / len(Book.GENRES))
+        self.assertTrue(Favourite.objects.exists())
+        self.assertEqual(
+            {'started': ReadingList.objects.filter(started_reading=True).count()},
+            ReadingStats.objects.aggregate(started=Sum('started')),
+        )
+        book = Book.objects.first()
+        self.assertIn(book.id, search_books(Book.objects.all(), book.title.split()[-1]).values_list('id', flat=True))
+
+    def test_seeding_is_reproducible(self):
+        """Test that the same seed generates the same catalog."""
+        self.seed(users=0)
+        first = list(Book.objects.order_by('id').values_list('title', 'genre', 'pages', 'published_date'))
+        self.seed(users=0)
+        second = list(Book.objects.order_by('id').values_list('title', 'genre', 'pages', 'published_date'))[300:]
+
+        self.assertEqual(first, second)
+        self.assertEqual(600, len(set(Book.objects.values_list('id', flat=True))))
+
+    def test_existing_usernames_are_rejected(self):
+        """Test that users are not seeded over existing ones."""
+        UserFactory(username='reader0')
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.assertFalse(Book.objects.exists())
+
+
+class TestExportTestCase(ClearCacheMixin, APITestCase):
+    """Catalog and reading list streaming export tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(is_superuser=True)
+        cls.author = AuthorFactory(name="Jane Austen")
+        cls.books = [
+            BookFactory(authors=[cls.author], genre='romance', published_date=datetime.date(2017, 1, 1)),
+            BookFactory(genre='drama', published_date=None),
+            BookFactory(authors=[cls.author, AuthorFactory(name="Leo Tolstoy")], genre='drama'),
+        ]
+        cls.entry = ReadingListFactory(
+            user=cls.user,
+            book=cls.books[2],
+            started_reading=True,
+            finished_reading=False,
+            finished_date=None,
+        )
+        # Saving marks the started date of the day
+        ReadingList.objects.filter(pk=cls.entry.pk).update(started_date=datetime.date(2018, 2, 1))
+        ReadingListFactory(book=cls.books[0])
+
+    def export(self, path, **params):
+        """Return the streamed content of an export."""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(path, params)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_exporting_books_as_ndjson(self):
+        """Test that books are exported as rendered by the list endpoint, filters included."""
+        self.client.force_authenticate(user=self.user)
+        listed = self.client.get("/books/book/").data['results']
+
+        content = self.export("/books/book/export/")
+
+        self.assertEqual(
+            JSONRenderer().render(listed),
+            JSONRenderer().render([json.loads(line) for line in content.splitlines()]),
+        )
+        content = self.export("/books/book/export/", genre='drama')
+        self.assertEqual([self.books[1].id, self.books[2].id], [json.loads(line)['id'] for line in content.splitlines()])
+
+    def test_exported_books_csv_can_be_imported(self):
+        """Test that the CSV export holds the columns of the catalog import."""
+        content = self.export("/books/book/export/", format='csv')
+
+        records = list(RecordReader(io.BytesIO(content.encode()), 'csv'))
+        self.assertEqual([book.title for book in self.books], [record['title'] for record in records])
+        self.assertEqual([{'name': "Jane Austen"}, {'name': "Leo Tolstoy"}], records[2]['authors'])
+        self.assertIsNone(records[1]['published_date'])
+
+    def test_exporting_reading_list(self):
+        """Test that users export their own reading list with the books."""
+        content = self.export("/books/reading/export/")
+        self.assertEqual([{
+            'id': self.entry.id,
+            'book': {
+                'id': self.books[2].id,
+                'title': self.books[2].title,
+                'authors': ["Jane Austen", "Leo Tolstoy"],
+                'publisher': self.books[2].publisher.name,
+            },
+            'started_reading': True,
+            'started_date': '2018-02-01',
+            'finished_reading': False,
+            'finished_date': None,
+        }], [json.loads(line) for line in content.splitlines()])
+
+        content = self.export("/books/reading/export/", format='csv')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(1, len(rows))
+        self.assertEqual("Jane Austen|Leo Tolstoy", rows[0]['authors'])
+
+    def test_exports_are_read_in_batches(self):
+        """Test that the authors of exported rows are fetched once per batch."""
+        with self.assertNumQueries(3):
+            self.assertEqual(3, len(list(exports.export_books(Book.objects.all(), batch_size=2))))
+
+
+class TestBooksAdminTestCase(TestCase):
+    """Books admin changelist tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(username="admin", is_staff=True, is_superuser=True)
+        cls.reader = UserFactory(username="zorblax")
+        cls.author = AuthorFactory(name="Jane Austen")
+        cls.book = BookFactory(title="Pride and Prejudice", authors=[cls.author])
+        cls.other = BookFactory(title="War and Peace", authors=[AuthorFactory(name="Leo Tolstoy")])
+        FavouriteFactory(user=cls.reader, book=cls.book)
+        FavouriteFactory(user=cls.user, book=cls.other)
+        ReadingListFactory(user=cls.reader, book=cls.other)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def changelist(self, model, **params):
+        """Return the changelist of the model."""
+        response = self.client.get(
+            "/admin/books/{}/".format(model._meta.model_name),
+            params,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.context['cl']
+
+    def test_changelists_run_constant_number_of_queries(self):
+        """Test that changelists load the related rows of their page eagerly."""
+        counts = {}
+        for model in (Book, Favourite, ReadingList):
+            with CaptureQueriesContext(connection) as queries:
+                self.changelist(model)
+            counts[model] = len(queries)
+
+        for _ in range(5):
+            book = BookFactory(authors=[self.author])
+            FavouriteFactory(book=book)
+            ReadingListFactory(book=book)
+
+        for model in (Book, Favourite, ReadingList):
+            with CaptureQueriesContext(connection) as queries:
+                self.changelist(model)
+            self.assertEqual(counts[model], len(queries), model)
+
+    def test_searching_matches_through_search_index(self):
+        """Test that searches match books by author and rows by book or exact username."""
+        self.assertEqual([self.book], list(self.changelist(Book, q="austen").result_list))
+        self.assertEqual(
+            [self.book],
+            [favourite.book for favourite in self.changelist(Favourite, q="austen").result_list],
+        )
+        self.assertEqual(
+            [self.reader],
+            [entry.user for entry in self.changelist(ReadingList, q="zorblax").result_list],
+        )
+        self.assertEqual([], list(self.changelist(ReadingList, q="zorbla").result_list))
+        self.assertEqual([], list(self.changelist(Book, q="!!").result_list))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.changelist(Favourite, q="tolstoy")
+        self.assertFalse(any('LIKE' in query['sql'] for query in queries))
+
+    def test_changelists_are_counted_once(self):
+        """Test that filtered changelists do not count the whole table again."""
+        changelist = self.changelist(ReadingList, q="tolstoy")
+        self.assertEqual(1, changelist.result_count)
+        self.assertIsNone(changelist.full_result_count)
+
+
+class TestEstimatedCountTestCase(ClearCacheMixin, APITestCase):
+    """Estimated count pagination tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(username="admin", is_staff=True, is_superuser=True)
+        cls.entries = ReadingListFactory.create_batch(3, user=cls.user)
+
+    def paginate(self, queryset, **params):
+        """Return the paginated response of the queryset."""
+        request = Request(RequestFactory().get("/books/reading/", params))
+        pagination = EstimatedCountPagination()
+        page = pagination.paginate_queryset(queryset, request)
+        return pagination.get_paginated_response([entry.id for entry in page]).data
+
+    def test_counts_below_threshold_are_exact(self):
+        """Test that querysets are counted exactly while small."""
+        data = self.paginate(ReadingList.objects.order_by('id'), page_size=2)
+        self.assertEqual(3, data['count'])
+        self.assertTrue(data['count_exact'])
+        self.assertEqual(2, len(data['results']))
+        self.assertIsNotNone(data['next'])
+
+    @override_settings(BOOKS_ESTIMATED_COUNT_THRESHOLD=2)
+    def test_counts_above_threshold_are_estimated(self):
+        """Test that whole tables are estimated once past the threshold."""
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE books_readinglist")
+        else:
+            self.assertEqual({'books.book': 3, 'books.favourite': 0, 'books.readinglist': 3}, refresh_row_counts())
+        # Rows added since the estimate
+        last = ReadingListFactory(user=self.user)
+
+        # The page is fetched without counting the table
+        with self.assertNumQueries(1 if connection.vendor != 'postgresql' else 2):
+            data = self.paginate(ReadingList.objects.order_by('id'), page_size=2)
+        self.assertEqual(3, data['count'])
+        self.assertFalse(data['count_exact'])
+        self.assertIsNotNone(data['next'])
+
+        data = self.paginate(ReadingList.objects.order_by('id'), page_size=1, page=3)
+        self.assertIsNotNone(data['next'])
+        self.assertFalse(data['count_exact'])
+
+        data = self.paginate(ReadingList.objects.order_by('id'), page_size=1, page=4)
+        self.assertEqual([last.id], data['results'])
+        self.assertIsNone(data['next'])
+        self.assertEqual(4, data['count'])
+        self.assertTrue(data['count_exact'])
+
+        with self.assertRaises(NotFound):
+            self.paginate(ReadingList.objects.order_by('id'), page_size=1, page=5)
+
+        if connection.vendor != 'postgresql':
+            # Filtered querysets have no cached count
+            data = self.paginate(ReadingList.objects.filter(user=self.user).order_by('id'))
+            self.assertEqual(4, data['count'])
+            self.assertTrue(data['count_exact'])
+
+    @skipIf(connection.vendor == 'postgresql', "PostgreSQL estimates from its statistics")
+    def test_cached_counts_expire(self):
+        """Test that cached counts expire rather than going stale once no longer refreshed."""
+        refresh_counts()
+        self.assertEqual(3, estimate_count(ReadingList.objects.all()))
+        with patch('time.time', return_value=time.time() + COUNT_TIMEOUT + 1):
+            self.assertIsNone(estimate_count(ReadingList.objects.all()))
+
+    @override_settings(BOOKS_ESTIMATED_COUNT_THRESHOLD=2)
+    def test_admin_marks_estimated_counts(self):
+        """Test that admin changelists mark estimated counts."""
+        refresh_counts()
+        self.client.force_login(self.user)
+        response = self.client.get("/admin/books/readinglist/")
+        self.assertFalse(response.context['cl'].paginator.count_is_exact)
+        self.assertContains(response, "About 3 reading lists")
+
+        response = self.client.get("/admin/books/author/")
+        self.assertNotContains(response, "About")
@@ -0,0 +1,88 @@
+"""Books reading list transitions.
+
+Apply the reading progress of many books at once, as synced by clients
+reading offline: the reading list entries of the user for the books are
+loaded with a single query, updated or created, and written with bulk
+queries, the reading stats being updated along with them. Unlike
+`ReadingList.save`, transitions only mark the dates which are not marked
+yet, as clients replay progress already synced.
+"""
+
+from django.db import router, transaction
+
+from books.ingest import bulk_create_with_ids
+from books.models import ReadingList, count_write
+from books.stats import apply_changes, get_state
+
+TRANSITION_FIELDS = ('started_reading', 'finished_reading')
+
+BATCH_SIZE = 1000
+
+
+def stamp_dates(entry):
+    """Mark the dates of the reading progress of an entry which are not marked yet.
+
+    Finished books are started as well.
+    """
+    if entry.finished_reading:
+        entry.started_reading = True
+        if not entry.finished_date:
+            entry.mark_date_read()
+    if entry.started_reading and not entry.started_date:
+        entry.mark_date_started()
+
+
+@transaction.atomic
+def apply_transitions(user, transitions, genres=None):
+    """Apply reading progress transitions of a user and return the entries.
+
+    Transitions are dictionaries with a `book` id and the new values of
+    `started_reading` and `finished_reading`, missing values are left
+    unchanged. The latest reading list entry of the user for a book is
+    updated, or created when there is none. Genres maps the book ids to
+    their genre, to update the stats without looking them up.
+    """
+    entries = {}
+    # Locked so that concurrent changes of the entries change the stats one after the other
+    for entry in ReadingList.objects.select_for_update().filter(
+        user=user,
+        book_id__in={transition['book'] for transition in transitions},
+    ).order_by('id'):
+        entries[entry.book_id] = entry
+
+    created = {}
+    changes = []
+    for transition in transitions:
+        entry = entries.get(transition['book'])
+        if entry is None:
+            entry = created[transition['book']] = entries[transition['book']] = ReadingList(
+                user=user,
+                book_id=transition['book'],
+            )
+        for field in TRANSITION_FIELDS:
+            if field in transition:
+                setattr(entry, field, transition[field])
+        stamp_dates(entry)
+
+    updated = [
+        entry for book_id, entry in entries.items()
+        if book_id not in created and get_state(entry) != {
+            field: entry._loaded_values[field] for field in ReadingList.STATE_FIELDS
+        }
+    ]
+    ReadingList.objects.bulk_update(
+        updated,
+        ('started_reading', 'started_date', 'finished_reading', 'finished_date'),
+        batch_size=BATCH_SIZE,
+    )
+    bulk_create_with_ids(ReadingList, list(created.values()))
+    count_write(router.db_for_write(ReadingList))
+
+    for entry in updated:
+        changes.append(({field: entry._loaded_values[field] for field in ReadingList.STATE_FIELDS}, -1))
+    for entry in updated + list(created.values()):
+        changes.append((get_state(entry), 1))
+        entry.set_loaded_values(get_state(entry), entry._state.db)
+    apply_changes(changes, genres)
+
+    return [entries[book_id] for book_id in dict.fromkeys(transition['book'] for transition in transitions)]
@@ -1,41 +1,213 @@
 """Books app views."""
 
-from rest_framework import (viewsets, filters)
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
 
+from books.caching import CachedResponse
+from books.exports import (
+    BOOK_CSV_FIELDS,
+    READING_LIST_CSV_FIELDS,
+    export_books,
+    export_reading_list,
+    reading_list_to_csv_record,
+    streaming_export,
+)
+from books.filters import BookFilterSet, BookSearchFilter
+from books.pagination import BookPagination
+from books.recommendations import get_related_book_ids
+from books.renderers import CSVRenderer, NDJSONRenderer
+from books.streams import book_to_csv_record
+from books.transitions import apply_transitions
 from books.models import (
     Book,
+    ReadingGenreStats,
     ReadingList,
+    ReadingStats,
     Favourite,
 )
 from books.serializers import (
     BookSerializer,
+    BookValuesSerializer,
     ReadingListSerializer,
+    ReadingListTransitionSerializer,
+    ReadingStatsSerializer,
     FavouriteSerializer,
 )
+from bookworm.routers import use_primary
+
+
+class EagerLoadingViewSetMixin:
+    """Apply the eager loading declared by the serializer to the queryset."""
+
+    def get_queryset(self):
+        """Return the queryset with the serializer related lookups applied."""
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
+
+
+class ValuesListViewSetMixin:
+    """List rows of values with a read-only serializer, when the viewset has one."""
+
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        """Return the list of values rendered by the values serializer."""
+        if self.values_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.values_serializer_class.setup_values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        serializer = self.values_serializer_class(
+            queryset if page is None else page,
+            context=self.get_serializer_context(),
+        )
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+
+class CachedResponseViewSetMixin:
+    """Cache the list and retrieve responses until the catalog changes."""
 
+    def list(self, request, *args, **kwargs):
+        """Return the cached list response."""
+        return self.cached_response(super().list, request, *args, **kwargs)
 
-class BookViewSet(viewsets.ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        """Return the cached retrieve response."""
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, view, request, *args, **kwargs):
+        """Return the response of the view from the cache, or not modified."""
+        cached = CachedResponse(request)
+        if cached.is_not_modified(request):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = cached.get()
+            if data is None:
+                # Replicas can lag behind the change of version that missed the cache
+                with use_primary():
+                    response = view(request, *args, **kwargs)
+                cached.set(response.data, settings.BOOKS_RESPONSE_CACHE_TIMEOUT)
+            else:
+                response = Response(data)
+
+        response['ETag'] = cached.etag
+        response['Last-Modified'] = http_date(cached.last_modified)
+        # Clients revalidate their copy on every request
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+class BookViewSet(
+    CachedResponseViewSetMixin,
+    ValuesListViewSetMixin,
+    EagerLoadingViewSetMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('title',)
+    values_serializer_class = BookValuesSerializer
+    filter_backends = (BookSearchFilter, DjangoFilterBackend)
+    filterset_class = BookFilterSet
+    pagination_class = BookPagination
+
+    @action(detail=True)
+    def related(self, request, pk=None):
+        """Return the books most often favourited along with this one."""
+        book = get_object_or_404(Book.objects.only('id'), pk=pk)
+        related_ids = get_related_book_ids(book.id)
+        books = self.get_queryset().in_bulk(related_ids)
+        serializer = self.get_serializer([books[id] for id in related_ids if id in books], many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, renderer_classes=(NDJSONRenderer, CSVRenderer))
+    def export(self, request):
+        """Stream the books, filtered as listed, as NDJSON or CSV."""
+        return streaming_export(
+            request,
+            export_books(self.filter_queryset(Book.objects.all())),
+            BOOK_CSV_FIELDS,
+            book_to_csv_record,
+            'books',
+        )
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create many books in a single request."""
+        if not isinstance(request.data, list):
+            raise ValidationError("Expected a list of books.")
+        if len(request.data) > settings.BOOKS_BULK_MAX_ITEMS:
+            raise ValidationError(
+                "Cannot create more than {} books at once.".format(settings.BOOKS_BULK_MAX_ITEMS)
+            )
 
+        results = self.get_serializer_class().ingest(request.data)
+        created = sum(1 for result in results if 'id' in result)
+        return Response(
+            {
+                'created': created,
+                'failed': len(results) - created,
+                'results': results,
+            },
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )
 
-class ReadingListViewSet(viewsets.ModelViewSet):
+
+class ReadingListViewSet(EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = ReadingList.objects.all()
     serializer_class = ReadingListSerializer
 
-    def get_queryset(self, request=None, *args, **kwargs):
-        """Return reading list objects filtered by user and book related."""
-        queryset = ReadingList.objects.filter(
-                user=self.request.user).prefetch_related('book')
-        return queryset
+    def get_queryset(self):
+        """Return reading list objects filtered by user."""
+        return super().get_queryset().filter(user=self.request.user)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Apply the reading progress of many books in a single request."""
+        serializer = ReadingListTransitionSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        entries = apply_transitions(request.user, serializer.validated_data, serializer.genres)
+        return Response(self.get_serializer(entries, many=True).data)
+
+    @action(detail=False, renderer_classes=(NDJSONRenderer, CSVRenderer))
+    def export(self, request):
+        """Stream the reading list of the user as NDJSON or CSV."""
+        return streaming_export(
+            request,
+            export_reading_list(ReadingList.objects.filter(user=request.user)),
+            READING_LIST_CSV_FIELDS,
+            reading_list_to_csv_record,
+            'reading',
+        )
+
+    @action(detail=False)
+    def stats(self, request):
+        """Return the reading statistics of the user."""
+        reading_stats = ReadingStats.objects.filter(user=request.user).prefetch_related(
+            Prefetch('genres', queryset=ReadingGenreStats.objects.filter(started__gt=0).order_by('genre')),
+        ).first()
+        if reading_stats is None:
+            reading_stats = ReadingStats(user=request.user)
+        return Response(ReadingStatsSerializer(reading_stats).data)
 
 
-class FavoriteViewSet(viewsets.ModelViewSet):
+class FavoriteViewSet(EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Favourite.objects.all()
     serializer_class = FavouriteSerializer
 
     def get_queryset(self):
         """Return the queryset of favourites for this user."""
-        return Favourite.objects.filter(user=self.request.user)
+        return super().get_queryset().filter(user=self.request.user)
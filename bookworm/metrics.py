@@ -0,0 +1,145 @@
+"""Request performance metrics.
+
+The time spent by each request in SQL queries, serialization, the view and
+rendering is recorded while it is processed, reported in its
+`Server-Timing` header, and added to histograms per route kept in the
+memory of each process.
+"""
+
+import bisect
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets, in milliseconds for durations
+BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_state = threading.local()
+
+
+class RequestTimings:
+    """Durations in seconds of the parts of a request."""
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.queries = 0
+        self.started = {}
+
+    def start(self, name):
+        """Start timing a part of the request."""
+        self.started[name] = time.perf_counter()
+
+    def stop(self, name):
+        """Stop timing a part of the request, if started."""
+        started = self.started.pop(name, None)
+        if started is not None:
+            self.durations[name] += time.perf_counter() - started
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Database execute wrapper counting and timing the queries."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['db'] += time.perf_counter() - started
+            self.queries += 1
+
+    def header(self):
+        """Return the `Server-Timing` header value of the durations."""
+        metrics = []
+        for name, duration in self.durations.items():
+            metric = '{};dur={:.1f}'.format(name, duration * 1000)
+            if name == 'db':
+                metric += ';desc="{} queries"'.format(self.queries)
+            metrics.append(metric)
+        return ', '.join(metrics)
+
+
+@contextmanager
+def recording(timings):
+    """Record the timings of the current request."""
+    previous = getattr(_state, 'timings', None)
+    _state.timings = timings
+    try:
+        yield timings
+    finally:
+        _state.timings = previous
+
+
+def get_timings():
+    """Return the timings of the current request, or None."""
+    return getattr(_state, 'timings', None)
+
+
+@contextmanager
+def timed(name):
+    """Add the duration of the block to the timings of the current request, if any."""
+    timings = get_timings()
+    if timings is None or name in timings.started:
+        # Nested blocks are timed once, by the outermost one
+        yield
+        return
+    timings.start(name)
+    try:
+        yield
+    finally:
+        timings.stop(name)
+
+
+class Histogram:
+    """Counts of values by bucket."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """Add a value."""
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        """Return the counts by bucket upper bound, along with totals."""
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'max': round(self.max, 3),
+            'buckets': dict(zip([str(bound) for bound in BUCKETS] + ['+Inf'], self.counts)),
+        }
+
+
+class RouteMetrics:
+    """Histograms of the request timings by route."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = defaultdict(lambda: defaultdict(Histogram))
+
+    def record(self, route, timings):
+        """Add the timings of a request to the histograms of its route."""
+        with self.lock:
+            histograms = self.routes[route]
+            for name, duration in timings.durations.items():
+                histograms[name].observe(duration * 1000)
+            histograms['queries'].observe(timings.queries)
+
+    def snapshot(self):
+        """Return the histograms of every route."""
+        with self.lock:
+            return {
+                route: {name: histogram.as_dict() for name, histogram in histograms.items()}
+                for route, histograms in self.routes.items()
+            }
+
+    def reset(self):
+        """Discard every histogram."""
+        with self.lock:
+            self.routes.clear()
+
+
+route_metrics = RouteMetrics()
@@ -0,0 +1,78 @@
+"""Project middleware."""
+
+import time
+from contextlib import ExitStack
+
+from django.db import DatabaseError, connections
+
+from bookworm.metrics import RequestTimings, get_timings, recording, route_metrics
+from bookworm.routers import failed_replicas, use_replicas
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ServerTimingMiddleware:
+    """Record the timings of requests, reported in their `Server-Timing` header.
+
+    SQL queries are counted and timed on every database connection, the
+    view and the rendering of deferred responses are timed around them,
+    and serializers time themselves. The timings are also added to the
+    histograms of the route of the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        started = time.perf_counter()
+        with recording(timings), ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings.execute_wrapper))
+            response = self.get_response(request)
+            timings.stop('view')
+        timings.durations['total'] = time.perf_counter() - started
+
+        response['Server-Timing'] = timings.header()
+        route_metrics.record(self.get_route(request), timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        get_timings().start('view')
+
+    def process_template_response(self, request, response):
+        timings = get_timings()
+        timings.stop('view')
+        timings.start('render')
+        response.add_post_render_callback(lambda response: timings.stop('render'))
+        return response
+
+    def get_route(self, request):
+        """Return the name of the route of a request."""
+        match = getattr(request, 'resolver_match', None)
+        return '{} {}'.format(request.method, match.view_name if match else 'unmatched')
+
+
+class ReplicaRoutingMiddleware:
+    """Send the reads of safe requests to the read replicas.
+
+    Safe requests failing because a replica stopped accepting queries are
+    made again with their reads on the primary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in SAFE_METHODS:
+            return self.get_response(request)
+        with use_replicas():
+            response = self.get_response(request)
+        if not getattr(request, 'replica_failed', False):
+            return response
+        request.replica_failed = False
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, DatabaseError) and failed_replicas():
+            request.replica_failed = True
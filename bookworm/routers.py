@@ -0,0 +1,130 @@
+"""Database routers.
+
+Reads are sent to the read replicas listed in `DATABASE_REPLICAS` only
+within `use_replicas`, which the replica middleware applies to the safe
+requests and read-only tasks apply to their queries. Everything else goes
+to the primary, as do the reads that follow a write, so that they see it,
+the reads within `use_primary`, which fill caches that must not hold
+lagging rows, and the reads of users, tokens and sessions. Replicas failing
+their health check are left out for a while, and reads fall back to the
+primary when none is left.
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+_state = threading.local()
+
+# Apps whose reads always go to the primary, as authentication must see the
+# users, tokens and sessions just created or changed
+PRIMARY_APP_LABELS = ('auth', 'authtoken', 'sessions')
+
+# Time of the last health check of each replica and its outcome
+_health = {}
+
+
+@contextmanager
+def use_replicas():
+    """Send the reads within the block to the replicas, until a write is made."""
+    previous = getattr(_state, 'replicas', False), getattr(_state, 'pinned', False), getattr(_state, 'used', set())
+    _state.replicas, _state.pinned, _state.used = True, False, set()
+    try:
+        yield
+    finally:
+        _state.replicas, _state.pinned, _state.used = previous
+
+
+@contextmanager
+def use_primary():
+    """Send the reads within the block to the primary, as when filling a cache."""
+    previous = getattr(_state, 'primary', False)
+    _state.primary = True
+    try:
+        yield
+    finally:
+        _state.primary = previous
+
+
+def pin_to_primary():
+    """Send the following reads of the current block to the primary."""
+    _state.pinned = True
+
+
+def is_healthy(alias):
+    """Return whether a replica accepts connections, checking it once in a while."""
+    checked, healthy = _health.get(alias, (None, False))
+    if checked is not None and time.monotonic() - checked < settings.DATABASE_REPLICA_CHECK_INTERVAL:
+        return healthy
+
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        healthy = connection.is_usable()
+    except DatabaseError:
+        healthy = False
+    if not healthy:
+        connection.close()
+    _health[alias] = (time.monotonic(), healthy)
+    return healthy
+
+
+def get_replica():
+    """Return the alias of a healthy replica, or of the primary if there is none."""
+    replicas = [alias for alias in settings.DATABASE_REPLICAS if is_healthy(alias)]
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+def failed_replicas():
+    """Return the replicas read from within the block that no longer accept queries.
+
+    They are checked again before the next read sent to them.
+    """
+    failed = []
+    for alias in getattr(_state, 'used', ()):
+        connection = connections[alias]
+        try:
+            usable = connection.connection is not None and connection.is_usable()
+        except DatabaseError:
+            usable = False
+        if not usable:
+            connection.close()
+            _health.pop(alias, None)
+            failed.append(alias)
+    return failed
+
+
+class ReplicaRouter:
+    """Route the reads made within `use_replicas` to the replicas."""
+
+    def db_for_read(self, model, **hints):
+        if (
+            not settings.DATABASE_REPLICAS
+            or not getattr(_state, 'replicas', False)
+            or getattr(_state, 'pinned', False)
+            or getattr(_state, 'primary', False)
+            or model._meta.app_label in PRIMARY_APP_LABELS
+            # Reads within a transaction must see its writes
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        alias = get_replica()
+        if alias != DEFAULT_DB_ALIAS:
+            _state.used.add(alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication
+        return db not in settings.DATABASE_REPLICAS
@@ -52,11 +52,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bookworm.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'bookworm.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -105,6 +107,61 @@ if 'DATABASE_HOST' in os.environ:
     DATABASES['default']['USER'] = os.getenv('DATABASE_USER')
     DATABASES['default']['PASSWORD'] = os.getenv('DATABASE_PASSWORD')
 
+# Read replicas of the default database, by host
+DATABASE_REPLICAS = []
+
+for index, host in enumerate(filter(None, os.getenv('DATABASE_REPLICA_HOSTS', default='').split(',')), 1):
+    alias = 'replica{}'.format(index)
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['bookworm.routers.ReplicaRouter']
+
+# Seconds between health checks of each read replica
+DATABASE_REPLICA_CHECK_INTERVAL = int(os.getenv('DATABASE_REPLICA_CHECK_INTERVAL', default=30))
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if 'CACHE_LOCATION' in os.environ:
+    CACHES['default']['BACKEND'] = 'django.core.cache.backends.memcached.MemcachedCache'
+    CACHES['default']['LOCATION'] = os.getenv('CACHE_LOCATION')
+
+
+# Seconds the users of API tokens are kept in the shared cache
+AUTH_CACHE_TIMEOUT = int(os.getenv('AUTH_CACHE_TIMEOUT', default=300))
+
+# Seconds and number of API credentials kept in memory by each process
+AUTH_CACHE_LOCAL_TIMEOUT = int(os.getenv('AUTH_CACHE_LOCAL_TIMEOUT', default=30))
+AUTH_CACHE_LOCAL_SIZE = int(os.getenv('AUTH_CACHE_LOCAL_SIZE', default=1000))
+
+
+# Text search configuration used by the PostgreSQL full-text search index
+BOOKS_SEARCH_CONFIG = os.getenv('BOOKS_SEARCH_CONFIG', default='english')
+
+
+# Seconds the book catalog responses are cached, changes invalidate them sooner
+BOOKS_RESPONSE_CACHE_TIMEOUT = int(os.getenv('BOOKS_RESPONSE_CACHE_TIMEOUT', default=300))
+
+
+# Number of related books kept for each book
+BOOKS_RELATED_TOP_K = int(os.getenv('BOOKS_RELATED_TOP_K', default=20))
+
+
+# Maximum number of books accepted by a single bulk create request
+BOOKS_BULK_MAX_ITEMS = int(os.getenv('BOOKS_BULK_MAX_ITEMS', default=5000))
+
+
+# Number of rows from which paginators estimate counts rather than counting rows
+BOOKS_ESTIMATED_COUNT_THRESHOLD = int(os.getenv('BOOKS_ESTIMATED_COUNT_THRESHOLD', default=100000))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -135,16 +192,21 @@ REST_FRAMEWORK = {
 
     # Only allow Token Authentication for API in production
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.BasicAuthentication',
+        'books.authentication.CachedBasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'books.authentication.CachedTokenAuthentication',
     ),
 
     # ... other configurations
     'DEFAULT_FILTER_BACKENDS': (
         'rest_framework.filters.SearchFilter',
         'django_filters.rest_framework.DjangoFilterBackend',
-    )
+    ),
+
+    # Keyset pagination, the page size can be changed per request up to
+    # the maximum page size of each endpoint
+    'DEFAULT_PAGINATION_CLASS': 'books.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
 }
 
 # Internationalization
@@ -186,6 +248,14 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'alerts.tasks.send_sms_alert',
         'schedule': crontab(minute='15', hour='19'),
     },
+    'rebuild_book_neighbours': {
+        'task': 'books.tasks.rebuild_book_neighbours',
+        'schedule': crontab(minute='0', hour='3'),
+    },
+    'refresh_row_counts': {
+        'task': 'books.tasks.refresh_row_counts',
+        'schedule': crontab(minute='*/10'),
+    },
 }
 
 
@@ -197,6 +267,17 @@ CELERY_RESULT_BACKEND = 'django-db'
 SMS_URL = os.getenv('SMS_URL', default="https://textbelt.com/text")
 SMS_TOKEN = os.getenv('SMS_TOKEN', default="textbelt")
 
+# SMS Service dispatch: concurrent requests, maximum messages per second
+# (0 for no limit), retries of transient failures and request timeout
+SMS_MAX_WORKERS = int(os.getenv('SMS_MAX_WORKERS', default=10))
+SMS_RATE_LIMIT = float(os.getenv('SMS_RATE_LIMIT', default=0))
+SMS_MAX_RETRIES = int(os.getenv('SMS_MAX_RETRIES', default=3))
+SMS_RETRY_BACKOFF = float(os.getenv('SMS_RETRY_BACKOFF', default=0.5))
+SMS_TIMEOUT = float(os.getenv('SMS_TIMEOUT', default=10))
+
+# Number of tasks the nightly sms alerts are split into
+SMS_ALERT_SHARDS = int(os.getenv('SMS_ALERT_SHARDS', default=8))
+
 
 # Load local environment specific settings
 try:
@@ -19,11 +19,14 @@ from django.urls import (path, include)
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from rest_framework_swagger.views import get_swagger_view
 
+from bookworm.views import MetricsView
+
 schema_view = get_swagger_view(title='Bookworm API')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('books/', include('books.urls')),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('', schema_view),
 ]
 
@@ -0,0 +1,28 @@
+"""Project views."""
+
+import os
+
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from bookworm.metrics import route_metrics
+
+
+class MetricsView(APIView):
+    """Request timing histograms of this process by route, for staff users."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        """Return the histograms of every route."""
+        return Response({
+            'pid': os.getpid(),
+            'routes': route_metrics.snapshot(),
+        })
+
+    def delete(self, request):
+        """Discard the histograms."""
+        route_metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -15,3 +15,9 @@ python manage.py createsmsalert
 
 echo "Load development data from fixtures..."
 python manage.py loaddata development_fixture.json
+
+echo "Rebuild books search index..."
+python manage.py rebuildsearchindex
+
+echo "Rebuild reading stats..."
+python manage.py rebuildreadingstats